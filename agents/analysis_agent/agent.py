@@ -1,82 +1,692 @@
+import asyncio
+import atexit
 import logging
-from typing import Dict, Any, List
-import requests
+import os
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from logging.handlers import QueueHandler, QueueListener
+from collections import Counter
+from typing import Dict, Any, List, Optional, Callable, Awaitable, AsyncIterator, Hashable, Tuple
+import aiohttp
+from cachetools import LRUCache, TTLCache
 import json
-from report_generator import ReportGenerator
+import orjson
+import hashlib
+import re
+from itertools import islice
+from urllib.parse import urlsplit
+from report_generator import get_report_generator
+from llm_cache import LLMCache, optional_numpy
+from resilience import CircuitBreaker, CircuitOpenError, call_with_retry
+from models import SearchBundle, Sufficiency
 import config
 
-logging.basicConfig(level=getattr(logging, config.LOG_LEVEL))
+
+def _setup_logging():
+    """
+    日誌交由背景執行緒寫出（QueueHandler + QueueListener），避免 I/O 阻塞 event loop
+    """
+    log_queue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(config.LOG_FORMAT))
+    
+    logging.basicConfig(
+        level=getattr(logging, config.LOG_LEVEL),
+        handlers=[QueueHandler(log_queue)],
+        force=True
+    )
+    listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+
+_setup_logging()
 logger = logging.getLogger(__name__)
 
 
+# 提示詞中固定不變的部分放在最前面，讓 Ollama 可重複使用相同前綴的 KV 快取；
+# 每次不同的內容（查詢、資料摘要）一律接在最後
+_SUFFICIENCY_PROMPT_PREFIX = """你是一個專業的市場分析助理。請判斷下方資料是否足以撰寫一份完整的市場分析報告。
+
+請評估:
+1. 資料是否涵蓋主題的核心面向？
+2. 是否有足夠的細節支撐分析？
+3. 關係是否足以建立因果或關聯分析？
+4. 還缺少哪些重要資訊？
+5. 若不足，請針對最重要的缺少面向提供可直接使用的搜尋查詢（結合原查詢主題）；充足時留空
+
+請以 JSON 格式回應（只回傳 JSON，不要其他文字）:
+{"is_sufficient": true/false, "confidence": 0.0-1.0, "reason": "簡短說明",
+"missing_aspects": ["缺少的面向1", "缺少的面向2"], "coverage_score": 0-100,
+"followup_queries": ["補充搜尋查詢1", "補充搜尋查詢2"]}
+"""
+
+_FOCUSED_QUERY_PROMPT_PREFIX = """基於下方資訊，生成一個精確的搜尋查詢來補充缺少的資訊。
+
+請生成一個結合原查詢和缺少面向的搜尋查詢。
+只需回傳查詢文字，不要其他說明。
+範例: 台灣 AI 產業 供應鏈分析
+"""
+
+
+# 只爬取 http(s) 網址，並排除無效的示範 / 預留網域
+_HTTP_URL_RE = re.compile(r"^https?://", re.IGNORECASE)
+_BLOCKED_HOSTS = frozenset(
+    host.strip().lower()
+    for host in config.SCRAPE_BLOCKED_HOSTS.split(",")
+    if host.strip()
+)
+
+
+def _is_scrapable_url(url: str) -> bool:
+    """
+    判斷 URL 是否值得爬取（http/https 且不在封鎖網域內）
+    """
+    if not url or not _HTTP_URL_RE.match(url):
+        return False
+    try:
+        host = (urlsplit(url).hostname or "").removeprefix("www.")
+    except ValueError:
+        return False
+    return host not in _BLOCKED_HOSTS
+
+
 class AnalysisAgent:
     """
     分析代理：使用 LLM 判斷資料充足度並協調工作流
     """
     
     def __init__(self):
-        self.report_generator = ReportGenerator()
+        self.report_generator = get_report_generator()
         self.web_scraping_url = config.WEB_SCRAPING_URL
         self.data_extraction_url = config.DATA_EXTRACTION_URL
         self.ollama_endpoint = config.OLLAMA_ENDPOINT
         self.model_name = config.MODEL_NAME
+        self.judge_model = config.JUDGE_MODEL
         self.max_iterations = config.MAX_ITERATIONS
         self.urls_per_iteration = config.URLS_PER_ITERATION
         
-        logger.info(f"🔧 Analysis Agent 配置:")
-        logger.info(f"   - 最大迭代次數: {self.max_iterations}")
-        logger.info(f"   - 每次爬取 URL 數: {self.urls_per_iteration}")
-        logger.info(f"   - Ollama 模型: {self.model_name}")
+        # 同步的 ReportGenerator 呼叫使用專用執行緒池，不阻塞 event loop；
+        # Neo4j 查詢與耗時的報告生成分開，避免長時間的 LLM 呼叫佔滿執行緒而卡住資料查詢
+        self._pool = ThreadPoolExecutor(
+            max_workers=config.REPORT_POOL_WORKERS,
+            thread_name_prefix="rg"
+        )
+        self._db_pool = ThreadPoolExecutor(
+            max_workers=config.NEO4J_POOL_WORKERS,
+            thread_name_prefix="neo4j"
+        )
+        
+        # 與其他 agent 及 Ollama 溝通的共用 HTTP session（需要 event loop，延遲建立）
+        self._session: Optional[aiohttp.ClientSession] = None
+        
+        # 完整報告的快取（以 action + 正規化查詢為鍵），避免短時間內重複執行整個工作流
+        self._report_cache = TTLCache(
+            maxsize=config.REPORT_CACHE_SIZE,
+            ttl=config.REPORT_CACHE_TTL
+        )
+        
+        # 萃取結果快取（以頁面 URL + 內容雜湊為鍵），同樣的頁面不再重複呼叫 LLM 萃取
+        self._extraction_cache = TTLCache(
+            maxsize=config.EXTRACTION_CACHE_SIZE,
+            ttl=config.EXTRACTION_CACHE_TTL
+        )
+        
+        # LLM 回應快取：精確比對 prompt 雜湊，可選擇以 embedding 相似度比對相近的 prompt
+        self._llm_cache = LLMCache(
+            maxsize=config.LLM_CACHE_SIZE,
+            ttl=config.LLM_CACHE_TTL,
+            threshold=config.LLM_SEMANTIC_THRESHOLD,
+            embed_fn=self.report_generator._embed if config.LLM_SEMANTIC_CACHE else None
+        )
+        
+        # 報告語意快取（可選）：以查詢的 embedding 比對，措辭不同但意思相同的查詢共用同一份報告
+        self._semantic_report_cache: Optional[LLMCache] = None
+        if config.REPORT_SEMANTIC_CACHE:
+            self._semantic_report_cache = LLMCache(
+                maxsize=config.REPORT_CACHE_SIZE,
+                ttl=config.REPORT_SEMANTIC_TTL,
+                threshold=config.REPORT_SEMANTIC_THRESHOLD,
+                embed_fn=self.report_generator._embed
+            )
+        
+        # 充足度判斷快取（以判斷模型 + 正規化查詢 + 實體名稱集合為鍵），萃取新資料時依查詢失效
+        self._sufficiency_cache = TTLCache(
+            maxsize=config.LLM_CACHE_SIZE,
+            ttl=config.SUFFICIENCY_CACHE_TTL
+        )
+        
+        # 實體名稱（與查詢）的單位向量快取，供 embedding 預篩使用
+        self._embedding_cache = LRUCache(maxsize=config.EMBED_CACHE_SIZE)
+        
+        # 等待合併送出的 embedding 請求：(文字列表, future)，短時間內的並行請求合成一次 /api/embed
+        self._embed_pending: List[Tuple[List[str], asyncio.Future]] = []
+        self._embed_timer: Optional[asyncio.TimerHandle] = None
+        self._embed_tasks: set = set()  # 保留送出中的批次 task 參考，避免被回收
+        
+        # 進行中的請求（single-flight）：相同鍵的並行呼叫共用同一個結果
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        
+        # Neo4j 現有資料的短期快取（以正規化查詢為鍵），萃取成功後失效
+        self._knowledge_cache = TTLCache(
+            maxsize=config.KNOWLEDGE_CACHE_SIZE,
+            ttl=config.KNOWLEDGE_CACHE_TTL
+        )
+        
+        # 預先爬取（與 Neo4j 查詢 / LLM 判斷並行）的同時上限，避免資料充足時浪費太多資源
+        self._speculative_slots = asyncio.Semaphore(config.MAX_SPECULATIVE_SCRAPES)
+        
+        # 下游服務（其他 agent 與 Ollama）的斷路器，持續故障時快速失敗
+        self._breakers = {
+            name: CircuitBreaker(
+                name,
+                fail_max=config.BREAKER_FAIL_MAX,
+                reset_timeout=config.BREAKER_RESET_TIMEOUT
+            )
+            for name in ("web_scraping", "data_extraction", "ollama")
+        }
+        
+        # 快取命中統計與查詢頻率（頻率於關閉時寫入磁碟，啟動時用來預熱快取）
+        self._cache_stats: Dict[str, Dict[str, int]] = {
+            name: {"hits": 0, "misses": 0}
+            for name in ("report", "knowledge", "extraction", "llm", "sufficiency")
+        }
+        self._query_counter = self._load_query_stats()
+        
+        logger.info("🔧 Analysis Agent 配置:")
+        logger.info("   - 最大迭代次數: %s", self.max_iterations)
+        logger.info("   - 每次爬取 URL 數: %s", self.urls_per_iteration)
+        logger.info("   - Ollama 模型: %s（判斷: %s）", self.model_name, self.judge_model)
+    
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """
+        取得共用的 aiohttp session（延遲建立，重複使用連線）
+        """
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=config.HTTP_POOL_LIMIT,
+                limit_per_host=config.HTTP_POOL_LIMIT_PER_HOST,
+                keepalive_timeout=config.HTTP_KEEPALIVE_TIMEOUT,
+                # 各 agent 的位址固定，不必每次建立新連線都重新解析
+                ttl_dns_cache=config.HTTP_DNS_CACHE_TTL
+            )
+            # 使用 orjson 序列化請求內容（爬取的全文可能很大）
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                json_serialize=lambda obj: orjson.dumps(obj).decode("utf-8")
+            )
+        return self._session
+    
+    async def close(self):
+        """
+        關閉共用的 HTTP 連線並保存查詢頻率（於應用程式關閉時呼叫）
+        """
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._db_pool.shutdown(wait=False, cancel_futures=True)
+        self.report_generator.close()
+        self.save_query_stats()
+    
+    def _load_query_stats(self) -> Counter:
+        """
+        載入先前記錄的查詢頻率
+        """
+        try:
+            with open(config.QUERY_STATS_PATH, "r", encoding="utf-8") as f:
+                return Counter(json.load(f))
+        except FileNotFoundError:
+            return Counter()
+        except Exception as e:
+            logger.warning("⚠️ 無法載入查詢頻率: %s", e)
+            return Counter()
+    
+    def save_query_stats(self):
+        """
+        將查詢頻率寫入磁碟（只保留最常見的查詢）
+        """
+        try:
+            directory = os.path.dirname(config.QUERY_STATS_PATH)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            top = dict(self._query_counter.most_common(config.QUERY_STATS_KEEP))
+            with open(config.QUERY_STATS_PATH, "w", encoding="utf-8") as f:
+                json.dump(top, f, ensure_ascii=False)
+        except Exception as e:
+            logger.warning("⚠️ 無法儲存查詢頻率: %s", e)
+    
+    async def warm_up(self):
+        """
+        啟動時預熱：載入 Ollama 模型並建立 Neo4j 連線池，再預熱常見查詢的快取
+        """
+        await asyncio.gather(
+            self.warm_llm(),
+            self._run_in_db_pool(self.report_generator.warm_up)
+        )
+        await self.warm_cache()
+    
+    async def warm_llm(self):
+        """
+        讓 Ollama 先載入模型（報告模型與判斷模型），並預先計算充足度提示詞固定前綴的 KV 快取，
+        避免第一個請求承擔模型載入時間
+        """
+        url = f"{self.ollama_endpoint}/api/generate"
+        try:
+            # 空白 prompt 只載入模型，不生成
+            for model in dict.fromkeys([self.model_name, self.judge_model]):
+                await self._post_json(
+                    "ollama", url,
+                    {"model": model, "prompt": "", "stream": False},
+                    timeout=config.OLLAMA_WARMUP_TIMEOUT,
+                    retry_timeouts=False
+                )
+            await self._post_json(
+                "ollama", url,
+                {
+                    "model": self.judge_model,
+                    "prompt": _SUFFICIENCY_PROMPT_PREFIX,
+                    "stream": False,
+                    "options": {"num_predict": 1}
+                },
+                timeout=config.OLLAMA_WARMUP_TIMEOUT,
+                retry_timeouts=False
+            )
+            logger.info("✅ Ollama 模型已預熱: %s, %s", self.model_name, self.judge_model)
+        except Exception as e:
+            logger.warning("⚠️ Ollama 預熱失敗: %s", e)
     
-    def _query_ollama(self, prompt: str, temperature: float = None) -> str:
+    async def warm_cache(self, top_queries: Optional[List[str]] = None):
         """
-        呼叫 Ollama API
+        預熱 Neo4j 查詢快取；未指定時使用最常見的查詢
+        """
+        if top_queries is None:
+            top_queries = [q for q, _ in self._query_counter.most_common(config.CACHE_WARM_TOP_N)]
+        if not top_queries:
+            return
+        
+        logger.info("🔥 預熱快取: %s 個常見查詢", len(top_queries))
+        semaphore = asyncio.Semaphore(config.CACHE_WARM_CONCURRENCY)
+        
+        async def warm(query: str):
+            async with semaphore:
+                await self._query_knowledge(query)
+        
+        results = await asyncio.gather(*(warm(q) for q in top_queries), return_exceptions=True)
+        failed = sum(1 for r in results if isinstance(r, Exception))
+        logger.info("✅ 快取預熱完成: 成功 %s, 失敗 %s", len(results) - failed, failed)
+    
+    def _record_cache(self, name: str, hit: bool):
+        """
+        記錄快取命中/未命中
+        """
+        self._cache_stats[name]["hits" if hit else "misses"] += 1
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """
+        返回各快取的命中統計與目前大小
+        """
+        caches = {
+            "report": self._report_cache,
+            "knowledge": self._knowledge_cache,
+            "extraction": self._extraction_cache,
+            "llm": self._llm_cache,
+            "sufficiency": self._sufficiency_cache,
+        }
+        stats = {}
+        for name, cache in caches.items():
+            counts = self._cache_stats[name]
+            total = counts["hits"] + counts["misses"]
+            stats[name] = {
+                **counts,
+                "hit_rate": round(counts["hits"] / total, 3) if total else 0.0,
+                "size": len(cache),
+                "maxsize": cache.maxsize,
+            }
+        stats["top_queries"] = self._query_counter.most_common(config.CACHE_WARM_TOP_N)
+        return stats
+    
+    async def _post_json(
+        self,
+        service: str,
+        url: str,
+        payload: Dict[str, Any],
+        timeout: float,
+        retry_timeouts: bool = True
+    ) -> Dict[str, Any]:
+        """
+        POST JSON 到其他 agent：暫時性錯誤以指數退避重試，並經過該服務的斷路器
+        """
+        session = await self._get_session()
+        
+        async def call():
+            async with session.post(
+                url,
+                json=payload,
+                timeout=aiohttp.ClientTimeout(total=timeout)
+            ) as response:
+                response.raise_for_status()
+                if response.content_type == "application/x-ndjson":
+                    return await self._read_ndjson(response)
+                return orjson.loads(await response.read())
+        
+        return await call_with_retry(
+            call,
+            self._breakers[service],
+            attempts=config.RETRY_ATTEMPTS,
+            base_delay=config.RETRY_BASE_DELAY,
+            max_delay=config.RETRY_MAX_DELAY,
+            retry_timeouts=retry_timeouts
+        )
+    
+    @staticmethod
+    async def _read_ndjson(response: aiohttp.ClientResponse) -> Dict[str, Any]:
+        """
+        逐行解析 NDJSON 萃取結果（entity / relationship / summary），
+        不需先把整個回應讀進記憶體
+        """
+        result: Dict[str, Any] = {"entities": [], "relationships": []}
+        
+        def handle(line: bytes):
+            if not line.strip():
+                return
+            frame = orjson.loads(line)
+            kind = frame.get("kind")
+            if kind == "entity":
+                result["entities"].append(frame["item"])
+            elif kind == "relationship":
+                result["relationships"].append(frame["item"])
+            elif kind == "summary":
+                result.update(frame["item"])
+        
+        # 只切分新收到的區塊；跨區塊的未完成行先暫存片段，遇到換行才合併，不會重複掃描已讀取的內容
+        pending: List[bytes] = []
+        async for chunk, _ in response.content.iter_chunks():
+            *lines, rest = chunk.split(b"\n")
+            if lines:
+                lines[0] = b"".join(pending) + lines[0]
+                pending.clear()
+                for line in lines:
+                    handle(line)
+            pending.append(rest)
+        handle(b"".join(pending))
+        
+        return result
+    
+    async def _run_in_pool(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        在 ReportGenerator 專用執行緒池中執行同步呼叫
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, partial(func, *args, **kwargs))
+    
+    async def _run_in_db_pool(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        在 Neo4j 專用執行緒池中執行同步查詢
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._db_pool, partial(func, *args, **kwargs))
+    
+    def breaker_stats(self) -> Dict[str, Any]:
+        """
+        返回各下游服務的斷路器狀態與重試統計
+        """
+        stats = {name: breaker.stats() for name, breaker in self._breakers.items()}
+        stats["report_llm"] = self.report_generator.breaker.stats()
+        return stats
+    
+    @staticmethod
+    def _normalize_query(query: str) -> str:
+        """
+        正規化查詢字串作為快取鍵（合併多餘空白；大小寫會影響 Neo4j 比對，故保留）
+        """
+        return " ".join(query.split())
+    
+    async def _singleflight(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        合併相同鍵的並行請求：第一個呼叫者建立獨立的 task 執行，所有呼叫者（包含第一個）等待同一個結果
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            
+            def done(t: asyncio.Future):
+                if self._inflight.get(key) is t:
+                    del self._inflight[key]
+                if not t.cancelled():
+                    t.exception()  # 標記為已讀取，避免沒有等待者時出現警告
+            
+            task.add_done_callback(done)
+        
+        # shield：呼叫者被取消時只有自己離開，task 繼續執行，不影響其他呼叫者
+        return await asyncio.shield(task)
+    
+    async def _query_knowledge(self, query: str) -> Dict[str, Any]:
+        """
+        查詢 Neo4j 現有資料，命中快取時直接返回；並行的相同查詢只送出一次
+        """
+        key = self._normalize_query(query)
+        cached = self._knowledge_cache.get(key)
+        self._record_cache("knowledge", cached is not None)
+        if cached is not None:
+            logger.info("   ♻️ 使用快取的 Neo4j 資料")
+            return cached
+        
+        neo4j_data = await self._singleflight(
+            ("knowledge", key),
+            lambda: self._run_in_db_pool(self.report_generator._query_neo4j_knowledge, query)
+        )
+        if not neo4j_data.get("error"):
+            self._knowledge_cache[key] = neo4j_data
+        return neo4j_data
+    
+    async def _knowledge_count(self, query: str) -> Optional[int]:
+        """
+        快速取得 Neo4j 中相關實體的數量（只取數量）；已有快取時使用快取的實體數，查詢失敗時返回 None
+        """
+        cached = self._knowledge_cache.get(self._normalize_query(query))
+        if cached is not None:
+            return len(cached.get("entities", []))
+        
+        counts = await self._run_in_db_pool(self.report_generator._query_neo4j_counts, query)
+        if counts.get("error"):
+            return None
+        return counts.get("entity_count", 0)
+    
+    def invalidate_knowledge_cache(self, query: Optional[str] = None):
+        """
+        使 Neo4j 資料快取失效；未指定查詢時清除全部
+        
+        新萃取的實體可能符合任何查詢的關鍵詞，因此萃取後預設清除全部
+        """
+        if query is None:
+            self._knowledge_cache.clear()
+        else:
+            self._knowledge_cache.pop(self._normalize_query(query), None)
+    
+    def invalidate_report_cache(self, query: Optional[str] = None):
+        """
+        使報告快取失效；未指定查詢時清除全部
+        """
+        # 語意快取無法得知哪些相近查詢受新資料影響，一律清除
+        if self._semantic_report_cache is not None:
+            self._semantic_report_cache.clear()
+        
+        if query is None:
+            self._report_cache.clear()
+            return
+        
+        normalized = self._normalize_query(query)
+        for key in [k for k in self._report_cache.keys() if k[1] == normalized]:
+            self._report_cache.pop(key, None)
+    
+    async def _get_cached_report(self, key: Tuple[Any, str]) -> Optional[Dict[str, Any]]:
+        """
+        先以正規化查詢精確比對報告快取，未命中時再以語意快取比對相近的查詢
+        """
+        cached = self._report_cache.get(key)
+        if cached is None and self._semantic_report_cache is not None and key[1]:
+            # 語意比對需要呼叫 embedding API，放到執行緒池
+            cached = await self._run_in_pool(
+                self._semantic_report_cache.get, key[1], str(key[0])
+            )
+            if cached is not None:
+                logger.info("♻️ 語意快取命中相近查詢的報告")
+        self._record_cache("report", cached is not None)
+        return cached
+    
+    async def _cache_report(self, key: Tuple[Any, str], result: Dict[str, Any]):
+        """
+        將成功的報告寫入報告快取（及語意快取）
+        """
+        self._report_cache[key] = result
+        if self._semantic_report_cache is not None and key[1]:
+            await self._run_in_pool(self._semantic_report_cache.set, key[1], result, str(key[0]))
+    
+    async def _query_ollama(
+        self,
+        prompt: str,
+        temperature: float = None,
+        format: Optional[str] = None,
+        model: Optional[str] = None,
+        num_predict: Optional[int] = None
+    ) -> str:
+        """
+        呼叫 Ollama API；format="json" 時由 Ollama 以語法限制輸出合法 JSON，
+        num_predict 限制輸出 token 數（短答案不必等模型自行停止）
         """
         if temperature is None:
             temperature = config.OLLAMA_TEMPERATURE
-            
+        model = model or self.model_name
+        
+        namespace = f"{model}|{temperature}|{format}|{num_predict}"
+        if self._llm_cache.semantic_enabled:
+            # 語意比對需要呼叫 embedding API，放到執行緒池
+            cached = await self._run_in_pool(self._llm_cache.get, prompt, namespace)
+        else:
+            cached = self._llm_cache.get(prompt, namespace)
+        self._record_cache("llm", cached is not None)
+        if cached is not None:
+            return cached
+        
+        # 相同 prompt 的並行呼叫只送出一次生成請求
+        key = ("llm", namespace, hashlib.blake2b(prompt.encode("utf-8"), digest_size=16).digest())
+        return await self._singleflight(
+            key,
+            lambda: self._generate_ollama(prompt, model, temperature, format, num_predict, namespace)
+        )
+    
+    async def _generate_ollama(
+        self,
+        prompt: str,
+        model: str,
+        temperature: float,
+        format: Optional[str],
+        num_predict: Optional[int],
+        namespace: str
+    ) -> str:
+        """
+        實際呼叫 Ollama /api/generate 並寫入 LLM 快取
+        """
         try:
-            response = requests.post(
+            # 生成逾時不重試，避免重複佔用模型
+            result = await self._post_json(
+                "ollama",
                 f"{self.ollama_endpoint}/api/generate",
-                json={
-                    "model": self.model_name,
+                {
+                    "model": model,
                     "prompt": prompt,
-                    "temperature": temperature,
-                    "stream": False
+                    "stream": False,
+                    # 取樣參數必須放在 options 內，放在最外層會被 Ollama 忽略
+                    "options": {
+                        "temperature": temperature,
+                        **({"num_predict": num_predict} if num_predict else {})
+                    },
+                    **({"format": format} if format else {})
                 },
-                timeout=config.OLLAMA_TIMEOUT
+                timeout=config.OLLAMA_TIMEOUT,
+                retry_timeouts=False
             )
-            response.raise_for_status()
-            result = response.json()
-            return result.get("response", "").strip()
+            response_text = result.get("response", "").strip()
+            if response_text:
+                if self._llm_cache.semantic_enabled:
+                    await self._run_in_pool(self._llm_cache.set, prompt, response_text, namespace)
+                else:
+                    self._llm_cache.set(prompt, response_text, namespace)
+            return response_text
         except Exception as e:
-            logger.error(f"❌ Ollama 呼叫失敗: {e}")
+            logger.error("❌ Ollama 呼叫失敗: %s", e)
             raise
     
-    def _check_data_sufficiency_with_llm(
+    async def _check_data_sufficiency_with_llm(
         self, 
         query: str, 
         entities: List[Dict], 
         relationships: List[Dict],
         iteration: int = 0
-    ) -> Dict[str, Any]:
+    ) -> Sufficiency:
+        """
+        使用 LLM 判斷資料是否充足以撰寫報告（相同查詢與實體時直接使用快取結果）
         """
-        使用 LLM 判斷資料是否充足以撰寫報告
+        cache_key = self._sufficiency_cache_key(query, entities, relationships)
+        cached = self._sufficiency_cache.get(cache_key)
+        self._record_cache("sufficiency", cached is not None)
+        if cached is not None:
+            logger.info("♻️ 使用快取的充足度判斷")
+            return cached
         
-        Returns:
-            {
-                "is_sufficient": bool,
-                "reason": str,
-                "missing_aspects": List[str],
-                "confidence": float
-            }
+        # 相同查詢與資料的並行判斷共用同一次結果
+        return await self._singleflight(
+            ("sufficiency",) + cache_key,
+            lambda: self._judge_sufficiency(query, entities, relationships, iteration, cache_key)
+        )
+    
+    async def _judge_sufficiency(
+        self,
+        query: str,
+        entities: List[Dict],
+        relationships: List[Dict],
+        iteration: int,
+        cache_key: Tuple[str, bytes]
+    ) -> Sufficiency:
+        """
+        快速路徑、預篩或呼叫判斷模型決定充足度，並寫入充足度快取
         """
+        # 沒有任何實體時答案一定是「不足」，不必讓 LLM 判斷
+        if not entities:
+            logger.info("📭 沒有相關實體，略過 LLM 判斷")
+            return self._fallback_sufficiency_check(entities, relationships)
+        
+        # 尚未爬取任何新資料時 LLM 無從判斷資料是否過時；資料庫資料量已足夠就直接生成報告
+        if (
+            iteration == 0
+            and config.FASTPATH_MIN_ENTITIES > 0
+            and len(entities) >= config.FASTPATH_MIN_ENTITIES
+            and len(relationships) >= config.FASTPATH_MIN_RELATIONSHIPS
+        ):
+            logger.info("⚡ 資料庫已有 %s 實體 / %s 關係，略過 LLM 判斷", len(entities), len(relationships))
+            result = Sufficiency(
+                is_sufficient=True,
+                confidence=1.0,
+                reason=f"資料庫快速路徑：{len(entities)} 實體, {len(relationships)} 關係",
+                coverage_score=min(100, len(entities) * 10 + len(relationships) * 15)
+            )
+            self._sufficiency_cache[cache_key] = result
+            return result
+        
+        # 相似度明確偏高或偏低時不必呼叫 LLM
+        result = await self._prefilter_sufficiency(query, entities)
+        if result is not None:
+            self._sufficiency_cache[cache_key] = result
+            return result
+        
         # 構建實體摘要
         entity_summary = self._summarize_entities(entities)
         relationship_summary = self._summarize_relationships(relationships)
         
-        prompt = f"""你是一個專業的市場分析助理。請判斷以下資料是否足以撰寫一份完整的市場分析報告。
-
+        prompt = f"""{_SUFFICIENCY_PROMPT_PREFIX}
 查詢主題: {query}
 
 目前收集的資料:
@@ -88,56 +698,218 @@ class AnalysisAgent:
 {entity_summary}
 
 關係摘要:
-{relationship_summary}
-
-請評估:
-1. 資料是否涵蓋主題的核心面向？
-2. 是否有足夠的細節支撐分析？
-3. 關係是否足以建立因果或關聯分析？
-4. 還缺少哪些重要資訊？
-
-請以 JSON 格式回應（只回傳 JSON，不要其他文字）:
-{{
-    "is_sufficient": true/false,
-    "confidence": 0.0-1.0,
-    "reason": "簡短說明",
-    "missing_aspects": ["缺少的面向1", "缺少的面向2"],
-    "coverage_score": 0-100
-}}"""
+{relationship_summary}"""
 
         try:
-            llm_response = self._query_ollama(prompt, temperature=0.3)
-            
-            # 嘗試解析 JSON
-            # 移除可能的 markdown 標記
-            llm_response = llm_response.replace("```json", "").replace("```", "").strip()
+            llm_response = await self._query_ollama(
+                prompt,
+                temperature=0.3,
+                format="json",
+                model=self.judge_model,
+                num_predict=config.SUFFICIENCY_NUM_PREDICT
+            )
             
-            result = json.loads(llm_response)
+            # JSON 模式下應為合法 JSON，直接解析；失敗時才逐字元取出第一個完整的 {...} 區塊
+            try:
+                parsed = orjson.loads(llm_response)
+            except orjson.JSONDecodeError:
+                parsed = orjson.loads(self._extract_json_block(llm_response))
+            result = Sufficiency.from_llm(parsed)
             
-            logger.info(f"🤖 LLM 判斷結果:")
-            logger.info(f"   充足度: {' 充足' if result.get('is_sufficient') else ' 不足'}")
+            logger.info("🤖 LLM 判斷結果:")
+            logger.info("   充足度: %s", ' 充足' if result.is_sufficient else ' 不足')
 
-            logger.info(f"   原因: {result.get('reason', 'N/A')}")
-            if result.get('missing_aspects'):
-                logger.info(f"   缺少面向: {', '.join(result.get('missing_aspects', []))}")
+            logger.info("   原因: %s", result.reason or 'N/A')
+            if result.missing_aspects:
+                logger.info("   缺少面向: %s", ', '.join(result.missing_aspects))
             
+            self._sufficiency_cache[cache_key] = result
             return result
             
-        except json.JSONDecodeError as e:
-            logger.warning(f"⚠️ LLM 回應解析失敗: {e}")
-            logger.warning(f"   原始回應: {llm_response[:200]}")
+        except orjson.JSONDecodeError as e:
+            logger.warning("⚠️ LLM 回應解析失敗: %s", e)
+            logger.warning("   原始回應: %s", llm_response[:200])
             
             # 降級處理：使用簡單規則
             return self._fallback_sufficiency_check(entities, relationships)
         except Exception as e:
-            logger.error(f"❌ LLM 判斷失敗: {e}")
+            logger.error("❌ LLM 判斷失敗: %s", e)
             return self._fallback_sufficiency_check(entities, relationships)
     
+    async def _embed_texts(self, texts: List[str]) -> List[List[float]]:
+        """
+        取得文字向量；EMBED_BATCH_WAIT_MS 內的並行請求合併成一次 /api/embed 呼叫
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._embed_pending.append((texts, future))
+        
+        if sum(len(t) for t, _ in self._embed_pending) >= config.EMBED_BATCH_MAX:
+            self._flush_embeddings()
+        elif self._embed_timer is None:
+            self._embed_timer = loop.call_later(config.EMBED_BATCH_WAIT_MS / 1000, self._flush_embeddings)
+        return await future
+    
+    def _flush_embeddings(self):
+        """
+        送出目前累積的 embedding 請求
+        """
+        if self._embed_timer is not None:
+            self._embed_timer.cancel()
+            self._embed_timer = None
+        pending, self._embed_pending = self._embed_pending, []
+        if pending:
+            task = asyncio.create_task(self._embed_batch(pending))
+            self._embed_tasks.add(task)
+            task.add_done_callback(self._embed_tasks.discard)
+    
+    async def _embed_batch(self, pending: List[Tuple[List[str], asyncio.Future]]):
+        """
+        以一次請求取得多個呼叫端的向量（重複的文字只送一次），再分配回各自的 future
+        """
+        unique = list(dict.fromkeys(text for texts, _ in pending for text in texts))
+        try:
+            vectors = dict(zip(unique, await self._request_embeddings(unique)))
+        except Exception as e:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        if len(pending) > 1:
+            logger.info("🧮 合併 %s 個 embedding 請求（%s 段文字）", len(pending), len(unique))
+        for texts, future in pending:
+            if not future.done():
+                future.set_result([vectors[text] for text in texts])
+    
+    async def _request_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """
+        以 Ollama /api/embed 批次取得文字向量
+        """
+        result = await self._post_json(
+            "ollama",
+            f"{self.ollama_endpoint}/api/embed",
+            {"model": config.EMBED_MODEL, "input": texts},
+            timeout=config.OLLAMA_TIMEOUT
+        )
+        embeddings = result.get("embeddings") or []
+        if len(embeddings) != len(texts):
+            raise ValueError(f"embedding 數量不符: {len(embeddings)}/{len(texts)}")
+        return embeddings
+    
+    async def _prefilter_sufficiency(self, query: str, entities: List[Dict]) -> Optional[Sufficiency]:
+        """
+        以查詢與實體名稱的餘弦相似度預篩充足度；結果不明確（或無法取得 embedding）時返回 None，交給 LLM 判斷
+        """
+        if not config.EMBED_PREFILTER or not entities:
+            return None
+        np = optional_numpy()
+        if np is None:
+            return None
+        
+        names = list(dict.fromkeys(str(e["name"]) for e in entities if e.get("name")))
+        if not names:
+            return None
+        
+        vectors = {text: self._embedding_cache.get(text) for text in [query, *names]}
+        missing = [text for text, vector in vectors.items() if vector is None]
+        if missing:
+            try:
+                embeddings = await self._embed_texts(missing)
+            except Exception as e:
+                logger.warning("⚠️ 取得 embedding 失敗，改由 LLM 判斷: %s", e)
+                return None
+            for text, embedding in zip(missing, embeddings):
+                vector = np.asarray(embedding, dtype=np.float32)
+                norm = np.linalg.norm(vector)
+                vector = vector / norm if norm else vector
+                vectors[text] = self._embedding_cache[text] = vector
+        
+        similarities = np.vstack([vectors[name] for name in names]) @ vectors[query]
+        best = float(similarities.max())
+        matches = int((similarities > config.PREFILTER_MATCH).sum())
+        logger.info("🧮 Embedding 預篩: 最高相似度 %.2f, 相關實體 %s 個", best, matches)
+        
+        if best > config.PREFILTER_HIGH and matches >= config.PREFILTER_MIN_MATCHES:
+            return Sufficiency(
+                is_sufficient=True,
+                confidence=best,
+                reason=f"Embedding 預篩：{matches} 個實體與查詢高度相關",
+                coverage_score=min(100, matches * 10)
+            )
+        if best < config.PREFILTER_LOW:
+            return Sufficiency(
+                is_sufficient=False,
+                confidence=1 - best,
+                reason="Embedding 預篩：現有實體與查詢無明顯關聯",
+                coverage_score=0
+            )
+        return None
+    
+    def _sufficiency_cache_key(
+        self,
+        query: str,
+        entities: List[Dict],
+        relationships: List[Dict]
+    ) -> Tuple[str, bytes]:
+        """
+        充足度判斷的快取鍵：(正規化查詢, 判斷模型 + 實體名稱集合 + 關係數的雜湊)
+        """
+        names = sorted({str(e.get("name", "")) for e in entities})
+        digest = hashlib.sha256(
+            f"{self.judge_model}|{len(relationships)}|".encode("utf-8")
+        )
+        digest.update("\x00".join(names).encode("utf-8"))
+        return self._normalize_query(query), digest.digest()
+    
+    def invalidate_sufficiency_cache(self, query: Optional[str] = None):
+        """
+        使充足度判斷快取失效；未指定查詢時清除全部
+        """
+        if query is None:
+            self._sufficiency_cache.clear()
+            return
+        
+        normalized = self._normalize_query(query)
+        for key in [k for k in self._sufficiency_cache.keys() if k[0] == normalized]:
+            self._sufficiency_cache.pop(key, None)
+    
+    @staticmethod
+    def _extract_json_block(text: str) -> str:
+        """
+        取出文字中第一個括號平衡的 {...} 區塊（忽略字串內的括號）；找不到時返回原文
+        """
+        start = text.find("{")
+        if start < 0:
+            return text
+        
+        depth = 0
+        in_string = False
+        escaped = False
+        for i in range(start, len(text)):
+            ch = text[i]
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif ch == "\\":
+                    escaped = True
+                elif ch == '"':
+                    in_string = False
+            elif ch == '"':
+                in_string = True
+            elif ch == "{":
+                depth += 1
+            elif ch == "}":
+                depth -= 1
+                if depth == 0:
+                    return text[start:i + 1]
+        return text[start:]
+    
     def _fallback_sufficiency_check(
         self, 
         entities: List[Dict], 
         relationships: List[Dict]
-    ) -> Dict[str, Any]:
+    ) -> Sufficiency:
         """
         降級方案：使用簡單規則判斷
         """
@@ -151,13 +923,13 @@ class AnalysisAgent:
         )
         coverage_score = min(100, (entity_count * 10 + rel_count * 15))
         
-        return {
-            "is_sufficient": is_sufficient,
-            "confidence": 0.6,
-            "reason": f"基於規則判斷：{entity_count} 實體, {rel_count} 關係",
-            "missing_aspects": ["需要更多資料"] if not is_sufficient else [],
-            "coverage_score": coverage_score
-        }
+        return Sufficiency(
+            is_sufficient=is_sufficient,
+            confidence=0.6,
+            reason=f"基於規則判斷：{entity_count} 實體, {rel_count} 關係",
+            missing_aspects=["需要更多資料"] if not is_sufficient else [],
+            coverage_score=coverage_score
+        )
     
     def _summarize_entities(self, entities: List[Dict]) -> str:
         """
@@ -166,16 +938,14 @@ class AnalysisAgent:
         if not entities:
             return "無實體資料"
         
-        # 統計實體類型
-        type_counts = {}
-        for entity in entities[:20]:  # 只看前 20 個
-            entity_type = entity.get("type", "Unknown")
-            type_counts[entity_type] = type_counts.get(entity_type, 0) + 1
+        # 統計實體類型（只看前 20 個）
+        head = list(islice(entities, 20))
+        type_counts = Counter(e.get("type", "Unknown") for e in head)
         
         summary_lines = [f"- {type_}: {count} 個" for type_, count in type_counts.items()]
         
         # 列出一些實體名稱
-        sample_names = [e.get("name", "N/A") for e in entities[:5]]
+        sample_names = [str(e.get("name", "N/A"))[:40] for e in head[:5]]
         summary_lines.append(f"範例: {', '.join(sample_names)}")
         
         return "\n".join(summary_lines)
@@ -187,21 +957,38 @@ class AnalysisAgent:
         if not relationships:
             return "無關係資料"
         
-        # 統計關係類型
-        type_counts = {}
-        for rel in relationships[:20]:  # 只看前 20 個
-            rel_type = rel.get("type", "Unknown")
-            type_counts[rel_type] = type_counts.get(rel_type, 0) + 1
+        # 統計關係類型（只看前 20 個；Neo4j 查詢結果的類型欄位為 relation）
+        type_counts = Counter(
+            r.get("relation") or r.get("type", "Unknown") for r in islice(relationships, 20)
+        )
         
         summary_lines = [f"- {type_}: {count} 個" for type_, count in type_counts.items()]
         
         return "\n".join(summary_lines)
     
-    def _generate_focused_query(self, query: str, missing_aspects: List[str], iteration: int) -> str:
+    async def _generate_focused_queries(
+        self,
+        query: str,
+        missing_aspects: List[str],
+        iteration: int
+    ) -> List[str]:
         """
-        根據缺少的面向生成單一聚焦的搜尋查詢
+        針對最重要的幾個缺少面向並行生成搜尋查詢
+        
+        數量由 QUERIES_PER_ITERATION 控制（預設 1，避免過度爬取）
+        """
+        aspects = missing_aspects[:max(1, config.QUERIES_PER_ITERATION)]
+        if not aspects:
+            return [query]
         
-        每次迭代只生成一個最重要的查詢，避免過度爬取
+        queries = await asyncio.gather(
+            *(self._generate_focused_query(query, [aspect], iteration) for aspect in aspects)
+        )
+        return list(dict.fromkeys(queries))
+    
+    async def _generate_focused_query(self, query: str, missing_aspects: List[str], iteration: int) -> str:
+        """
+        根據缺少的面向生成單一聚焦的搜尋查詢
         """
         if not missing_aspects:
             return query
@@ -209,18 +996,15 @@ class AnalysisAgent:
         # 簡化版：直接結合原查詢和第一個缺少的面向
         focused_aspect = missing_aspects[0] if missing_aspects else ""
         
-        prompt = f"""基於以下資訊，生成一個精確的搜尋查詢來補充缺少的資訊。
-
+        prompt = f"""{_FOCUSED_QUERY_PROMPT_PREFIX}
 原始查詢: {query}
 最需要補充的面向: {focused_aspect}
-當前迭代: {iteration + 1}
-
-請生成一個結合原查詢和缺少面向的搜尋查詢。
-只需回傳查詢文字，不要其他說明。
-範例: 台灣 AI 產業 供應鏈分析"""
+當前迭代: {iteration + 1}"""
 
         try:
-            llm_response = self._query_ollama(prompt, temperature=0.5)
+            llm_response = await self._query_ollama(
+                prompt, temperature=0.5, model=self.judge_model, num_predict=config.QUERY_NUM_PREDICT
+            )
             # 取第一行作為查詢
             generated_query = llm_response.split("\n")[0].strip()
             
@@ -229,20 +1013,118 @@ class AnalysisAgent:
             
             if len(generated_query) > 100 or len(generated_query) < 3:
                 # 如果生成的查詢不合理，使用簡單組合
-                logger.warning(f"⚠️ LLM 生成的查詢不合理: {generated_query}")
+                logger.warning("⚠️ LLM 生成的查詢不合理: %s", generated_query)
                 generated_query = f"{query} {focused_aspect}"
             
-            logger.info(f"🔍 生成聚焦查詢: {generated_query}")
+            logger.info("🔍 生成聚焦查詢: %s", generated_query)
             return generated_query
             
         except Exception as e:
-            logger.warning(f"⚠️ 生成聚焦查詢失敗: {e}")
+            logger.warning("⚠️ 生成聚焦查詢失敗: %s", e)
             # 降級：簡單組合
             return f"{query} {focused_aspect}" if focused_aspect else query
     
     async def orchestrate_workflow(self, request: Dict[str, Any]) -> Dict[str, Any]:
         """
-        迭代式工作流：不斷搜尋直到資料充足
+        執行工作流；短時間內的重複請求直接返回快取的報告，
+        相同 (action, query) 的並行請求共用同一次執行結果
+        """
+        key = (request.get("action"), self._normalize_query(request.get("query") or ""))
+        
+        if key[1]:
+            self._query_counter[key[1]] += 1
+        
+        cached = await self._get_cached_report(key)
+        if cached is not None:
+            logger.info("♻️ 使用快取的報告: %s", request.get('query'))
+            return cached
+        
+        result = await self._singleflight(("workflow",) + key, lambda: self._run_workflow(request))
+        if result.get("status") == "success":
+            await self._cache_report(key, result)
+        return result
+    
+    async def orchestrate_workflow_stream(
+        self,
+        request: Dict[str, Any]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        串流版工作流：報告文字一生成就以 {"type": "chunk"} 事件送出，最後送出 {"type": "done"}；
+        快取命中或已有相同的非串流工作流執行中時，一次送出完整報告
+        """
+        key = (request.get("action"), self._normalize_query(request.get("query") or ""))
+        
+        if key[1]:
+            self._query_counter[key[1]] += 1
+        
+        result = await self._get_cached_report(key)
+        shared = self._inflight.get(("workflow",) + key) if result is None else None
+        if shared is not None:
+            # 等待執行中的工作流，不另外啟動一次（串流本身各自生成，不提供給其他請求共用）
+            logger.info("🔗 共用執行中的工作流: %s", request.get('query'))
+            try:
+                result = await asyncio.shield(shared)
+            except asyncio.CancelledError:
+                if not shared.cancelled():
+                    raise
+                # 共用的工作流被取消（例如服務關閉），改為自行執行
+            except Exception:
+                pass
+        
+        if result is not None:
+            if shared is None:
+                logger.info("♻️ 使用快取的報告: %s", request.get('query'))
+            yield {"type": "chunk", "text": result.get("report", "")}
+        else:
+            loop = asyncio.get_running_loop()
+            chunks: asyncio.Queue = asyncio.Queue()
+            
+            def on_chunk(text: str):
+                # 由執行緒池呼叫，轉交回 event loop
+                loop.call_soon_threadsafe(chunks.put_nowait, text)
+            
+            task = asyncio.create_task(self._run_workflow(request, on_chunk=on_chunk))
+            task.add_done_callback(lambda _: chunks.put_nowait(None))
+            try:
+                while (text := await chunks.get()) is not None:
+                    yield {"type": "chunk", "text": text}
+                result = task.result()
+            finally:
+                if not task.done():
+                    task.cancel()
+            
+            if result.get("status") == "success":
+                await self._cache_report(key, result)
+            elif result.get("report"):
+                # 失敗時沒有串流任何內容，送出錯誤說明
+                yield {"type": "chunk", "text": result["report"]}
+        
+        yield {"type": "done", **{k: v for k, v in result.items() if k != "report"}}
+    
+    def _start_speculative_scrape(self, query: str) -> Optional[asyncio.Task]:
+        """
+        在判斷資料充足度的同時，先用原始查詢開始搜尋 + 爬取 + 萃取；
+        名額用完或未啟用時返回 None
+        """
+        if not config.SPECULATIVE_SCRAPE or self.max_iterations < 2:
+            return None
+        if self._speculative_slots.locked():
+            return None
+        
+        async def run():
+            async with self._speculative_slots:
+                return await self._search_scrape_and_extract(query, query)
+        
+        logger.info("⚡ 預先開始爬取: %s", query)
+        return asyncio.create_task(run())
+    
+    async def _run_workflow(
+        self,
+        request: Dict[str, Any],
+        on_chunk: Optional[Callable[[str], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        迭代式工作流：不斷搜尋直到資料充足（提供 on_chunk 時報告以串流方式生成）
         
         流程:
         1. 檢查現有資料
@@ -253,82 +1135,150 @@ class AnalysisAgent:
         query = request.get("query")
         action = request.get("action")
         
-        logger.info(f"🎬 開始執行迭代式工作流: {query}")
+        logger.info("🎬 開始執行迭代式工作流: %s", query)
         
         all_scraped_results = []
         iteration = 0
+        speculative: Optional[asyncio.Task] = None
+        sufficiency: Optional[Sufficiency] = None
+        
+        # 本次執行最後一次的 Neo4j 查詢結果；只有萃取到新資料後才需要重新查詢
+        neo4j_data: Optional[Dict[str, Any]] = None
+        dirty = True
         
         try:
             while iteration < self.max_iterations:
-                logger.info(f"\n{'='*60}")
-                logger.info(f"📍 迭代 {iteration + 1}/{self.max_iterations}")
-                logger.info(f"{'='*60}")
+                logger.info("\n%s", '='*60)
+                logger.info("📍 迭代 %s/%s", iteration + 1, self.max_iterations)
+                logger.info("%s", '='*60)
                 
                 # ============ 步驟 1: 查詢現有資料 ============
-                logger.info(f"🔍 步驟 1: 查詢 Neo4j 現有資料")
-                neo4j_data = self.report_generator._query_neo4j_knowledge(query)
-                entities = neo4j_data.get("entities", [])
-                relationships = neo4j_data.get("relationships", [])
-                
-                logger.info(f"📊 當前資料: {len(entities)} 實體, {len(relationships)} 關係")
-                
-                # ============ 步驟 2: LLM 判斷充足度 ============
-                logger.info(f"🤖 步驟 2: LLM 判斷資料充足度")
-                sufficiency = self._check_data_sufficiency_with_llm(
-                    query, entities, relationships, iteration
-                )
+                logger.info("🔍 步驟 1: 查詢 Neo4j 現有資料")
+                entity_count = await self._knowledge_count(query) if iteration == 0 else None
+                if entity_count == 0:
+                    # 圖譜中沒有任何相關實體：不需要取回完整資料，也不需要 LLM 判斷
+                    logger.info("📭 Neo4j 尚無相關資料，直接進入搜尋")
+                    neo4j_data = {"entities": [], "relationships": []}
+                    dirty = False
+                    entities, relationships = [], []
+                    sufficiency = self._fallback_sufficiency_check(entities, relationships)
+                else:
+                    if entity_count is not None and (
+                        config.FASTPATH_MIN_ENTITIES <= 0 or entity_count < config.FASTPATH_MIN_ENTITIES
+                    ):
+                        # 未達快速路徑門檻，資料可能不足：先開始爬取，把 Neo4j 查詢與 LLM 判斷的延遲藏在爬取之後
+                        speculative = self._start_speculative_scrape(query)
+                    
+                    if dirty or neo4j_data is None:
+                        neo4j_data = await self._query_knowledge(query)
+                        dirty = False
+                    else:
+                        logger.info("♻️ 上次迭代未萃取新資料，沿用查詢結果")
+                    entities = neo4j_data.get("entities", [])
+                    relationships = neo4j_data.get("relationships", [])
+                    
+                    logger.info("📊 當前資料: %s 實體, %s 關係", len(entities), len(relationships))
+                    
+                    # ============ 步驟 2: LLM 判斷充足度 ============
+                    if iteration >= self.max_iterations - 1:
+                        # 最後一次迭代不論結果都會生成報告，不再呼叫 LLM 判斷，避免與報告生成搶 Ollama 的並行名額；
+                        # 覆蓋分數沿用上一次迭代的判斷
+                        logger.info("⚠️ 已達最大迭代次數，略過 LLM 判斷")
+                        if sufficiency is None:
+                            sufficiency = self._fallback_sufficiency_check(entities, relationships)
+                        break
+                    logger.info("🤖 步驟 2: LLM 判斷資料充足度")
+                    sufficiency = await self._check_data_sufficiency_with_llm(
+                        query, entities, relationships, iteration
+                    )
                 
                 # ============ 步驟 3: 決定是否繼續 ============
-                if sufficiency.get("is_sufficient", False):
-                    logger.info(f"✅ LLM 判斷資料充足，開始生成報告")
+                if sufficiency.is_sufficient:
+                    logger.info("✅ LLM 判斷資料充足，開始生成報告")
                     break
                 
                 if iteration >= self.max_iterations - 1:
-                    logger.info(f"⚠️ 已達最大迭代次數，強制生成報告")
+                    logger.info("⚠️ 已達最大迭代次數，強制生成報告")
                     break
                 
-                # ============ 步驟 4: 生成新搜尋查詢 ============
-                logger.info(f"📝 步驟 3: 生成補充搜尋查詢")
-                missing_aspects = sufficiency.get("missing_aspects", [])
-                search_query = self._generate_focused_query(query, missing_aspects, iteration)
-                
-                # ============ 步驟 5: 單次搜尋 + 爬取 ============
-                logger.info(f"🔍 步驟 4: 執行搜尋和爬取")
-                logger.info(f"   查詢: {search_query}")
+                if speculative is not None:
+                    # 預先啟動的爬取即為本次迭代的搜尋結果
+                    logger.info("⚡ 步驟 3-4: 使用預先開始的爬取結果")
+                    bundles = [await speculative]
+                    speculative = None
+                else:
+                    # ============ 步驟 4: 生成新搜尋查詢 ============
+                    search_queries = sufficiency.followup_queries[:max(1, config.QUERIES_PER_ITERATION)]
+                    if search_queries:
+                        # 充足度判斷已一併提供補充查詢，省下一次 LLM 呼叫
+                        logger.info("📝 步驟 3: 使用 LLM 判斷時提供的補充查詢")
+                    else:
+                        logger.info("📝 步驟 3: 生成補充搜尋查詢")
+                        search_queries = await self._generate_focused_queries(
+                            query, sufficiency.missing_aspects, iteration
+                        )
+                    
+                    # ============ 步驟 5: 搜尋 + 爬取（多個查詢並行）============
+                    logger.info("🔍 步驟 4: 執行搜尋和爬取")
+                    logger.info("   查詢: %s", search_queries)
+                    
+                    # ============ 步驟 6: 分批萃取並存入 Neo4j（與爬取重疊）============
+                    bundles = await self._search_all(search_queries, query)
                 
-                scraped_data = await self._search_and_scrape(search_query)
+                new_results = [r for bundle in bundles for r in bundle.results]
+                if not new_results:
+                    # 資料量不會改變，再做一次 Neo4j 查詢與 LLM 判斷也只會得到相同結果
+                    logger.warning("   ⚠️ 本次迭代未找到新資料，提前結束迭代")
+                    break
+                all_scraped_results.extend(new_results)
                 
-                if scraped_data.get("results"):
-                    all_scraped_results.extend(scraped_data.get("results", []))
-                    
-                    # ============ 步驟 6: 萃取並存入 Neo4j ============
-                    logger.info(f"   🔬 萃取資料並存入 Neo4j")
-                    await self._extract_data(query, scraped_data)
-                else:
-                    logger.warning(f"   ⚠️ 本次迭代未找到新資料")
+                if any(bundle.extracted_entities for bundle in bundles):
+                    dirty = True
                 
                 iteration += 1
             
+            if speculative is not None:
+                # 資料已充足，不再需要預先爬取的結果
+                logger.info("⏹️ 資料充足，取消預先爬取")
+                speculative.cancel()
+                speculative = None
+            
             # ============ 最終步驟: 生成報告 ============
-            logger.info(f"\n{'='*60}")
-            logger.info(f"📝 最終步驟: 生成報告")
-            logger.info(f"{'='*60}")
+            logger.info("\n%s", '='*60)
+            logger.info("📝 最終步驟: 生成報告")
+            logger.info("%s", '='*60)
             
-            # 重新查詢最終資料
-            final_neo4j_data = self.report_generator._query_neo4j_knowledge(query)
+            # 有新萃取的資料才重新查詢，否則沿用最後一次的結果
+            if dirty or neo4j_data is None:
+                final_neo4j_data = await self._query_knowledge(query)
+            else:
+                logger.info("♻️ 未萃取新資料，沿用最後一次的查詢結果")
+                final_neo4j_data = neo4j_data
             final_entities = final_neo4j_data.get("entities", [])
             final_relationships = final_neo4j_data.get("relationships", [])
             
-            logger.info(f"📊 最終資料: {len(final_entities)} 實體, {len(final_relationships)} 關係")
+            logger.info("📊 最終資料: %s 實體, %s 關係", len(final_entities), len(final_relationships))
             
-            report_data = self.report_generator.generate_report_from_extraction(
-                query=query,
-                entities=final_entities,
-                relationships=final_relationships,
-                search_results=all_scraped_results
-            )
+            if on_chunk is None:
+                # 非串流：直接在 event loop 上等待 Ollama，不佔用報告執行緒（共用本 agent 的 HTTP session）
+                report_data = await self.report_generator.agenerate_report_from_extraction(
+                    query=query,
+                    entities=final_entities,
+                    relationships=final_relationships,
+                    session=await self._get_session(),
+                    search_results=all_scraped_results
+                )
+            else:
+                report_data = await self._run_in_pool(
+                    self.report_generator.generate_report_from_extraction,
+                    query=query,
+                    entities=final_entities,
+                    relationships=final_relationships,
+                    search_results=all_scraped_results,
+                    on_chunk=on_chunk
+                )
             
-            logger.info(f"✅ 報告生成完成")
+            logger.info("✅ 報告生成完成")
             
             return {
                 "status": "success",
@@ -341,13 +1291,13 @@ class AnalysisAgent:
                     "total_scraped_urls": len(all_scraped_results),
                     "final_entities": len(final_entities),
                     "final_relationships": len(final_relationships),
-                    "sufficiency_score": sufficiency.get("coverage_score", 0)
+                    "sufficiency_score": sufficiency.coverage_score
                 },
                 "generated_at": report_data["generated_at"]
             }
             
         except Exception as e:
-            logger.error(f"❌ 工作流執行失敗: {e}", exc_info=True)
+            logger.error("❌ 工作流執行失敗: %s", e, exc_info=True)
             return {
                 "status": "error",
                 "action": action,
@@ -355,58 +1305,209 @@ class AnalysisAgent:
                 "error": str(e),
                 "report": f"# 報告生成失敗\n\n抱歉，生成報告時發生錯誤：{str(e)}"
             }
+        finally:
+            if speculative is not None and not speculative.done():
+                speculative.cancel()
     
-    async def _search_and_scrape(self, query: str) -> Dict[str, Any]:
+    async def _search_all(self, search_queries: List[str], query: str) -> List[SearchBundle]:
         """
-        使用 Tavily 搜尋並爬取網頁（限制數量）
+        多個搜尋查詢並行執行搜尋 + 爬取 + 萃取；單一查詢失敗不影響其他查詢
+        """
+        semaphore = asyncio.Semaphore(config.MAX_PARALLEL_SEARCHES)
+        
+        async def run(search_query: str) -> SearchBundle:
+            async with semaphore:
+                return await self._search_scrape_and_extract(search_query, query)
+        
+        results = await asyncio.gather(*(run(q) for q in search_queries), return_exceptions=True)
+        
+        bundles = []
+        for search_query, result in zip(search_queries, results):
+            if isinstance(result, Exception):
+                logger.error("   ❌ 查詢處理失敗 (%s): %s", search_query, result)
+            else:
+                bundles.append(result)
+        return bundles
+    
+    async def _search_scrape_and_extract(self, search_query: str, query: str) -> SearchBundle:
+        """
+        搜尋 URL 後分批爬取，每批爬完立即萃取，讓萃取與其餘批次的爬取重疊
+        """
+        urls = await self._search_urls(search_query)
+        
+        if not urls:
+            # 降級：由 web_scraping_agent 一次完成搜尋與爬取
+            scraped_data = await self._search_and_scrape(search_query)
+            extracted = 0
+            if scraped_data.get("results"):
+                logger.info("   🔬 萃取資料並存入 Neo4j")
+                extraction = await self._extract_data(query, scraped_data)
+                extracted = extraction.get("statistics", {}).get("total_entities", 0)
+            results = tuple(scraped_data.get("results", []))
+            return SearchBundle(
+                query=search_query,
+                urls=tuple(r.get("url") for r in results if r.get("url")),
+                results=results,
+                extracted_entities=extracted
+            )
+        
+        batch_size = config.SCRAPE_BATCH_SIZE
+        batches = [urls[i:i + batch_size] for i in range(0, len(urls), batch_size)]
+        # 爬取與萃取各自限流：一批爬完即釋放爬取名額，下一批的爬取不必等這批萃取結束
+        scrape_slots = asyncio.Semaphore(config.MAX_CONCURRENT_BATCHES)
+        extract_slots = asyncio.Semaphore(config.MAX_CONCURRENT_EXTRACTIONS)
+        
+        async def scrape_then_extract(batch: List[str]) -> Tuple[Dict[str, Any], int]:
+            async with scrape_slots:
+                scraped = await self._search_and_scrape(search_query, urls=batch)
+            if not scraped.get("results"):
+                return scraped, 0
+            async with extract_slots:
+                logger.info("   🔬 萃取 %s 份資料並存入 Neo4j", len(scraped['results']))
+                extraction = await self._extract_data(query, scraped)
+            return scraped, extraction.get("statistics", {}).get("total_entities", 0)
+        
+        logger.info("   📦 %s 個 URL 分為 %s 批爬取與萃取", len(urls), len(batches))
+        batch_results = await asyncio.gather(*(scrape_then_extract(b) for b in batches))
+        
+        return SearchBundle(
+            query=search_query,
+            urls=tuple(urls),
+            results=tuple(r for scraped, _ in batch_results for r in scraped.get("results", [])),
+            extracted_entities=sum(extracted for _, extracted in batch_results)
+        )
+    
+    async def _search_urls(self, query: str) -> List[str]:
+        """
+        透過 web_scraping_agent 搜尋相關 URL（不爬取）
+        """
+        try:
+            result = await self._post_json(
+                "web_scraping",
+                f"{self.web_scraping_url}/search",
+                {
+                    "query": query,
+                    "max_results": self.urls_per_iteration
+                },
+                timeout=30
+            )
+            
+            # 單次走訪：過濾無法爬取的網址、去重並保留順序，取滿 N 個即停止
+            urls: Dict[str, None] = {}
+            for url in result.get("urls", []):
+                if url not in urls and _is_scrapable_url(url):
+                    urls[url] = None
+                    if len(urls) >= self.urls_per_iteration:
+                        break
+            return list(urls)
+            
+        except Exception as e:
+            logger.warning("   ⚠️ URL 搜尋失敗: %s", e)
+            return []
+    
+    async def _search_and_scrape(self, query: str, urls: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        爬取指定的 URL；未指定時使用 Tavily 搜尋並爬取網頁（限制數量）
         """
         try:
-            response = requests.post(
+            result = await self._post_json(
+                "web_scraping",
                 f"{self.web_scraping_url}/scrape",
-                json={
-                    "urls": [],
+                {
+                    "urls": urls or [],
                     "query": query,
-                    "dynamic_search": True,
+                    "dynamic_search": not urls,
                     "max_results": self.urls_per_iteration  # 限制結果數量
                 },
                 timeout=60
             )
-            response.raise_for_status()
-            result = response.json()
             
             successful = result.get('successful', 0)
-            logger.info(f"   ✅ 爬取完成: {successful}/{self.urls_per_iteration} 個成功")
+            expected = len(urls) if urls else self.urls_per_iteration
+            logger.info("   ✅ 爬取完成: %s/%s 個成功", successful, expected)
             return result
             
         except Exception as e:
-            logger.error(f"   ❌ 搜尋爬取失敗: {e}")
+            logger.error("   ❌ 搜尋爬取失敗: %s", e)
             return {"results": []}
     
+    @staticmethod
+    def _extraction_cache_key(scraped_data: Dict[str, Any]) -> Optional[str]:
+        """
+        以每個頁面的 URL 與內容雜湊組成萃取快取鍵；沒有內容時返回 None
+        """
+        digest = hashlib.blake2b(digest_size=20)
+        has_content = False
+        
+        for item in scraped_data.get("results", []):
+            content = item.get("content")
+            if not content:
+                continue
+            has_content = True
+            digest.update((item.get("url") or "").encode("utf-8"))
+            digest.update(hashlib.sha256(content.encode("utf-8")).digest())
+        
+        return digest.hexdigest() if has_content else None
+    
+    def _invalidate_after_extraction(self, query: str):
+        """
+        Neo4j 已（或即將）寫入新資料，舊的查詢結果、充足度判斷與此查詢的報告不再可信
+        """
+        self.invalidate_knowledge_cache()
+        self.invalidate_report_cache(query)
+        self.invalidate_sufficiency_cache(query)
+    
     async def _extract_data(self, query: str, scraped_data: Dict[str, Any]) -> Dict[str, Any]:
         """
-        呼叫 data_extraction_agent 萃取並儲存資料
+        呼叫 data_extraction_agent 萃取並儲存資料；相同頁面內容直接使用快取結果
         """
+        cache_key = self._extraction_cache_key(scraped_data)
+        if cache_key is not None:
+            cached = self._extraction_cache.get(cache_key)
+            self._record_cache("extraction", cached is not None)
+            if cached is not None:
+                stats = cached.get("statistics", {})
+                logger.info(
+                    "   ♻️ 使用快取的萃取結果: %s 個實體, %s 個關係",
+                    stats.get('total_entities', 0), stats.get('total_relationships', 0)
+                )
+                return cached
+        
         try:
-            response = requests.post(
+            # 逾時代表萃取仍在進行，不重試以免重複萃取
+            result = await self._post_json(
+                "data_extraction",
                 f"{self.data_extraction_url}/extract",
-                json={
+                {
                     "data": scraped_data,
-                    "query": query
+                    "query": query,
+                    "stream": config.EXTRACTION_STREAM
                 },
-                timeout=120
+                timeout=120,
+                retry_timeouts=False
             )
-            response.raise_for_status()
-            result = response.json()
             
             stats = result.get("statistics", {})
             entity_count = stats.get("total_entities", 0)
             rel_count = stats.get("total_relationships", 0)
-            logger.info(f"   ✅ 萃取成功: {entity_count} 個實體, {rel_count} 個關係")
+            logger.info("   ✅ 萃取成功: %s 個實體, %s 個關係", entity_count, rel_count)
+            
+            self._invalidate_after_extraction(query)
+            
+            if cache_key is not None and not result.get("error"):
+                self._extraction_cache[cache_key] = result
             
             return result
             
+        except asyncio.CancelledError:
+            # 請求已送出時萃取端不會因此停止，之後仍會寫入 Neo4j（例如被取消的預先爬取）
+            self._invalidate_after_extraction(query)
+            raise
         except Exception as e:
-            logger.error(f"   ❌ 資料萃取失敗: {e}")
+            logger.error("   ❌ 資料萃取失敗: %s", e)
+            # 逾時或連線中斷時萃取端可能仍在寫入；只有斷路器拒絕代表請求從未送出
+            if not isinstance(e, CircuitOpenError):
+                self._invalidate_after_extraction(query)
             return {
                 "entities": [],
                 "relationships": [],
@@ -1,8 +1,11 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Dict, Any, Optional
+from typing import AsyncIterator, Dict, Any, Optional
+import asyncio
 import logging
+import orjson
 from agent import AnalysisAgent
 
 logging.basicConfig(level=logging.INFO)
@@ -26,6 +29,11 @@ class AnalyzeRequest(BaseModel):
     query: str
 
 
+class CacheInvalidateRequest(BaseModel):
+    """快取清除請求（未指定 query 時清除全部）"""
+    query: Optional[str] = None
+
+
 class AnalyzeResponse(BaseModel):
     """統一回應格式"""
     status: str
@@ -48,6 +56,10 @@ async def root():
         "endpoints": {
             "health": "/health",
             "analyze": "/analyze (POST) - 統一入口（使用 LLM 判斷）",
+            "analyze_stream": "/analyze/stream (POST) - 同上，報告以 NDJSON 串流回傳",
+            "analyze_sse": "/analyze/sse?query= (GET) - 同上，以 Server-Sent Events 回傳",
+            "cache_invalidate": "/cache/invalidate (POST) - 清除報告與 Neo4j 查詢快取",
+            "cache_stats": "/cache/stats - 快取命中統計",
         }
     }
 
@@ -55,7 +67,11 @@ async def root():
 @app.get("/health")
 async def health_check():
     """健康檢查端點"""
-    return {"status": "healthy", "service": "analysis_agent"}
+    return {
+        "status": "healthy",
+        "service": "analysis_agent",
+        "breakers": agent.breaker_stats()
+    }
 
 
 @app.post("/analyze")
@@ -76,8 +92,8 @@ async def analyze_query(request: AnalyzeRequest):
         完整的報告資料
     """
     try:
-        logger.info(f"📥 收到分析請求: {request.query}")
-        logger.info(f"🤖 使用 LLM 判斷資料充足度並迭代搜尋")
+        logger.info("📥 收到分析請求: %s", request.query)
+        logger.info("🤖 使用 LLM 判斷資料充足度並迭代搜尋")
         
         # 直接執行迭代式工作流
         workflow_request = {
@@ -98,7 +114,7 @@ async def analyze_query(request: AnalyzeRequest):
         }
         
     except Exception as e:
-        logger.error(f"❌ 分析失敗: {e}", exc_info=True)
+        logger.error("❌ 分析失敗: %s", e, exc_info=True)
         return {
             "status": "error",
             "query": request.query,
@@ -110,6 +126,97 @@ async def analyze_query(request: AnalyzeRequest):
         }
 
 
+async def _workflow_events(query: str) -> AsyncIterator[Dict[str, Any]]:
+    """
+    串流工作流的事件（chunk / done），失敗時以 done 事件回報錯誤
+    """
+    workflow_request = {
+        "action": "iterative_analysis",
+        "query": query
+    }
+    try:
+        async for event in agent.orchestrate_workflow_stream(workflow_request):
+            yield event
+    except Exception as e:
+        logger.error("❌ 串流分析失敗: %s", e, exc_info=True)
+        yield {
+            "type": "done",
+            "status": "error",
+            "query": query,
+            "error": str(e)
+        }
+
+
+@app.post("/analyze/stream")
+async def analyze_query_stream(request: AnalyzeRequest):
+    """
+    與 /analyze 相同的工作流，但報告一生成就逐段回傳（NDJSON）
+    
+    每行一個事件：
+    - {"type": "chunk", "text": "..."}：報告文字片段
+    - {"type": "done", "status": ..., "sources": ..., "workflow_steps": ...}：結束
+    """
+    logger.info("📥 收到串流分析請求: %s", request.query)
+    
+    async def lines() -> AsyncIterator[bytes]:
+        async for event in _workflow_events(request.query):
+            yield orjson.dumps(event) + b"\n"
+    
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@app.get("/analyze/sse")
+async def analyze_query_sse(query: str):
+    """
+    與 /analyze/stream 相同的事件，以 Server-Sent Events 格式回傳（供瀏覽器 EventSource 使用）
+    
+    事件名稱為 chunk / done，data 為該事件的 JSON
+    """
+    logger.info("📥 收到 SSE 分析請求: %s", query)
+    
+    async def messages() -> AsyncIterator[bytes]:
+        async for event in _workflow_events(query):
+            yield b"event: " + event["type"].encode() + b"\ndata: " + orjson.dumps(event) + b"\n\n"
+    
+    return StreamingResponse(
+        messages(),
+        media_type="text/event-stream",
+        # 避免 nginx 等反向代理緩衝整個回應
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.post("/cache/invalidate")
+async def invalidate_cache(request: CacheInvalidateRequest):
+    """清除報告、Neo4j 查詢與充足度判斷快取"""
+    agent.invalidate_report_cache(request.query)
+    agent.invalidate_knowledge_cache(request.query)
+    agent.invalidate_sufficiency_cache(request.query)
+    logger.info("🧹 已清除快取: %s", request.query or '全部')
+    return {"status": "ok", "query": request.query}
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """快取命中統計"""
+    return agent.cache_stats()
+
+
+@app.on_event("startup")
+async def startup_event():
+    """背景預熱 Ollama 模型、Neo4j 連線池與常見查詢的快取，不阻塞服務啟動"""
+    app.state.warm_task = asyncio.create_task(agent.warm_up())
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """關閉共用的 HTTP 連線並保存查詢頻率"""
+    warm_task = getattr(app.state, "warm_task", None)
+    if warm_task is not None and not warm_task.done():
+        warm_task.cancel()
+    await agent.close()
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8002)
\ No newline at end of file
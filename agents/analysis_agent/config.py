@@ -4,21 +4,82 @@ import os
 # ============ Ollama 配置 ============
 OLLAMA_ENDPOINT = os.getenv("OLLAMA_ENDPOINT", "http://ollama:11434")
 MODEL_NAME = os.getenv("MODEL_NAME", "llama3.2:3b")
+JUDGE_MODEL = os.getenv("JUDGE_MODEL", "llama3.2:1b")  # 充足度判斷與查詢生成用的小模型
 OLLAMA_TIMEOUT = int(os.getenv("OLLAMA_TIMEOUT", "60"))
 OLLAMA_TEMPERATURE = float(os.getenv("OLLAMA_TEMPERATURE", "0.3"))
+OLLAMA_WARMUP_TIMEOUT = int(os.getenv("OLLAMA_WARMUP_TIMEOUT", "300"))  # 啟動時載入模型的逾時秒數
+SUFFICIENCY_NUM_PREDICT = int(os.getenv("SUFFICIENCY_NUM_PREDICT", "256"))  # 充足度判斷的輸出 token 上限
+QUERY_NUM_PREDICT = int(os.getenv("QUERY_NUM_PREDICT", "32"))  # 搜尋查詢生成的輸出 token 上限
 
 # ============ 迭代控制 ============
 MAX_ITERATIONS = int(os.getenv("MAX_ITERATIONS", "3"))  # 最多迭代次數
 URLS_PER_ITERATION = int(os.getenv("URLS_PER_ITERATION", "5"))  # 每次迭代爬取的 URL 數量
+QUERIES_PER_ITERATION = int(os.getenv("QUERIES_PER_ITERATION", "1"))  # 每次迭代並行的補充搜尋查詢數
+MAX_PARALLEL_SEARCHES = int(os.getenv("MAX_PARALLEL_SEARCHES", "3"))  # 同時進行的搜尋查詢上限
+SCRAPE_BATCH_SIZE = int(os.getenv("SCRAPE_BATCH_SIZE", "2"))  # 每批爬取後立即萃取的 URL 數量
+MAX_CONCURRENT_BATCHES = int(os.getenv("MAX_CONCURRENT_BATCHES", "8"))  # 同時進行的爬取批次上限
+MAX_CONCURRENT_EXTRACTIONS = int(os.getenv("MAX_CONCURRENT_EXTRACTIONS", "4"))  # 同時進行的萃取批次上限
+SPECULATIVE_SCRAPE = os.getenv("SPECULATIVE_SCRAPE", "false").lower() in ["true", "1", "yes"]  # 判斷充足度時先行爬取
+MAX_SPECULATIVE_SCRAPES = int(os.getenv("MAX_SPECULATIVE_SCRAPES", "2"))  # 同時進行的預先爬取上限
+SCRAPE_BLOCKED_HOSTS = os.getenv("SCRAPE_BLOCKED_HOSTS", "example.com,example.org,example.net,localhost")  # 不爬取的網域（逗號分隔）
 
 # ============ 充足度判斷閾值 ============
 MIN_ENTITIES_FALLBACK = int(os.getenv("MIN_ENTITIES_FALLBACK", "5"))  # 降級方案的最小實體數
 MIN_RELATIONSHIPS_FALLBACK = int(os.getenv("MIN_RELATIONSHIPS_FALLBACK", "3"))  # 降級方案的最小關係數
 CONFIDENCE_THRESHOLD = float(os.getenv("CONFIDENCE_THRESHOLD", "0.7"))  # LLM 判斷的最低信心度
+FASTPATH_MIN_ENTITIES = int(os.getenv("FASTPATH_MIN_ENTITIES", "0"))  # 尚未爬取時，Neo4j 實體數達此值直接判定充足（預設 0 停用：關鍵字比對數量不代表相關性）
+FASTPATH_MIN_RELATIONSHIPS = int(os.getenv("FASTPATH_MIN_RELATIONSHIPS", "6"))  # 快速路徑所需的最少關係數
+
+# ============ Embedding 預篩 ============
+EMBED_MODEL = os.getenv("EMBED_MODEL", "nomic-embed-text")  # 語意快取與預篩用的 embedding 模型
+EMBED_PREFILTER = os.getenv("EMBED_PREFILTER", "false").lower() in ["true", "1", "yes"]  # 以查詢與實體名稱的相似度先行判斷充足度
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "4096"))  # 實體名稱 embedding 快取筆數
+EMBED_BATCH_WAIT_MS = int(os.getenv("EMBED_BATCH_WAIT_MS", "20"))  # 合併並行 embedding 請求的等待毫秒數
+EMBED_BATCH_MAX = int(os.getenv("EMBED_BATCH_MAX", "256"))  # 單次 embedding 請求的文字數上限（達到即送出）
+PREFILTER_HIGH = float(os.getenv("PREFILTER_HIGH", "0.75"))  # 最高相似度超過此值（且相關實體足夠）直接判定充足
+PREFILTER_MATCH = float(os.getenv("PREFILTER_MATCH", "0.5"))  # 視為相關實體的相似度
+PREFILTER_MIN_MATCHES = int(os.getenv("PREFILTER_MIN_MATCHES", "5"))  # 判定充足所需的相關實體數
+PREFILTER_LOW = float(os.getenv("PREFILTER_LOW", "0.35"))  # 最高相似度低於此值直接判定不足
+
+# ============ 快取 ============
+KNOWLEDGE_CACHE_TTL = int(os.getenv("KNOWLEDGE_CACHE_TTL", "60"))  # Neo4j 查詢結果快取秒數（萃取新資料時失效）
+KNOWLEDGE_CACHE_SIZE = int(os.getenv("KNOWLEDGE_CACHE_SIZE", "1024"))  # Neo4j 查詢結果快取筆數
+REPORT_CACHE_TTL = int(os.getenv("REPORT_CACHE_TTL", "300"))  # 完整報告快取秒數
+REPORT_CACHE_SIZE = int(os.getenv("REPORT_CACHE_SIZE", "256"))  # 完整報告快取筆數
+REPORT_SEMANTIC_CACHE = os.getenv("REPORT_SEMANTIC_CACHE", "false").lower() in ["true", "1", "yes"]  # 相近的查詢共用報告
+REPORT_SEMANTIC_THRESHOLD = float(os.getenv("REPORT_SEMANTIC_THRESHOLD", "0.92"))  # 報告語意快取的餘弦相似度門檻
+REPORT_SEMANTIC_TTL = int(os.getenv("REPORT_SEMANTIC_TTL", "1800"))  # 報告語意快取秒數
+EXTRACTION_CACHE_TTL = int(os.getenv("EXTRACTION_CACHE_TTL", "3600"))  # 萃取結果快取秒數
+EXTRACTION_CACHE_SIZE = int(os.getenv("EXTRACTION_CACHE_SIZE", "512"))  # 萃取結果快取筆數
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "600"))  # LLM 回應快取秒數
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "512"))  # LLM 回應快取筆數
+LLM_SEMANTIC_CACHE = os.getenv("LLM_SEMANTIC_CACHE", "false").lower() in ["true", "1", "yes"]  # 以 embedding 相似度比對相近的 prompt
+LLM_SEMANTIC_THRESHOLD = float(os.getenv("LLM_SEMANTIC_THRESHOLD", "0.87"))  # 語意快取命中的餘弦相似度門檻
+SUFFICIENCY_CACHE_TTL = int(os.getenv("SUFFICIENCY_CACHE_TTL", "3600"))  # 充足度判斷快取秒數（萃取新資料時失效）
+CACHE_WARM_TOP_N = int(os.getenv("CACHE_WARM_TOP_N", "10"))  # 啟動時預熱的常見查詢數
+CACHE_WARM_CONCURRENCY = int(os.getenv("CACHE_WARM_CONCURRENCY", "4"))  # 預熱時的並行查詢數
+QUERY_STATS_PATH = os.getenv("QUERY_STATS_PATH", "data/query_stats.json")  # 查詢頻率記錄檔
+QUERY_STATS_KEEP = int(os.getenv("QUERY_STATS_KEEP", "200"))  # 記錄檔保留的查詢數
 
 # ============ 服務端點 ============
 WEB_SCRAPING_URL = os.getenv("WEB_SCRAPING_AGENT_URL", "http://web_scraping_agent:8003")
 DATA_EXTRACTION_URL = os.getenv("DATA_EXTRACTION_AGENT_URL", "http://data_extraction_agent:8004")
+EXTRACTION_STREAM = os.getenv("EXTRACTION_STREAM", "true").lower() in ["true", "1", "yes"]  # 以 NDJSON 串流接收萃取結果
+
+# ============ HTTP 連線池 ============
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", "100"))  # 全部連線上限
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "20"))  # 每個主機的連線上限
+HTTP_KEEPALIVE_TIMEOUT = int(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "60"))  # keep-alive 秒數
+HTTP_DNS_CACHE_TTL = int(os.getenv("HTTP_DNS_CACHE_TTL", "300"))  # 服務名稱 DNS 解析快取秒數
+REPORT_POOL_WORKERS = int(os.getenv("REPORT_POOL_WORKERS", "8"))  # 報告生成（LLM）執行緒數
+NEO4J_POOL_WORKERS = int(os.getenv("NEO4J_POOL_WORKERS", "16"))  # Neo4j 查詢執行緒數（不超過 driver 連線池大小）
+
+# ============ 重試與斷路器 ============
+RETRY_ATTEMPTS = int(os.getenv("RETRY_ATTEMPTS", "3"))  # 跨 agent 呼叫的最多嘗試次數
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "1.0"))  # 指數退避的起始秒數
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "10.0"))  # 指數退避的最大秒數
+BREAKER_FAIL_MAX = int(os.getenv("BREAKER_FAIL_MAX", "5"))  # 連續失敗幾次後開啟斷路器
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", "30"))  # 斷路器開啟後多久試探恢復
 
 # ============ Neo4j 配置 ============
 NEO4J_URL = os.getenv("NEO4J_URL", "bolt://neo4j:7687")
@@ -26,4 +87,5 @@ NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
 NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "password123")
 
 # ============ 日誌配置 ============
-LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
\ No newline at end of file
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "%(levelname)s:%(name)s:%(message)s")
\ No newline at end of file
@@ -0,0 +1,214 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from functools import lru_cache
+
+from cachetools import LRUCache, TLRUCache
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=None)
+def optional_numpy():
+    """
+    第一次需要向量運算時才載入 numpy（未啟用語意比對時不必承擔載入時間）；未安裝時返回 None
+    """
+    try:
+        import numpy
+    except ImportError:
+        logger.warning("⚠️ 未安裝 numpy，停用向量比對")
+        return None
+    return numpy
+
+
+class LLMCache:
+    """
+    LLM 回應快取（執行緒安全）
+
+    1. 精確比對：prompt 的 SHA-256
+    2. 語意比對（可選）：prompt embedding 與既有項目的餘弦相似度 >= threshold 時視為命中
+
+    namespace 用來區隔不同模型 / 參數的回應，語意比對只在同一 namespace 內進行
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 512,
+        ttl: Optional[float] = None,
+        threshold: float = 0.87,
+        embed_fn: Optional[Callable[[str], Optional[List[float]]]] = None,
+        path: Optional[str] = None
+    ):
+        self.threshold = threshold
+        self.path = path
+        # 沒有 numpy 時只使用精確比對
+        self._embed_fn = embed_fn if embed_fn is not None and optional_numpy() is not None else None
+        # 項目為 (回應, 寫入時間)；以實際時間計算到期，重啟後載入的項目不會重新計時
+        self._ttl = ttl
+        self._exact = (
+            TLRUCache(maxsize=maxsize, ttu=self._expires_at, timer=time.time)
+            if ttl else LRUCache(maxsize=maxsize)
+        )
+        self._lock = threading.Lock()
+
+        # 語意索引：namespace -> (keys, 單位向量矩陣)
+        self._index: Dict[str, Dict[str, list]] = {}
+        self._matrices: Dict[str, Any] = {}
+        # get() 計算過的向量暫存，set() 時不必再算一次
+        self._pending_vectors = LRUCache(maxsize=64)
+
+        self.stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0}
+
+        if path:
+            self.load()
+
+    @property
+    def semantic_enabled(self) -> bool:
+        return self._embed_fn is not None
+
+    @property
+    def maxsize(self) -> int:
+        return self._exact.maxsize
+
+    def __len__(self) -> int:
+        return len(self._exact)
+
+    def _expires_at(self, _key: str, entry: tuple, _now: float) -> float:
+        return entry[1] + self._ttl
+
+    @staticmethod
+    def _key(prompt: str, namespace: str) -> str:
+        return hashlib.sha256(f"{namespace}\x00{prompt}".encode("utf-8")).hexdigest()
+
+    def _embed(self, prompt: str):
+        np = optional_numpy()
+        try:
+            vector = self._embed_fn(prompt)
+        except Exception as e:
+            logger.warning("⚠️ 取得 embedding 失敗: %s", e)
+            return None
+        if not vector:
+            return None
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def _matrix(self, namespace: str):
+        """
+        取得 namespace 的向量矩陣，並移除已被精確快取淘汰的項目
+        """
+        index = self._index.get(namespace)
+        if not index or not index["keys"]:
+            return None, []
+
+        if namespace not in self._matrices:
+            alive = [i for i, k in enumerate(index["keys"]) if k in self._exact]
+            index["keys"] = [index["keys"][i] for i in alive]
+            index["vectors"] = [index["vectors"][i] for i in alive]
+            if not alive:
+                return None, []
+            self._matrices[namespace] = optional_numpy().vstack(index["vectors"])
+        return self._matrices[namespace], index["keys"]
+
+    def get(self, prompt: str, namespace: str = "") -> Optional[str]:
+        key = self._key(prompt, namespace)
+        with self._lock:
+            entry = self._exact.get(key)
+            if entry is not None:
+                self.stats["exact_hits"] += 1
+                return entry[0]
+
+        if not self.semantic_enabled:
+            with self._lock:
+                self.stats["misses"] += 1
+            return None
+
+        # embedding 需要網路呼叫，不持有鎖
+        vector = self._embed(prompt)
+        with self._lock:
+            if vector is not None:
+                self._pending_vectors[key] = vector
+                matrix, keys = self._matrix(namespace)
+                if matrix is not None:
+                    scores = matrix @ vector
+                    best = int(scores.argmax())
+                    entry = self._exact.get(keys[best])
+                    if scores[best] >= self.threshold and entry is not None:
+                        self.stats["semantic_hits"] += 1
+                        return entry[0]
+            self.stats["misses"] += 1
+        return None
+
+    def set(self, prompt: str, response: str, namespace: str = ""):
+        key = self._key(prompt, namespace)
+        with self._lock:
+            self._exact[key] = (response, time.time())
+            vector = self._pending_vectors.pop(key, None)
+
+        if not self.semantic_enabled:
+            return
+        if vector is None:
+            vector = self._embed(prompt)
+            if vector is None:
+                return
+
+        with self._lock:
+            index = self._index.setdefault(namespace, {"keys": [], "vectors": []})
+            index["keys"].append(key)
+            index["vectors"].append(vector)
+            self._matrices.pop(namespace, None)
+
+    def clear(self):
+        with self._lock:
+            self._exact.clear()
+            self._index.clear()
+            self._matrices.clear()
+            self._pending_vectors.clear()
+
+    def load(self):
+        """
+        從磁碟載入精確比對的項目（語意索引不保存，重新累積）；已過期或沒有寫入時間的舊格式項目略過
+        """
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+            now = time.time()
+            loaded = 0
+            with self._lock:
+                for key, entry in entries.items():
+                    if not isinstance(entry, list) or len(entry) != 2:
+                        continue
+                    response, created_at = entry
+                    if self._ttl and now - created_at >= self._ttl:
+                        continue
+                    self._exact[key] = (response, created_at)
+                    loaded += 1
+            logger.info("♻️ 載入 %s 筆 LLM 快取（略過 %s 筆過期項目）", loaded, len(entries) - loaded)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning("⚠️ 無法載入 LLM 快取: %s", e)
+
+    def save(self):
+        """
+        將精確比對的項目（含寫入時間）寫入磁碟
+        """
+        if not self.path:
+            return
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with self._lock:
+                if self._ttl:
+                    self._exact.expire()
+                entries = dict(self._exact.items())
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(entries, f, ensure_ascii=False)
+        except Exception as e:
+            logger.warning("⚠️ 無法儲存 LLM 快取: %s", e)
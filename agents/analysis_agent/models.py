@@ -0,0 +1,72 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Tuple
+
+
+def _to_float(value: Any, default: float = 0.0) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _to_bool(value: Any) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in ("true", "1", "yes")
+    return bool(value)
+
+
+def _to_str_list(value: Any) -> List[str]:
+    if not value:
+        return []
+    if isinstance(value, str):
+        return [value]
+    return [str(v) for v in value]
+
+
+@dataclass(slots=True)
+class Sufficiency:
+    """
+    資料充足度判斷結果（LLM 或規則降級）
+    """
+    is_sufficient: bool
+    confidence: float = 0.0
+    reason: str = ""
+    missing_aspects: List[str] = field(default_factory=list)
+    coverage_score: float = 0.0
+    followup_queries: List[str] = field(default_factory=list)
+
+    @classmethod
+    def from_llm(cls, data: Dict[str, Any]) -> "Sufficiency":
+        """
+        從 LLM 回傳的 JSON 建立；欄位缺漏或型別不符時使用預設值
+        """
+        missing = _to_str_list(data.get("missing_aspects"))
+        # 不合理的查詢（過長/過短）直接捨棄，改由查詢生成補上
+        followups = [
+            q.strip('"\'` ') for q in _to_str_list(data.get("followup_queries"))
+            if 3 <= len(q.strip()) <= 100
+        ]
+
+        return cls(
+            is_sufficient=_to_bool(data.get("is_sufficient", False)),
+            confidence=_to_float(data.get("confidence")),
+            reason=str(data.get("reason", "")),
+            missing_aspects=missing,
+            coverage_score=_to_float(data.get("coverage_score")),
+            followup_queries=list(dict.fromkeys(followups))
+        )
+
+
+@dataclass(slots=True, frozen=True)
+class SearchBundle:
+    """
+    單次搜尋 + 爬取的結果；建立一次後以參照傳遞，不再複製列表
+    """
+    query: str
+    urls: Tuple[str, ...] = ()
+    results: Tuple[Dict[str, Any], ...] = ()
+    extracted_entities: int = 0  # 本次萃取寫入 Neo4j 的實體數
+
+    @property
+    def successful(self) -> int:
+        return len(self.results)
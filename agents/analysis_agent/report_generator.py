@@ -1,14 +1,111 @@
 import os
-import json
+import re
+import asyncio
+import hashlib
 import logging
-from typing import Dict, List, Any
+import threading
+import orjson
+from collections import Counter
+from functools import lru_cache
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Any, Optional, Tuple
+import aiohttp
 import requests
-from datetime import datetime
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from datetime import datetime, timezone
+from neo4j import GraphDatabase
+from neo4j.exceptions import ClientError
+from llm_cache import LLMCache
+from resilience import CircuitBreaker, is_transient_error
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+def _utc_isoformat() -> str:
+    """
+    目前的 UTC 時間（ISO 8601，以 Z 結尾）；取代已棄用的 datetime.utcnow()
+    """
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+# Query 節點文字的全文索引名稱
+QUERY_TEXT_INDEX = "queryText"
+# Entity 名稱 / 描述 / 類型的全文索引名稱
+ENTITY_TEXT_INDEX = "entityText"
+
+# 關鍵詞提取用的常見停用詞
+_STOPWORDS = frozenset({
+    '的', '是', '和', '與', '或', '在', '了', '有', '為', '等',
+    'the', 'is', 'and', 'or', 'in', 'at', 'to', 'a', 'an'
+})
+# 以標點與空白切詞（Unicode 的 \w 已包含中日韓文字）
+_TOKEN_RE = re.compile(r"\w+")
+
+# 報告的固定指示放在 system prompt，每次請求的開頭逐字相同，Ollama 可重用這段前綴的 KV cache
+REPORT_SYSTEM_PROMPT = """你是一位專業的研究員，負責根據使用者提供的知識庫實體、實體關係與搜尋結果，用繁體中文(zh-tw)撰寫詳細的研究報告。
+
+報告需結構完整，包含以下部分：
+
+1. **執行摘要** (2-3 段)
+   - 簡要概述主題
+   - 突出最重要的發現
+
+2. **背景資訊**
+   - 相關背景和上下文
+   - 主要參與者或實體
+
+3. **主要發現** (3-5 點)
+   - 基於資料的關鍵洞察
+   - 重要趨勢或模式
+
+4. **詳細分析** (2-3 段)
+   - 深入分析實體之間的關係
+   - 解釋重要性和影響
+
+5. **結論與總結**
+   - 總結關鍵要點
+   - 明確的回覆使用者所的問題
+
+請確保報告：
+- 充分利用提供的所有實體和關係
+- 基於提供的資料
+- 客觀且有依據
+- 結構清晰
+- 使用專業語言
+"""
+
+# 分段生成：每段各自一個較短的 prompt，並行生成後依序拼接
+REPORT_SECTIONS = [
+    ("執行摘要", "2-3 段，簡要概述主題並突出最重要的發現"),
+    ("背景資訊", "相關背景和上下文，以及主要參與者或實體"),
+    ("主要發現", "3-5 點基於資料的關鍵洞察、重要趨勢或模式"),
+    ("詳細分析", "2-3 段，深入分析實體之間的關係，解釋重要性和影響"),
+    ("結論與總結", "總結關鍵要點，並明確回覆使用者的問題"),
+]
+
+SECTION_SYSTEM_PROMPT = """你是一位專業的研究員，負責根據使用者提供的知識庫實體、實體關係與搜尋結果，用繁體中文(zh-tw)撰寫研究報告中的指定段落。
+
+請確保內容：
+- 只撰寫指定的段落，不要重複段落標題，也不要撰寫其他段落
+- 基於提供的資料，客觀且有依據
+- 使用專業語言
+"""
+
+# 分段生成時個別段落失敗的替代文字（其他段落照常輸出）
+SECTION_FALLBACK_TEXT = "（此段落暫時無法生成，請稍後重新查詢）"
+
+# LLM 失敗時的備用報告版面（模組載入時定義一次，各區塊內容由 _generate_fallback_report 填入）
+FALLBACK_REPORT_TEMPLATE = """# {query} - 研究報告
+
+生成時間: {generated_at} UTC
+
+{sections}## 結論
+
+基於現有資料，找到 {entity_count} 個相關實體和 {relationship_count} 個關係。建議進行進一步研究以獲得更深入的洞察。
+"""
+
+
 class ReportGenerator:
     """
     報告生成器：從 Neo4j 查詢相關實體並生成詳細報告
@@ -17,14 +114,110 @@ class ReportGenerator:
     def __init__(self):
         self.ollama_endpoint = os.getenv("OLLAMA_ENDPOINT", "http://ollama:11434")
         self.model_name = os.getenv("MODEL_NAME", "llama3.2:3b")
+        self.report_model = os.getenv("REPORT_MODEL", self.model_name)  # 報告生成用的模型（可與其他任務分開）
         self.neo4j_url = os.getenv("NEO4J_URL", "bolt://neo4j:7687")
         self.neo4j_user = os.getenv("NEO4J_USER", "neo4j")
         self.neo4j_password = os.getenv("NEO4J_PASSWORD", "password123")
+        self.neo4j_database = os.getenv("NEO4J_DATABASE", "neo4j")  # 明確指定資料庫，省去每個 session 解析預設資料庫
         
         # 🔧 可配置的查詢限制
         self.max_entities_per_keyword = int(os.getenv("MAX_ENTITIES_PER_KEYWORD", "50"))  # 提高到 50
         self.max_total_entities = int(os.getenv("MAX_TOTAL_ENTITIES", "100"))  # 提高到 100
         self.max_relationships = int(os.getenv("MAX_RELATIONSHIPS", "100"))  # 提高到 100
+        
+        # prompt 中逐條列出的實體 / 關係數（依顯著性排序後取前幾名，其餘只列出數量），越短 prefill 越快
+        self.prompt_entities = int(os.getenv("REPORT_PROMPT_ENTITIES", "15"))
+        self.prompt_relationships = int(os.getenv("REPORT_PROMPT_RELATIONSHIPS", "20"))
+        
+        # Neo4j driver 內建連線池，整個 process 共用一個（延遲建立）
+        self.neo4j_pool_size = int(os.getenv("NEO4J_POOL_SIZE", "50"))
+        self.neo4j_acquisition_timeout = float(os.getenv("NEO4J_ACQUISITION_TIMEOUT", "30"))
+        self._driver = None
+        self._driver_lock = threading.Lock()
+        self._fulltext_ready: Optional[bool] = None  # None 表示尚未嘗試建立全文索引
+        
+        # 呼叫 Ollama 的共用 HTTP session（keep-alive），連線錯誤時以退避重試
+        pool_size = int(os.getenv("OLLAMA_POOL_SIZE", "20"))
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=Retry(total=3, backoff_factor=0.3)
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        
+        # Ollama 連不上時很快失敗；生成報告的讀取逾時另外設定（一律串流讀取，為兩段輸出之間的間隔）
+        self.connect_timeout = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+        self.report_timeout = float(os.getenv("REPORT_TIMEOUT", "120"))
+        
+        # Ollama 持續故障時直接改用備用報告，不讓每個請求各自佔用執行緒等到逾時
+        self.breaker = CircuitBreaker(
+            "report_llm",
+            fail_max=int(os.getenv("BREAKER_FAIL_MAX", "5")),
+            reset_timeout=float(os.getenv("BREAKER_RESET_TIMEOUT", "30"))
+        )
+        self._breaker_lock = threading.Lock()
+        
+        # 非串流報告由 event loop 直接 await（不佔用執行緒），使用呼叫端共用的 aiohttp session
+        self._ollama_timeout = aiohttp.ClientTimeout(
+            total=None, sock_connect=self.connect_timeout, sock_read=self.report_timeout
+        )
+        
+        # 分段並行生成報告（需要 Ollama 的 OLLAMA_NUM_PARALLEL >= 段落數才有加速效果）
+        self.sectioned_report = os.getenv("REPORT_SECTIONED", "false").lower() in ["true", "1", "yes"]
+        self.section_max_tokens = int(os.getenv("REPORT_SECTION_MAX_TOKENS", "800"))
+        
+        # LLM 回應快取：精確比對 + （可選）以 embedding 做語意比對
+        self.embed_model = os.getenv("EMBED_MODEL", "nomic-embed-text")
+        semantic = os.getenv("LLM_SEMANTIC_CACHE", "false").lower() in ["true", "1", "yes"]
+        self.llm_cache = LLMCache(
+            maxsize=int(os.getenv("LLM_CACHE_SIZE", "512")),
+            ttl=float(os.getenv("REPORT_LLM_CACHE_TTL", "3600")),
+            threshold=float(os.getenv("LLM_SEMANTIC_THRESHOLD", "0.87")),
+            embed_fn=self._embed if semantic else None,
+            path=os.getenv("LLM_CACHE_PATH", "data/llm_cache.json")
+        )
+    
+    def _get_driver(self):
+        """
+        取得共用的 Neo4j driver（第一次呼叫時建立）
+        """
+        if self._driver is None:
+            with self._driver_lock:
+                if self._driver is None:
+                    self._driver = GraphDatabase.driver(
+                        self.neo4j_url,
+                        auth=(self.neo4j_user, self.neo4j_password),
+                        max_connection_pool_size=self.neo4j_pool_size,
+                        connection_acquisition_timeout=self.neo4j_acquisition_timeout,
+                        keep_alive=True
+                    )
+        return self._driver
+    
+    def warm_up(self):
+        """
+        預先建立 Neo4j 連線，讓第一個請求不必等待連線握手
+        """
+        try:
+            driver = self._get_driver()
+            driver.verify_connectivity()
+            with driver.session(database=self.neo4j_database) as session:
+                session.run("RETURN 1").consume()
+            logger.info("✅ Neo4j 連線池已預熱")
+        except Exception as e:
+            logger.warning("⚠️ Neo4j 預熱失敗: %s", e)
+    
+    def close(self):
+        """
+        關閉共用的 Neo4j driver 與 HTTP session，並保存 LLM 快取
+        """
+        self.llm_cache.save()
+        self.session.close()
+        with self._driver_lock:
+            if self._driver is not None:
+                self._driver.close()
+                self._driver = None
     
     def generate_comprehensive_report(
         self, 
@@ -43,20 +236,23 @@ class ReportGenerator:
         Returns:
             包含報告和統計資訊的字典
         """
-        logger.info(f"📝 開始生成報告: {query}")
+        logger.info("📝 開始生成報告: %s", query)
         
         # 步驟 1: 從 Neo4j 獲取相關實體和關係
         neo4j_data = {}
         if use_neo4j:
-            logger.info(f"   🔍 從 Neo4j 查詢相關資料...")
+            logger.info("   🔍 從 Neo4j 查詢相關資料...")
             neo4j_data = self._query_neo4j_knowledge(query)
-            logger.info(f"   ✅ 找到 {neo4j_data.get('entity_count', 0)} 個實體, {neo4j_data.get('relationship_count', 0)} 個關係")
+            logger.info(
+                "   ✅ 找到 %s 個實體, %s 個關係",
+                neo4j_data.get('entity_count', 0), neo4j_data.get('relationship_count', 0)
+            )
         
         # 步驟 2: 整合所有資料來源
         all_sources = self._integrate_data_sources(query, search_results, neo4j_data)
         
         # 步驟 3: 生成報告
-        logger.info(f"   🤖 呼叫 Ollama 生成報告...")
+        logger.info("   🤖 呼叫 Ollama 生成報告...")
         report = self._generate_report_with_llm(query, all_sources)
         
         # 步驟 4: 返回結果
@@ -68,10 +264,10 @@ class ReportGenerator:
                 "neo4j_entities": neo4j_data.get("entity_count", 0),
                 "neo4j_relationships": neo4j_data.get("relationship_count", 0)
             },
-            "generated_at": datetime.utcnow().isoformat() + "Z"
+            "generated_at": _utc_isoformat()
         }
         
-        logger.info(f"   ✅ 報告生成完成，長度: {len(report)} 字元")
+        logger.info("   ✅ 報告生成完成，長度: %s 字元", len(report))
         
         return result
     
@@ -83,110 +279,66 @@ class ReportGenerator:
             包含實體、關係和統計資訊的字典
         """
         try:
-            from neo4j import GraphDatabase
-            
-            driver = GraphDatabase.driver(
-                self.neo4j_url,
-                auth=(self.neo4j_user, self.neo4j_password)
-            )
+            driver = self._get_driver()
             
             # 提取查詢關鍵詞
             keywords = self._extract_keywords(query)
-            logger.info(f"      查詢關鍵詞: {keywords}")
+            logger.info("      查詢關鍵詞: %s", keywords)
             
             entities = []
             entity_names_set = set()  # 用於去重
             relationships = []
             
-            with driver.session() as session:
-                # 🔧 查詢 1: 直接匹配的實體（提高限制）
-                for keyword in keywords:
-                    result = session.run("""
-                        MATCH (e:Entity)
-                        WHERE e.name CONTAINS $keyword 
-                           OR e.description CONTAINS $keyword
-                           OR e.type CONTAINS $keyword
-                        RETURN DISTINCT e.name as name, 
-                               e.type as type,
-                               e.description as description,
-                               e.source_url as source_url
-                        LIMIT $limit
-                    """, keyword=keyword, limit=self.max_entities_per_keyword)
-                    
-                    for record in result:
-                        name = record["name"]
-                        if name not in entity_names_set:
-                            entity_names_set.add(name)
-                            entities.append({
-                                "name": name,
-                                "type": record["type"],
-                                "description": record["description"],
-                                "source_url": record["source_url"]
-                            })
-                
-                # 🔧 查詢 2: 通過 Query 節點找到的實體（提高限制）
-                for keyword in keywords:
-                    result = session.run("""
-                        MATCH (q:Query)-[:FOUND]->(e:Entity)
-                        WHERE q.text CONTAINS $keyword
-                        RETURN DISTINCT e.name as name,
-                               e.type as type,
-                               e.description as description,
-                               e.source_url as source_url
+            # 描述只在 prompt 中使用前 150 / 100 字，查詢時就在 Neo4j 端截斷，減少傳輸量
+            # 🔧 查詢 1: 直接匹配的實體（全文索引，所有關鍵詞一次查詢）
+            # 🔧 查詢 2: 通過 Query 節點找到的實體（全文索引，依相關度排序）
+            # 兩者以 UNION 合成一次查詢，只需一次往返
+            with driver.session(database=self.neo4j_database) as session:
+                records = self._query_related_entities(session, keywords)
+            
+            # UNION 只合併完全相同的列，這裡再依名稱去重
+            for record in records:
+                name = record["name"]
+                if name not in entity_names_set:
+                    entity_names_set.add(name)
+                    entities.append({
+                        "name": name,
+                        "type": record["type"],
+                        "description": record["description"],
+                        "source_url": record["source_url"]
+                    })
+            
+            # 🔧 截斷到最大實體數
+            if len(entities) > self.max_total_entities:
+                logger.info("      ⚠️ 實體數量超過限制，截斷至 %s", self.max_total_entities)
+                entities = entities[:self.max_total_entities]
+            
+            # 🔧 查詢 3: 找出實體之間的關係（使用所有實體，不限制為 20）
+            # 一次送出所有名稱（Entity.name 有唯一性約束的索引），也不會漏掉跨批次的關係
+            if entities:
+                with driver.session(database=self.neo4j_database) as session:
+                    result = self._read(session, """
+                        MATCH (e1:Entity)-[r:RELATES_TO]->(e2:Entity)
+                        WHERE e1.name IN $names AND e2.name IN $names
+                        RETURN e1.name as source,
+                               e2.name as target,
+                               r.type as relation_type,
+                               left(r.description, 100) as description
                         LIMIT $limit
-                    """, keyword=keyword, limit=self.max_entities_per_keyword)
+                    """, names=[e["name"] for e in entities], limit=self.max_relationships)
                     
                     for record in result:
-                        name = record["name"]
-                        if name not in entity_names_set:
-                            entity_names_set.add(name)
-                            entities.append({
-                                "name": name,
-                                "type": record["type"],
-                                "description": record["description"],
-                                "source_url": record["source_url"]
-                            })
+                        relationships.append({
+                            "source": record["source"],
+                            "target": record["target"],
+                            "relation": record["relation_type"],
+                            "description": record["description"]
+                        })
                 
-                # 🔧 截斷到最大實體數
-                if len(entities) > self.max_total_entities:
-                    logger.info(f"      ⚠️ 實體數量超過限制，截斷至 {self.max_total_entities}")
-                    entities = entities[:self.max_total_entities]
-                
-                # 🔧 查詢 3: 找出實體之間的關係（使用所有實體，不限制為 20）
-                if entities:
-                    entity_names = list(entity_names_set)
-                    
-                    # 分批查詢以避免查詢過大
-                    batch_size = 50
-                    for i in range(0, len(entity_names), batch_size):
-                        batch = entity_names[i:i+batch_size]
-                        
-                        result = session.run("""
-                            MATCH (e1:Entity)-[r:RELATES_TO]->(e2:Entity)
-                            WHERE e1.name IN $names AND e2.name IN $names
-                            RETURN e1.name as source,
-                                   e2.name as target,
-                                   r.type as relation_type,
-                                   r.description as description
-                            LIMIT $limit
-                        """, names=batch, limit=self.max_relationships)
-                        
-                        for record in result:
-                            relationships.append({
-                                "source": record["source"],
-                                "target": record["target"],
-                                "relation": record["relation_type"],
-                                "description": record["description"]
-                            })
-                        
-                        # 如果已經達到最大關係數，停止查詢
-                        if len(relationships) >= self.max_relationships:
-                            logger.info(f"      ⚠️ 關係數量達到限制 {self.max_relationships}")
-                            break
-            
-            driver.close()
+                if len(relationships) >= self.max_relationships:
+                    logger.info("      ⚠️ 關係數量達到限制 %s", self.max_relationships)
             
-            logger.info(f"      ✅ Neo4j 查詢完成: {len(entities)} 實體, {len(relationships)} 關係")
+            logger.info("      ✅ Neo4j 查詢完成: %s 實體, %s 關係", len(entities), len(relationships))
             
             return {
                 "entities": entities,
@@ -197,7 +349,7 @@ class ReportGenerator:
             }
             
         except Exception as e:
-            logger.warning(f"      ⚠️ Neo4j 查詢失敗: {e}")
+            logger.warning("      ⚠️ Neo4j 查詢失敗: %s", e)
             return {
                 "entities": [],
                 "relationships": [],
@@ -206,24 +358,229 @@ class ReportGenerator:
                 "error": str(e)
             }
     
+    @staticmethod
+    def _read(session, cypher: str, **params) -> list:
+        """
+        以受管理的讀取交易執行查詢並取回所有紀錄；暫時性錯誤（例如連線中斷）由 driver 自動重試
+        """
+        return session.execute_read(lambda tx: list(tx.run(cypher, **params)))
+    
+    @staticmethod
+    def _fulltext_phrase(keyword: str) -> str:
+        """
+        將關鍵詞轉成 Lucene 片語查詢（跳脫引號與反斜線），與 CONTAINS 的語意一致
+        """
+        return '"' + keyword.replace("\\", "\\\\").replace('"', '\\"') + '"'
+    
+    def _query_related_entities(self, session, keywords: List[str]):
+        """
+        以一次查詢找出相關實體：Entity 全文索引（每個關鍵詞各自限制數量）UNION Query 節點全文索引；
+        索引不可用時退回 CONTAINS 掃描
+        """
+        if not keywords:
+            return []
+        
+        query_limit = self.max_entities_per_keyword * len(keywords)
+        if self._fulltext_ready is None:
+            self._ensure_indexes(session)
+        if self._fulltext_ready:
+            try:
+                # 每個關鍵詞當作片語查詢，與 CONTAINS 的語意一致
+                phrases = [self._fulltext_phrase(k) for k in keywords]
+                return self._read(session, """
+                    CALL {
+                        UNWIND $phrases AS phrase
+                        CALL {
+                            WITH phrase
+                            CALL db.index.fulltext.queryNodes($entity_index, phrase) YIELD node AS e
+                            RETURN e
+                            LIMIT $limit
+                        }
+                        RETURN e
+                        UNION
+                        CALL db.index.fulltext.queryNodes($query_index, $query_phrases) YIELD node AS q
+                        MATCH (q)-[:FOUND]->(e:Entity)
+                        WITH DISTINCT e
+                        LIMIT $query_limit
+                        RETURN e
+                    }
+                    RETURN e.name as name,
+                           e.type as type,
+                           left(e.description, 150) as description,
+                           e.source_url as source_url
+                """, entity_index=ENTITY_TEXT_INDEX, query_index=QUERY_TEXT_INDEX,
+                     phrases=phrases, query_phrases=" OR ".join(phrases),
+                     limit=self.max_entities_per_keyword, query_limit=query_limit)
+            except Exception as e:
+                logger.warning("      ⚠️ 全文索引查詢失敗，改用 CONTAINS: %s", e)
+                self._disable_fulltext_on(e)
+        
+        return self._read(session, """
+            CALL {
+                UNWIND $keywords AS keyword
+                CALL {
+                    WITH keyword
+                    MATCH (e:Entity)
+                    WHERE e.name CONTAINS keyword
+                       OR e.description CONTAINS keyword
+                       OR e.type CONTAINS keyword
+                    RETURN DISTINCT e
+                    LIMIT $limit
+                }
+                RETURN e
+                UNION
+                MATCH (q:Query)-[:FOUND]->(e:Entity)
+                WHERE any(k IN $keywords WHERE q.text CONTAINS k)
+                WITH DISTINCT e
+                LIMIT $query_limit
+                RETURN e
+            }
+            RETURN e.name as name,
+                   e.type as type,
+                   left(e.description, 150) as description,
+                   e.source_url as source_url
+        """, keywords=keywords, limit=self.max_entities_per_keyword, query_limit=query_limit)
+    
+    def _ensure_indexes(self, session):
+        """
+        建立查詢用的全文索引（已存在時不做任何事）
+        """
+        try:
+            session.run(
+                f"CREATE FULLTEXT INDEX {QUERY_TEXT_INDEX} IF NOT EXISTS "
+                "FOR (q:Query) ON EACH [q.text]"
+            ).consume()
+            session.run(
+                f"CREATE FULLTEXT INDEX {ENTITY_TEXT_INDEX} IF NOT EXISTS "
+                "FOR (e:Entity) ON EACH [e.name, e.description, e.type]"
+            ).consume()
+            # 新建立的索引要等建置完成才能查詢
+            session.run("CALL db.awaitIndexes(30)").consume()
+            self._fulltext_ready = True
+        except Exception as e:
+            logger.warning("⚠️ 無法建立全文索引，實體與 Query 查詢將使用 CONTAINS: %s", e)
+            self._disable_fulltext_on(e)
+    
+    def _disable_fulltext_on(self, error: Exception):
+        """
+        只有 Neo4j 明確拒絕（ClientError，例如不支援或權限不足）才停用全文索引；
+        連線中斷、逾時等暫時性錯誤維持原狀態，下次查詢再重試
+        """
+        if isinstance(error, ClientError):
+            self._fulltext_ready = False
+    
+    def _query_neo4j_counts(self, query: str) -> Dict[str, Any]:
+        """
+        只計算與 query 相關的實體數量，不取回節點內容（用於快速判斷是否有資料）；
+        與 _query_neo4j_knowledge 使用相同的全文索引，比對結果一致
+        
+        Returns:
+            包含 entity_count 的字典
+        """
+        try:
+            driver = self._get_driver()
+            
+            keywords = self._extract_keywords(query)
+            if not keywords:
+                return {"entity_count": 0, "keywords_used": keywords}
+            
+            with driver.session(database=self.neo4j_database) as session:
+                if self._fulltext_ready is None:
+                    self._ensure_indexes(session)
+                records = None
+                if self._fulltext_ready:
+                    try:
+                        phrases = [self._fulltext_phrase(k) for k in keywords]
+                        records = self._read(session, """
+                            CALL {
+                                UNWIND $phrases AS phrase
+                                CALL db.index.fulltext.queryNodes($entity_index, phrase) YIELD node AS e
+                                RETURN e
+                                UNION
+                                CALL db.index.fulltext.queryNodes($query_index, $query_phrases) YIELD node AS q
+                                MATCH (q)-[:FOUND]->(e:Entity)
+                                RETURN e
+                            }
+                            RETURN count(DISTINCT e) AS entity_count
+                        """, entity_index=ENTITY_TEXT_INDEX, query_index=QUERY_TEXT_INDEX,
+                             phrases=phrases, query_phrases=" OR ".join(phrases))
+                    except Exception as e:
+                        logger.warning("      ⚠️ 全文索引查詢失敗，改用 CONTAINS: %s", e)
+                        self._disable_fulltext_on(e)
+                if records is None:
+                    # 參數化查詢，讓 Neo4j 重複使用快取的執行計畫
+                    records = self._read(session, """
+                        MATCH (e:Entity)
+                        WHERE any(k IN $keywords WHERE e.name CONTAINS k
+                                                   OR e.description CONTAINS k
+                                                   OR e.type CONTAINS k)
+                           OR EXISTS {
+                               MATCH (q:Query)-[:FOUND]->(e)
+                               WHERE any(k IN $keywords WHERE q.text CONTAINS k)
+                           }
+                        RETURN count(DISTINCT e) AS entity_count
+                    """, keywords=keywords)
+                record = records[0] if records else None
+            
+            return {
+                "entity_count": record["entity_count"] if record else 0,
+                "keywords_used": keywords
+            }
+            
+        except Exception as e:
+            logger.warning("      ⚠️ Neo4j 數量查詢失敗: %s", e)
+            return {
+                "entity_count": 0,
+                "error": str(e)
+            }
+    
     def _extract_keywords(self, query: str) -> List[str]:
         """
-        從查詢中提取關鍵詞
+        從查詢中提取關鍵詞（數量查詢與知識查詢會對同一查詢各呼叫一次，結果已快取）
+        """
+        return list(self._keywords_for(query))
+    
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def _keywords_for(query: str) -> Tuple[str, ...]:
+        """
+        _extract_keywords 的實作；返回 tuple，避免呼叫端修改快取中的結果
         """
         # 簡單的關鍵詞提取（可以改進為使用 NLP）
-        # 移除常見停用詞
-        stopwords = {'的', '是', '和', '與', '或', '在', '了', '有', '為', '等', 
-                     'the', 'is', 'and', 'or', 'in', 'at', 'to', 'a', 'an'}
-        
-        # 分割並過濾
-        words = query.split()
-        keywords = [w for w in words if w.lower() not in stopwords and len(w) > 1]
+        # 分割並過濾停用詞；標點不再黏在關鍵詞上（例如「台積電？」）
+        words = _TOKEN_RE.findall(query)
+        keywords = [w for w in words if w.lower() not in _STOPWORDS and len(w) > 1]
         
         # 如果沒有關鍵詞，使用整個查詢
         if not keywords:
             keywords = [query]
         
-        return keywords[:5]  # 最多 5 個關鍵詞
+        return tuple(keywords[:5])  # 最多 5 個關鍵詞
+    
+    @staticmethod
+    def _compact_search_results(
+        search_results: Optional[List[Dict[str, Any]]],
+        limit: int = 10,
+        snippet_chars: int = 200
+    ) -> List[Dict[str, str]]:
+        """
+        只保留報告需要的欄位（標題、網址、摘要），摘要只計算一次
+        
+        爬取結果沒有 snippet 欄位，依序改用 description / content / full_text；
+        只處理前幾百個字元，不必對整頁內容做字串操作
+        """
+        compact = []
+        for result in (search_results or [])[:limit]:
+            text = (
+                result.get("snippet") or result.get("description")
+                or result.get("content") or result.get("full_text") or ""
+            )
+            compact.append({
+                "title": result.get("title") or "N/A",
+                "url": result.get("url") or "#",
+                "snippet": " ".join(text[:snippet_chars * 2].split())[:snippet_chars],
+            })
+        return compact
     
     def _integrate_data_sources(
         self, 
@@ -236,138 +593,194 @@ class ReportGenerator:
         """
         integrated = {
             "query": query,
-            "search_results": search_results[:10] if search_results else [],  # 稍微提高搜尋結果
+            "search_results": self._compact_search_results(search_results),
             "neo4j_entities": neo4j_data.get("entities", []),  # 🔧 不限制
             "neo4j_relationships": neo4j_data.get("relationships", []),  # 🔧 不限制
         }
         
         return integrated
     
-    def _generate_report_with_llm(self, query: str, sources: Dict[str, Any]) -> str:
+    def _generate_report_with_llm(
+        self,
+        query: str,
+        sources: Dict[str, Any],
+        on_chunk: Optional[Callable[[str], None]] = None
+    ) -> str:
         """
-        使用 LLM 生成詳細報告
+        使用 LLM 生成詳細報告；提供 on_chunk 時以串流方式逐段回呼，並返回完整報告
         """
         # 構建 prompt
         prompt = self._build_report_prompt(query, sources)
         
-        # 呼叫 Ollama
+        if on_chunk is None:
+            # 呼叫 Ollama
+            try:
+                report = self._call_ollama(prompt, system=REPORT_SYSTEM_PROMPT)
+                return report
+            except Exception as e:
+                logger.error("   ❌ LLM 生成報告失敗: %s", e)
+                # 返回備用報告
+                return self._generate_fallback_report(query, sources)
+        
+        parts = []
         try:
-            report = self._call_ollama(prompt)
-            return report
+            for piece in self._call_ollama_stream(prompt, system=REPORT_SYSTEM_PROMPT):
+                parts.append(piece)
+                on_chunk(piece)
+            return "".join(parts)
         except Exception as e:
-            logger.error(f"   ❌ LLM 生成報告失敗: {e}")
-            # 返回備用報告
-            return self._generate_fallback_report(query, sources)
+            logger.error("   ❌ LLM 串流生成報告失敗: %s", e)
+            if parts:
+                # 已送出的內容無法收回，保留已生成的部分
+                return "".join(parts)
+            report = self._generate_fallback_report(query, sources)
+            on_chunk(report)
+            return report
     
     def _build_report_prompt(self, query: str, sources: Dict[str, Any]) -> str:
         """
         🔧 優化：構建用於生成報告的 prompt，顯示更多實體和關係
         """
-        # 準備實體資訊（顯示更多）
-        entities_info = ""
         entities = sources.get("neo4j_entities", [])
+        relationships = sources.get("neo4j_relationships", [])
+        
+        # 只包含每次請求不同的部分，固定指示見 REPORT_SYSTEM_PROMPT
+        prompt = f"""請基於以下資訊，撰寫一份關於「{query}」的詳細研究報告。
+
+{self._build_report_context(query, sources)}
+
+請充分利用提供的所有 {len(entities)} 個實體和 {len(relationships)} 個關係。
+
+報告：
+"""
+        
+        return prompt
+    
+    def _build_section_prompts(self, query: str, sources: Dict[str, Any]) -> Dict[str, str]:
+        """
+        為每個段落構建各自的 prompt（資料部分相同，只有最後的段落指示不同）
+        """
+        context = self._build_report_context(query, sources)
+        return {
+            title: f"""以下是關於「{query}」的研究資料。
+
+{context}
+
+請撰寫研究報告中的「{title}」段落：{guide}。
+
+{title}：
+"""
+            for title, guide in REPORT_SECTIONS
+        }
+    
+    def _build_report_context(self, query: str, sources: Dict[str, Any]) -> str:
+        """
+        將實體、關係與搜尋結果整理成 prompt 中的資料部分（實體與關係依顯著性排序）
+        """
+        parts = []
+        entities = sources.get("neo4j_entities", [])
+        relationships = sources.get("neo4j_relationships", [])
+        
+        shown_entities = self._rank_entities(
+            entities, relationships, self._extract_keywords(query)
+        )[:self.prompt_entities]
+        
+        # 準備實體資訊
         if entities:
-            entities_info = f"知識庫中的相關實體 (共 {len(entities)} 個):\n"
-            # 🔧 顯示更多實體（最多 30 個）
-            for i, entity in enumerate(entities[:30], 1):
-                entities_info += f"{i}. {entity['name']} ({entity['type']})"
-                if entity.get('description'):
-                    entities_info += f": {entity.get('description', '')[:150]}"
-                entities_info += "\n"
+            parts.append(f"知識庫中的相關實體 (共 {len(entities)} 個):\n")
+            for i, entity in enumerate(shown_entities, 1):
+                description = entity.get("description")
+                if description:
+                    parts.append(f"{i}. {entity['name']} ({entity['type']}): {description[:150]}\n")
+                else:
+                    parts.append(f"{i}. {entity['name']} ({entity['type']})\n")
             
-            if len(entities) > 30:
-                entities_info += f"... 以及其他 {len(entities) - 30} 個實體\n"
+            if len(entities) > len(shown_entities):
+                parts.append(f"... 以及其他 {len(entities) - len(shown_entities)} 個實體\n")
+        parts.append("\n")
         
-        # 準備關係資訊（顯示更多）
-        relationships_info = ""
-        relationships = sources.get("neo4j_relationships", [])
+        # 準備關係資訊：兩端都在上面列出的實體中的關係優先
         if relationships:
-            relationships_info = f"\n實體之間的關係 (共 {len(relationships)} 個):\n"
-            # 🔧 顯示更多關係（最多 20 個）
-            for i, rel in enumerate(relationships[:20], 1):
-                relationships_info += f"{i}. {rel['source']} --[{rel['relation']}]--> {rel['target']}"
-                if rel.get('description'):
-                    relationships_info += f" ({rel['description'][:100]})"
-                relationships_info += "\n"
+            shown_names = {entity["name"] for entity in shown_entities}
+            shown_relationships = sorted(
+                relationships,
+                key=lambda rel: (rel["source"] in shown_names) + (rel["target"] in shown_names),
+                reverse=True
+            )[:self.prompt_relationships]
             
-            if len(relationships) > 20:
-                relationships_info += f"... 以及其他 {len(relationships) - 20} 個關係\n"
+            parts.append(f"\n實體之間的關係 (共 {len(relationships)} 個):\n")
+            for i, rel in enumerate(shown_relationships, 1):
+                line = f"{i}. {rel['source']} --[{rel['relation']}]--> {rel['target']}"
+                description = rel.get("description")
+                if description:
+                    parts.append(f"{line} ({description[:100]})\n")
+                else:
+                    parts.append(f"{line}\n")
+            
+            if len(relationships) > len(shown_relationships):
+                parts.append(f"... 以及其他 {len(relationships) - len(shown_relationships)} 個關係\n")
+        parts.append("\n")
         
         # 準備搜尋結果
-        search_info = ""
         search_results = sources.get("search_results", [])
         if search_results:
-            search_info = "\n最新搜尋結果:\n"
+            parts.append("\n最新搜尋結果:\n")
             for i, result in enumerate(search_results[:5], 1):
-                search_info += f"{i}. {result.get('title', 'N/A')}\n"
-                search_info += f"   摘要: {result.get('snippet', 'N/A')[:200]}\n"
+                parts.append(f"{i}. {result.get('title', 'N/A')}\n   摘要: {result['snippet'] or 'N/A'}\n")
         
-        # 構建完整 prompt
-        prompt = f"""你是一位專業的研究員。請基於以下資訊，用繁體中文(zh-tw)撰寫一份關於「{query}」的詳細研究報告。
-
-{entities_info}
-{relationships_info}
-{search_info}
-
-請撰寫一份結構完整的研究報告，包含以下部分：
-
-1. **執行摘要** (2-3 段)
-   - 簡要概述主題
-   - 突出最重要的發現
-
-2. **背景資訊**
-   - 相關背景和上下文
-   - 主要參與者或實體
-
-3. **主要發現** (3-5 點)
-   - 基於資料的關鍵洞察
-   - 重要趨勢或模式
-
-4. **詳細分析** (2-3 段)
-   - 深入分析實體之間的關係
-   - 解釋重要性和影響
-
-5. **結論與總結**
-   - 總結關鍵要點
-   - 明確的回覆使用者所的問題
-
-請確保報告：
-- 充分利用提供的所有 {len(entities)} 個實體和 {len(relationships)} 個關係
-- 基於提供的資料
-- 客觀且有依據
-- 結構清晰
-- 使用專業語言
-
-報告：
-"""
+        # 以 list 收集片段再一次 join，避免迴圈中反覆 += 產生新字串
+        return "".join(parts)
+    
+    @staticmethod
+    def _rank_entities(
+        entities: List[Dict[str, Any]],
+        relationships: List[Dict[str, Any]],
+        keywords: List[str]
+    ) -> List[Dict[str, Any]]:
+        """
+        依顯著性排序實體：名稱 / 描述命中的關鍵詞數 + 在關係中出現的次數（同分時保持原本的相關度順序）
+        """
+        degree = Counter()
+        for rel in relationships:
+            degree[rel["source"]] += 1
+            degree[rel["target"]] += 1
         
-        return prompt
+        keywords = [k.lower() for k in keywords]
+        
+        def salience(entity: Dict[str, Any]) -> int:
+            text = f"{entity['name']} {entity.get('description') or ''}".lower()
+            return sum(1 for k in keywords if k in text) + degree[entity["name"]]
+        
+        return sorted(entities, key=salience, reverse=True)
     
     def generate_report_from_extraction(
         self,
         query: str,
         entities: List[Dict[str, Any]],
         relationships: List[Dict[str, Any]],
-        search_results: List[Dict[str, Any]] = None
+        search_results: List[Dict[str, Any]] = None,
+        on_chunk: Optional[Callable[[str], None]] = None
     ) -> Dict[str, Any]:
         """
         🔧 優化：直接使用萃取的實體和關係生成報告，不限制數量
         避免萃取完成後立即查詢 Neo4j 的時間差問題
+        
+        on_chunk: 串流模式下每收到一段報告文字即呼叫（在目前執行緒中呼叫）
         """
-        logger.info(f"📝 使用萃取結果生成報告: {query}")
-        logger.info(f"   📊 實體: {len(entities)}, 關係: {len(relationships)}")
+        logger.info("📝 使用萃取結果生成報告: %s", query)
+        logger.info("   📊 實體: %s, 關係: %s", len(entities), len(relationships))
         
         # 構建資料源（🔧 不限制數量）
         sources = {
             "query": query,
-            "search_results": search_results[:10] if search_results else [],
+            "search_results": self._compact_search_results(search_results),
             "neo4j_entities": entities,  # 🔧 使用所有實體
             "neo4j_relationships": relationships  # 🔧 使用所有關係
         }
         
         # 生成報告
-        logger.info(f"   🤖 呼叫 Ollama 生成報告...")
-        report = self._generate_report_with_llm(query, sources)
+        logger.info("   🤖 呼叫 Ollama 生成報告...")
+        report = self._generate_report_with_llm(query, sources, on_chunk)
         
         result = {
             "query": query,
@@ -377,77 +790,463 @@ class ReportGenerator:
                 "neo4j_entities": len(entities),
                 "neo4j_relationships": len(relationships)
             },
-            "generated_at": datetime.utcnow().isoformat() + "Z"
+            "generated_at": _utc_isoformat()
         }
         
-        logger.info(f"   ✅ 報告生成完成，長度: {len(report)} 字元")
+        logger.info("   ✅ 報告生成完成，長度: %s 字元", len(report))
         
         return result
     
-    def _call_ollama(self, prompt: str, max_tokens: int = 3000) -> str:
+    async def agenerate_report_from_extraction(
+        self,
+        query: str,
+        entities: List[Dict[str, Any]],
+        relationships: List[Dict[str, Any]],
+        session: aiohttp.ClientSession,
+        search_results: List[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
         """
-        🔧 優化：增加 max_tokens 以支援更長的報告
+        generate_report_from_extraction 的 async 版本（非串流），多份報告可用 asyncio.gather 並行生成
+        
+        session: 呼叫端共用的 aiohttp session（與其他 agent 呼叫共用連線池）
         """
+        logger.info("📝 使用萃取結果生成報告: %s", query)
+        logger.info("   📊 實體: %s, 關係: %s", len(entities), len(relationships))
+        
+        sources = {
+            "query": query,
+            "search_results": self._compact_search_results(search_results),
+            "neo4j_entities": entities,
+            "neo4j_relationships": relationships
+        }
+        
+        logger.info("   🤖 呼叫 Ollama 生成報告...")
         try:
-            response = requests.post(
-                f"{self.ollama_endpoint}/api/generate",
-                json={
-                    "model": self.model_name,
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.7,
-                        "num_predict": max_tokens,  # 🔧 提高到 3000
-                        "top_p": 0.9
-                    }
-                },
-                timeout=120  # 🔧 增加超時時間到 2 分鐘
-            )
-            response.raise_for_status()
-            return response.json().get("response", "")
+            if self.sectioned_report:
+                report = await self._agenerate_sectioned_report(session, query, sources)
+            else:
+                prompt = self._build_report_prompt(query, sources)
+                report = await self._acall_ollama(session, prompt, system=REPORT_SYSTEM_PROMPT)
+        except Exception as e:
+            logger.error("   ❌ LLM 生成報告失敗: %s", e)
+            report = self._generate_fallback_report(query, sources)
+        
+        logger.info("   ✅ 報告生成完成，長度: %s 字元", len(report))
+        
+        return {
+            "query": query,
+            "report": report,
+            "sources": {
+                "search_results_count": len(search_results) if search_results else 0,
+                "neo4j_entities": len(entities),
+                "neo4j_relationships": len(relationships)
+            },
+            "generated_at": _utc_isoformat()
+        }
+    
+    async def _agenerate_sectioned_report(
+        self,
+        session: aiohttp.ClientSession,
+        query: str,
+        sources: Dict[str, Any]
+    ) -> str:
+        """
+        各段落並行生成後依序拼接；耗時約為最慢的一段，而不是所有段落的總和
+        整批只經過斷路器一次；任一段失敗時取消其餘段落，失敗的段落改用備用文字
+        """
+        prompts = self._build_section_prompts(query, sources)
+        model = self.report_model
+        namespace = self._cache_namespace(model, self.section_max_tokens, SECTION_SYSTEM_PROMPT)
+        cached = await asyncio.gather(*[self._acache_get(prompt, namespace) for prompt in prompts.values()])
+        sections = dict(zip(prompts, cached))
+        
+        pending = [title for title, text in sections.items() if text is None]
+        if pending:
+            # 斷路器試探中只放行一次呼叫，整批一起算，不讓各段落各自搶試探名額
+            self._before_llm_call()
+            tasks = [
+                asyncio.ensure_future(self._agenerate_text(
+                    session, prompts[title], model, self.section_max_tokens, SECTION_SYSTEM_PROMPT
+                ))
+                for title in pending
+            ]
+            try:
+                await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            except asyncio.CancelledError:
+                for task in tasks:
+                    task.cancel()
+                with self._breaker_lock:
+                    self.breaker.release_trial()
+                raise
+            # 任一段失敗通常代表 Ollama 有問題，其餘段落不必等到逾時
+            for task in tasks:
+                task.cancel()
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+            
+            errors = [r for r in results if isinstance(r, Exception)]
+            self._after_llm_call(errors[0] if errors else None)
+            if errors and len(pending) == len(sections) and not any(isinstance(r, str) for r in results):
+                # 沒有任何段落可用，交給呼叫端改用完整的備用報告
+                raise errors[0]
+            
+            for title, result in zip(pending, results):
+                if isinstance(result, str):
+                    sections[title] = result
+                    if result:
+                        await self._acache_set(prompts[title], result, namespace)
+                else:
+                    logger.warning("   ⚠️ 段落「%s」生成失敗: %r", title, result)
+                    sections[title] = SECTION_FALLBACK_TEXT
+        
+        return "\n\n".join(
+            f"## {i}. {title}\n\n{text.strip()}"
+            for i, (title, text) in enumerate(sections.items(), 1)
+        )
+    
+    def _embed(self, text: str) -> List[float]:
+        """
+        以 Ollama embedding 模型取得文字向量（供語意快取使用）
+        """
+        response = self.session.post(
+            f"{self.ollama_endpoint}/api/embed",
+            data=orjson.dumps({"model": self.embed_model, "input": text}),
+            headers={"Content-Type": "application/json"},
+            timeout=30
+        )
+        response.raise_for_status()
+        embeddings = orjson.loads(response.content).get("embeddings") or [[]]
+        return embeddings[0]
+    
+    def _before_llm_call(self):
+        """
+        經過斷路器（開啟中時拋出 CircuitOpenError）
+        """
+        with self._breaker_lock:
+            self.breaker.before_call()
+    
+    def _after_llm_call(self, error: Optional[BaseException] = None):
+        """
+        記錄呼叫結果：連線錯誤、逾時與 5xx / 429 計為斷路器失敗
+        """
+        # 同步串流走 requests，非串流報告走 aiohttp（判斷方式與呼叫其他 agent 相同）
+        transient = isinstance(error, (requests.ConnectionError, requests.Timeout)) or (
+            isinstance(error, requests.HTTPError)
+            and error.response is not None
+            and (error.response.status_code >= 500 or error.response.status_code == 429)
+        ) or is_transient_error(error)
+        with self._breaker_lock:
+            if transient:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+    
+    @staticmethod
+    def _cache_namespace(model: str, max_tokens: int, system: Optional[str]) -> str:
+        """
+        LLM 快取的 namespace；system prompt 以雜湊區分（語意比對只看每次不同的 prompt）
+        """
+        namespace = f"{model}|{max_tokens}"
+        if system:
+            namespace += "|" + hashlib.blake2b(system.encode("utf-8"), digest_size=8).hexdigest()
+        return namespace
+    
+    @staticmethod
+    def _generate_payload(
+        prompt: str,
+        model: str,
+        max_tokens: int,
+        system: Optional[str],
+        stream: bool
+    ) -> Dict[str, Any]:
+        """
+        /api/generate 的請求內容
+        """
+        return {
+            "model": model,
+            "prompt": prompt,
+            **({"system": system} if system else {}),
+            "stream": stream,
+            "options": {
+                "temperature": 0.7,
+                "num_predict": max_tokens,  # 🔧 提高到 3000
+                "top_p": 0.9
+            }
+        }
+    
+    def _call_ollama(
+        self,
+        prompt: str,
+        max_tokens: int = 3000,
+        model: Optional[str] = None,
+        system: Optional[str] = None
+    ) -> str:
+        """
+        🔧 優化：增加 max_tokens 以支援更長的報告；相同（或語意相近）的 prompt 直接使用快取
+        未指定 model 時使用報告模型；system 為固定指示（放在 prompt 之前）
+        """
+        model = model or self.report_model
+        namespace = self._cache_namespace(model, max_tokens, system)
+        cached = self.llm_cache.get(prompt, namespace)
+        if cached is not None:
+            logger.info("   ♻️ 使用快取的 LLM 回應")
+            return cached
+        
+        self._before_llm_call()
+        try:
+            # 內部一樣以串流讀取：讀取逾時只限制兩段輸出之間的間隔，長報告不會因總生成時間而逾時
+            text = "".join(self._stream_generate(prompt, model, max_tokens, system))
+        except Exception as e:
+            self._after_llm_call(e)
+            logger.error("   ❌ Ollama API 錯誤: %s", e)
+            raise
+        
+        self._after_llm_call()
+        if text:
+            self.llm_cache.set(prompt, text, namespace)
+        return text
+    
+    async def _acall_ollama(
+        self,
+        session: aiohttp.ClientSession,
+        prompt: str,
+        max_tokens: int = 3000,
+        model: Optional[str] = None,
+        system: Optional[str] = None
+    ) -> str:
+        """
+        _call_ollama 的 async 版本：等待生成時不佔用執行緒，可用 asyncio.gather 並行送出多個 prompt
+        """
+        model = model or self.report_model
+        namespace = self._cache_namespace(model, max_tokens, system)
+        cached = await self._acache_get(prompt, namespace)
+        if cached is not None:
+            return cached
+        
+        self._before_llm_call()
+        try:
+            text = await self._agenerate_text(session, prompt, model, max_tokens, system)
+        except asyncio.CancelledError:
+            with self._breaker_lock:
+                self.breaker.release_trial()
+            raise
         except Exception as e:
-            logger.error(f"   ❌ Ollama API 錯誤: {e}")
+            self._after_llm_call(e)
+            logger.error("   ❌ Ollama API 錯誤: %s", e)
             raise
+        
+        self._after_llm_call()
+        if text:
+            await self._acache_set(prompt, text, namespace)
+        return text
+    
+    async def _acache_get(self, prompt: str, namespace: str) -> Optional[str]:
+        """
+        查詢 LLM 快取；語意比對需要呼叫 embedding API（同步），放到執行緒
+        """
+        if self.llm_cache.semantic_enabled:
+            cached = await asyncio.to_thread(self.llm_cache.get, prompt, namespace)
+        else:
+            cached = self.llm_cache.get(prompt, namespace)
+        if cached is not None:
+            logger.info("   ♻️ 使用快取的 LLM 回應")
+        return cached
+    
+    async def _acache_set(self, prompt: str, text: str, namespace: str):
+        """
+        寫入 LLM 快取（語意快取同樣放到執行緒）
+        """
+        if self.llm_cache.semantic_enabled:
+            await asyncio.to_thread(self.llm_cache.set, prompt, text, namespace)
+        else:
+            self.llm_cache.set(prompt, text, namespace)
+    
+    async def _agenerate_text(
+        self,
+        session: aiohttp.ClientSession,
+        prompt: str,
+        model: str,
+        max_tokens: int,
+        system: Optional[str]
+    ) -> str:
+        """
+        讀完串流回應，返回完整文字（不經過斷路器與快取）
+        """
+        return "".join([
+            piece async for piece in self._astream_generate(session, prompt, model, max_tokens, system)
+        ])
+    
+    def _call_ollama_stream(
+        self,
+        prompt: str,
+        max_tokens: int = 3000,
+        model: Optional[str] = None,
+        system: Optional[str] = None
+    ) -> Iterator[str]:
+        """
+        以串流方式呼叫 Ollama，逐段產生回應文字；完整回應寫入快取（命中快取時一次產生全文）
+        """
+        model = model or self.report_model
+        namespace = self._cache_namespace(model, max_tokens, system)
+        cached = self.llm_cache.get(prompt, namespace)
+        if cached is not None:
+            logger.info("   ♻️ 使用快取的 LLM 回應")
+            yield cached
+            return
+        
+        parts = []
+        self._before_llm_call()
+        try:
+            for piece in self._stream_generate(prompt, model, max_tokens, system):
+                parts.append(piece)
+                yield piece
+        except GeneratorExit:
+            # 呼叫端提前停止讀取，不計成功或失敗
+            with self._breaker_lock:
+                self.breaker.release_trial()
+            raise
+        except Exception as e:
+            self._after_llm_call(e)
+            raise
+        self._after_llm_call()
+        
+        text = "".join(parts)
+        if text:
+            self.llm_cache.set(prompt, text, namespace)
+    
+    def _stream_generate(
+        self,
+        prompt: str,
+        model: str,
+        max_tokens: int,
+        system: Optional[str]
+    ) -> Iterator[str]:
+        """
+        送出串流請求，逐段產生 Ollama 回應文字
+        """
+        with self.session.post(
+            f"{self.ollama_endpoint}/api/generate",
+            data=orjson.dumps(self._generate_payload(prompt, model, max_tokens, system, stream=True)),
+            headers={"Content-Type": "application/json"},
+            stream=True,
+            timeout=(self.connect_timeout, self.report_timeout)  # 讀取逾時為兩段輸出之間的最長等待時間
+        ) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                data = orjson.loads(line)
+                if data.get("error"):
+                    raise RuntimeError(data["error"])
+                piece = data.get("response", "")
+                if piece:
+                    yield piece
+                if data.get("done"):
+                    break
+    
+    async def _astream_generate(
+        self,
+        session: aiohttp.ClientSession,
+        prompt: str,
+        model: str,
+        max_tokens: int,
+        system: Optional[str]
+    ) -> AsyncIterator[str]:
+        """
+        _stream_generate 的 async 版本；讀取逾時同樣是兩段輸出之間的最長等待時間
+        """
+        async with session.post(
+            f"{self.ollama_endpoint}/api/generate",
+            data=orjson.dumps(self._generate_payload(prompt, model, max_tokens, system, stream=True)),
+            headers={"Content-Type": "application/json"},
+            timeout=self._ollama_timeout
+        ) as response:
+            response.raise_for_status()
+            # 最後一行包含 context（token id 陣列）可能很長，自行切行，不受 readline 的長度上限限制
+            pending: List[bytes] = []
+            async for chunk, _ in response.content.iter_chunks():
+                *lines, rest = chunk.split(b"\n")
+                if lines:
+                    lines[0] = b"".join(pending) + lines[0]
+                    pending.clear()
+                    for line in lines:
+                        piece = self._generate_piece(line)
+                        if piece:
+                            yield piece
+                pending.append(rest)
+            piece = self._generate_piece(b"".join(pending))
+            if piece:
+                yield piece
+    
+    @staticmethod
+    def _generate_piece(line: bytes) -> str:
+        """
+        解析 /api/generate 串流中的一行，返回其中的回應文字
+        """
+        if not line.strip():
+            return ""
+        data = orjson.loads(line)
+        if data.get("error"):
+            raise RuntimeError(data["error"])
+        return data.get("response", "")
     
     def _generate_fallback_report(self, query: str, sources: Dict[str, Any]) -> str:
         """
         當 LLM 失敗時，生成簡單的備用報告
         """
-        report = f"# {query} - 研究報告\n\n"
-        report += f"生成時間: {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')} UTC\n\n"
+        parts = []
         
         # 實體摘要
         entities = sources.get("neo4j_entities", [])
         if entities:
-            report += f"## 相關實體 (共 {len(entities)} 個)\n\n"
+            parts.append(f"## 相關實體 (共 {len(entities)} 個)\n\n")
             for entity in entities[:10]:
-                report += f"- **{entity['name']}** ({entity['type']})\n"
-                if entity.get('description'):
-                    report += f"  {entity['description'][:100]}...\n"
+                description = entity.get("description")
+                if description:
+                    parts.append(f"- **{entity['name']}** ({entity['type']})\n  {description[:100]}...\n")
+                else:
+                    parts.append(f"- **{entity['name']}** ({entity['type']})\n")
             if len(entities) > 10:
-                report += f"\n... 以及其他 {len(entities) - 10} 個實體\n"
-            report += "\n"
+                parts.append(f"\n... 以及其他 {len(entities) - 10} 個實體\n")
+            parts.append("\n")
         
         # 關係摘要
         relationships = sources.get("neo4j_relationships", [])
         if relationships:
-            report += f"## 實體關係 (共 {len(relationships)} 個)\n\n"
+            parts.append(f"## 實體關係 (共 {len(relationships)} 個)\n\n")
             for rel in relationships[:10]:
-                report += f"- {rel['source']} → {rel['relation']} → {rel['target']}\n"
+                parts.append(f"- {rel['source']} → {rel['relation']} → {rel['target']}\n")
             if len(relationships) > 10:
-                report += f"\n... 以及其他 {len(relationships) - 10} 個關係\n"
-            report += "\n"
+                parts.append(f"\n... 以及其他 {len(relationships) - 10} 個關係\n")
+            parts.append("\n")
         
         # 搜尋結果
         search_results = sources.get("search_results", [])
         if search_results:
-            report += "## 相關資料來源\n\n"
+            parts.append("## 相關資料來源\n\n")
             for i, result in enumerate(search_results[:5], 1):
-                report += f"{i}. [{result.get('title', 'N/A')}]({result.get('url', '#')})\n"
-            report += "\n"
-        
-        report += "## 結論\n\n"
-        report += f"基於現有資料，找到 {len(entities)} 個相關實體和 {len(relationships)} 個關係。"
-        report += "建議進行進一步研究以獲得更深入的洞察。\n"
+                parts.append(f"{i}. [{result.get('title', 'N/A')}]({result.get('url', '#')})\n")
+            parts.append("\n")
         
-        return report
\ No newline at end of file
+        return FALLBACK_REPORT_TEMPLATE.format(
+            query=query,
+            generated_at=datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),
+            sections="".join(parts),
+            entity_count=len(entities),
+            relationship_count=len(relationships)
+        )
+
+
+_report_generator = None
+_report_generator_lock = threading.Lock()
+
+
+def get_report_generator() -> ReportGenerator:
+    """
+    取得 process 內共用的 ReportGenerator（避免重複建立 Neo4j 連線池）
+    """
+    global _report_generator
+    if _report_generator is None:
+        with _report_generator_lock:
+            if _report_generator is None:
+                _report_generator = ReportGenerator()
+    return _report_generator
@@ -0,0 +1,136 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """斷路器開啟中，呼叫被直接拒絕"""
+
+
+class CircuitBreaker:
+    """
+    簡單的斷路器：連續失敗 fail_max 次後開啟，
+    reset_timeout 秒後放行一次試探呼叫，成功即恢復
+    """
+
+    def __init__(self, name: str, fail_max: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.fail_max = fail_max
+        self.reset_timeout = reset_timeout
+
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+
+        # 統計
+        self.retries_total = 0
+        self.open_total = 0
+        self.rejected_total = 0
+
+    def before_call(self):
+        """
+        呼叫前檢查；開啟中則拋出 CircuitOpenError
+        """
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                self.rejected_total += 1
+                raise CircuitOpenError(f"{self.name} 斷路器開啟中")
+            self.state = "half_open"
+
+        if self.state == "half_open":
+            if self._trial_in_flight:
+                self.rejected_total += 1
+                raise CircuitOpenError(f"{self.name} 斷路器試探中")
+            self._trial_in_flight = True
+
+    def release_trial(self):
+        """
+        呼叫被取消時釋放試探名額（不計成功或失敗）
+        """
+        self._trial_in_flight = False
+
+    def record_success(self):
+        if self.state != "closed":
+            logger.info("🟢 %s 斷路器恢復", self.name)
+        self.state = "closed"
+        self.failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.state == "half_open" or self.failures >= self.fail_max:
+            if self.state != "open":
+                self.open_total += 1
+                logger.warning("🔴 %s 斷路器開啟（連續失敗 %s 次）", self.name, self.failures)
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "retries_total": self.retries_total,
+            "breaker_open_total": self.open_total,
+            "rejected_total": self.rejected_total
+        }
+
+
+def is_transient_error(error: BaseException, retry_timeouts: bool = True) -> bool:
+    """
+    判斷錯誤是否值得重試：連線錯誤、5xx / 429、（可選）逾時
+    """
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status >= 500 or error.status == 429
+    if isinstance(error, asyncio.TimeoutError):
+        return retry_timeouts
+    return isinstance(error, aiohttp.ClientError)
+
+
+async def call_with_retry(
+    func: Callable[[], Awaitable[Any]],
+    breaker: CircuitBreaker,
+    attempts: int = 3,
+    base_delay: float = 1.0,
+    max_delay: float = 10.0,
+    retry_timeouts: bool = True
+) -> Any:
+    """
+    以指數退避重試暫時性錯誤，並透過斷路器在下游持續故障時快速失敗
+    """
+    for attempt in range(1, attempts + 1):
+        breaker.before_call()
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            breaker.release_trial()
+            raise
+        except Exception as e:
+            if isinstance(e, aiohttp.ClientResponseError) and not is_transient_error(e):
+                # 下游有回應（例如 4xx），不算斷路器失敗
+                breaker.record_success()
+                raise
+
+            breaker.record_failure()
+            # 不重試的錯誤（例如 retry_timeouts=False 時的逾時）仍計入斷路器失敗
+            if not is_transient_error(e, retry_timeouts) or attempt >= attempts or breaker.state == "open":
+                raise
+
+            delay = min(max_delay, base_delay * 2 ** (attempt - 1))
+            delay *= random.uniform(0.5, 1.0)  # jitter，避免同時重試
+            breaker.retries_total += 1
+            logger.warning(
+                "   🔁 %s 呼叫失敗，%.1f 秒後重試 (%s/%s): %s",
+                breaker.name, delay, attempt, attempts - 1, e
+            )
+            await asyncio.sleep(delay)
+        else:
+            breaker.record_success()
+            return result
@@ -0,0 +1,78 @@
+import json
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm_cache import LLMCache
+
+
+def test_entries_expire_after_ttl():
+    cache = LLMCache(maxsize=8, ttl=0.05)
+    cache.set("prompt", "response")
+    assert cache.get("prompt") == "response"
+
+    time.sleep(0.1)
+    assert cache.get("prompt") is None
+    assert cache.stats == {"exact_hits": 1, "semantic_hits": 0, "misses": 1}
+
+
+def test_namespaces_are_separate():
+    cache = LLMCache(maxsize=8)
+    cache.set("prompt", "a", namespace="model-a")
+    assert cache.get("prompt", namespace="model-a") == "a"
+    assert cache.get("prompt", namespace="model-b") is None
+
+
+def test_load_keeps_original_write_time(tmp_path):
+    path = str(tmp_path / "llm_cache.json")
+    cache = LLMCache(maxsize=8, ttl=60, path=path)
+    cache.set("fresh", "kept")
+    cache.save()
+
+    with open(path, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    # 過期的項目與沒有寫入時間的舊格式項目都不載入
+    entries[LLMCache._key("stale", "")] = ["dropped", time.time() - 120]
+    entries[LLMCache._key("legacy", "")] = "dropped"
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(entries, f)
+
+    reloaded = LLMCache(maxsize=8, ttl=60, path=path)
+    assert len(reloaded) == 1
+    assert reloaded.get("fresh") == "kept"
+    assert reloaded.get("stale") is None
+    assert reloaded.get("legacy") is None
+
+
+def make_semantic_cache(maxsize):
+    pytest.importorskip("numpy")
+    # 以 prompt 開頭的字決定向量，同字開頭的 prompt 視為語意相同
+    axes = {"a": [1.0, 0.0, 0.0], "b": [0.0, 1.0, 0.0], "c": [0.0, 0.0, 1.0]}
+    return LLMCache(maxsize=maxsize, threshold=0.9, embed_fn=lambda prompt: axes[prompt[0]])
+
+
+def test_semantic_hit_within_namespace():
+    cache = make_semantic_cache(maxsize=8)
+    cache.set("a first prompt", "answer", namespace="ns")
+
+    assert cache.get("a reworded prompt", namespace="ns") == "answer"
+    assert cache.get("a reworded prompt", namespace="other") is None
+    assert cache.get("b unrelated prompt", namespace="ns") is None
+    assert cache.stats["semantic_hits"] == 1
+
+
+def test_semantic_index_drops_evicted_entries():
+    cache = make_semantic_cache(maxsize=2)
+    cache.set("a one", "A", namespace="ns")
+    cache.set("b two", "B", namespace="ns")
+    cache.set("c three", "C", namespace="ns")  # 淘汰 "a one"
+
+    # 下一次語意查詢重建矩陣時移除已淘汰的項目
+    assert cache.get("a again", namespace="ns") is None
+    assert len(cache._index["ns"]["keys"]) == 2
+    assert cache._matrices["ns"].shape == (2, 3)
+    assert cache.get("c again", namespace="ns") == "C"
@@ -0,0 +1,127 @@
+import asyncio
+import os
+import sys
+
+import aiohttp
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from resilience import CircuitBreaker, CircuitOpenError, call_with_retry
+
+
+def open_breaker(fail_max=2):
+    breaker = CircuitBreaker("test", fail_max=fail_max, reset_timeout=30)
+    for _ in range(fail_max):
+        breaker.before_call()
+        breaker.record_failure()
+    return breaker
+
+
+def expire(breaker):
+    # 不等待 reset_timeout，直接讓開啟時間過期
+    breaker.opened_at -= breaker.reset_timeout
+
+
+def test_breaker_allows_single_trial_after_reset_timeout():
+    breaker = open_breaker()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    expire(breaker)
+    breaker.before_call()
+    assert breaker.state == "half_open"
+    # 試探進行中，其他呼叫仍被拒絕
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.failures == 0
+    breaker.before_call()
+
+
+def test_failed_trial_reopens_breaker():
+    breaker = open_breaker()
+    expire(breaker)
+    breaker.before_call()
+    breaker.record_failure()
+
+    assert breaker.state == "open"
+    assert breaker.open_total == 2
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_cancelled_trial_is_released():
+    breaker = open_breaker()
+    expire(breaker)
+
+    async def run():
+        started = asyncio.Event()
+
+        async def hang():
+            started.set()
+            await asyncio.Event().wait()
+
+        task = asyncio.ensure_future(call_with_retry(hang, breaker))
+        await started.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+
+    # 取消不計成功或失敗，下一個呼叫可以取得試探名額
+    assert breaker.state == "half_open"
+    breaker.before_call()
+
+
+def test_client_error_counts_as_success():
+    breaker = CircuitBreaker("test", fail_max=2)
+    breaker.record_failure()
+    calls = []
+
+    async def not_found():
+        calls.append(1)
+        raise aiohttp.ClientResponseError(None, (), status=404)
+
+    with pytest.raises(aiohttp.ClientResponseError):
+        asyncio.run(call_with_retry(not_found, breaker, base_delay=0))
+
+    assert len(calls) == 1
+    assert breaker.failures == 0
+    assert breaker.state == "closed"
+
+
+def test_unretried_timeout_counts_as_failure():
+    breaker = CircuitBreaker("test", fail_max=2)
+    calls = []
+
+    async def timeout():
+        calls.append(1)
+        raise asyncio.TimeoutError()
+
+    for _ in range(2):
+        with pytest.raises(asyncio.TimeoutError):
+            asyncio.run(call_with_retry(timeout, breaker, base_delay=0, retry_timeouts=False))
+
+    assert len(calls) == 2
+    assert breaker.state == "open"
+
+
+def test_transient_error_is_retried():
+    breaker = CircuitBreaker("test", fail_max=5)
+    calls = []
+
+    async def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise aiohttp.ClientConnectionError("reset")
+        return "ok"
+
+    assert asyncio.run(call_with_retry(flaky, breaker, base_delay=0)) == "ok"
+    assert len(calls) == 3
+    assert breaker.retries_total == 2
+    assert breaker.failures == 0
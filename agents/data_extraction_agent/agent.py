@@ -1,15 +1,136 @@
 #agents/data_extraction_agent/agent.py
 import os
-import json
 import logging
 import re
-from typing import Dict, List, Any, Set, Tuple
-import requests
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import hashlib
+import threading
+import asyncio
+import orjson
+from typing import Dict, List, Any, Set, Tuple, Optional, Callable
+import aiohttp
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from cachetools import TTLCache
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 清理 / 標準化用的正規表示式（模組載入時編譯一次）
+_NOISE_RE = re.compile(
+    r'(?:cookie\s+policy|privacy\s+policy|terms\s+of\s+service|subscribe.*?newsletter|related\s+articles).*?(?:\n|$)',
+    re.IGNORECASE
+)
+_PUNCT_RE = re.compile(r'[^\w\s]')
+_WS_RE = re.compile(r'\s+')
+_JSON_FENCE_RE = re.compile(r'```(json)?\s*')
+_JSON_OBJ_RE = re.compile(r'\{.*\}', re.DOTALL)
+
+# 標準化實體名稱時移除的常見後綴
+_NAME_SUFFIXES = ('inc', 'ltd', 'llc', 'corp', 'corporation', 'company', 'co')
+
+# 被動關係對應的主動形式；去重時對調來源與目標，A 領導 B 與 B 被領導 A 視為同一筆
+_REL_CANON = {
+    "被領導": "領導",
+    "被投資": "投資",
+    "被收購": "收購",
+    "由創立": "創立",
+    "被使用": "使用",
+    "被開發": "開發"
+}
+
+# 沒有方向的關係，A 合作 B 與 B 合作 A 視為同一筆
+_SYMMETRIC_RELATIONS = frozenset({"合作", "競爭"})
+
+# 萃取 prompt 的固定部分在模組載入時建立一次，每次呼叫只填入查詢與文本
+_BASIC_EXTRACTION_GUIDE = """【核心任務】
+1. 提取盡可能多的實體（目標：15-30 個）
+2. 為每個實體提供詳細描述
+3. 識別實體間的各種關係
+4. 不要遺漏任何重要資訊
+
+【實體類型】（請盡量涵蓋）
+- 公司/組織：相關公司、子公司、部門、機構
+- 人物：創始人、高管、董事、重要員工
+- 產品/服務：主要產品、服務、平台
+- 技術：使用的技術、技術棧、算法、工具
+- 競爭對手：直接競爭者、間接競爭者、潛在威脅
+- 合作夥伴：戰略合作、供應商、客戶
+- 投資者：投資機構、創投、天使投資人
+- 事件：融資、收購、發布、里程碑
+- 指標：營收、用戶數、市值、增長數據
+- 地點：總部、辦公室、市場區域
+- 概念：策略、願景、商業模式
+
+【關係類型】（請盡量識別）
+創立、領導、投資、收購、合作、競爭、使用、開發、發布、位於、服務於等"""
+
+_BASIC_EXTRACTION_FORMAT = """【輸出格式】
+必須返回有效的 JSON：
+{
+  "entities": [
+    {
+      "name": "實體名稱",
+      "type": "實體類型（從上述類型中選擇）",
+      "description": "詳細描述（50-100字），說明該實體的背景、作用、與主題的關聯",
+      "importance": "high/medium/low（重要性評估）"
+    }
+  ],
+  "relationships": [
+    {
+      "source": "源實體名稱",
+      "target": "目標實體名稱",
+      "relation": "關係類型",
+      "description": "關係的詳細描述",
+      "strength": "strong/medium/weak（關係強度）"
+    }
+  ]
+}
+
+【範例】
+如果主題是 "Tesla"：
+{
+  "entities": [
+    {"name": "Tesla", "type": "公司/組織", "description": "美國電動車製造商，由 Elon Musk 領導，專注於電動車和清潔能源", "importance": "high"},
+    {"name": "Elon Musk", "type": "人物", "description": "Tesla CEO，企業家，同時領導 SpaceX 和 X（前 Twitter）", "importance": "high"},
+    {"name": "Model 3", "type": "產品/服務", "description": "Tesla 暢銷電動車型，面向大眾市場", "importance": "medium"},
+    {"name": "BYD", "type": "競爭對手", "description": "中國電動車製造商，全球銷量領先", "importance": "medium"},
+    {"name": "Gigafactory", "type": "地點", "description": "Tesla 在全球的超級工廠，用於大規模生產", "importance": "medium"}
+  ],
+  "relationships": [
+    {"source": "Elon Musk", "target": "Tesla", "relation": "領導", "description": "擔任 CEO 並推動公司戰略", "strength": "strong"},
+    {"source": "Tesla", "target": "BYD", "relation": "競爭", "description": "在電動車市場直接競爭", "strength": "strong"},
+    {"source": "Tesla", "target": "Model 3", "relation": "開發", "description": "Tesla 開發並生產 Model 3", "strength": "strong"}
+  ]
+}
+
+現在請開始提取，記住要**全面且詳細**，不要遺漏任何相關實體："""
+
+_RELATIONSHIP_MINING_GUIDE = """【任務】
+1. 找出已知實體之間的關係
+2. 找出已知實體與文本中其他實體的關係
+3. 識別隱含的、間接的關係
+4. 每個關係都要有詳細描述
+
+【關係類型】
+創立、領導、投資、收購、合作、競爭、使用、開發、發布、支持、影響、基於、優於、服務於等
+
+【輸出格式】
+{
+  "relationships": [
+    {
+      "source": "實體A",
+      "target": "實體B",
+      "relation": "關係類型",
+      "description": "詳細描述這個關係，包括時間、方式、影響等",
+      "strength": "strong/medium/weak",
+      "evidence": "文本中支持這個關係的具體證據"
+    }
+  ]
+}
+
+請盡可能多地提取關係（目標：10-20 個關係）："""
+
+
 class DataExtractionAgent:
     """
     GPU 加速超強版 - 最大化實體和關聯提取：
@@ -26,11 +147,38 @@ class DataExtractionAgent:
     def __init__(self):
         self.ollama_endpoint = os.getenv("OLLAMA_ENDPOINT", "http://ollama:11434")
         self.model_name = os.getenv("MODEL_NAME", "llama3.2:3b")
+        # 輔助任務（實體擴展、關係推斷、整體摘要）可改用較小的模型；主要萃取仍使用 MODEL_NAME
+        self.aux_model = os.getenv("AUX_MODEL", self.model_name)
         self.max_docs = int(os.getenv("MAX_DOCS", "10"))  # 增加到 10 個文檔
         self.chunk_size = int(os.getenv("CHUNK_SIZE", "4000"))  # 每個塊 4000 字符
         self.max_chunks_per_doc = int(os.getenv("MAX_CHUNKS_PER_DOC", "5"))  # 每個文檔最多 5 個塊
         self.timeout = int(os.getenv("OLLAMA_TIMEOUT", "60"))
-        self.max_workers = int(os.getenv("MAX_WORKERS", "5"))  # GPU 支持更多並行
+        # 同時送往 Ollama 的請求數，應與 Ollama 伺服器的 OLLAMA_NUM_PARALLEL 一致
+        self.num_parallel = int(os.getenv("OLLAMA_NUM_PARALLEL", "8"))
+        
+        # 共用 aiohttp session：重用與 Ollama 的 keep-alive 連線（需要 event loop，第一次呼叫時建立）
+        self._session: Optional[aiohttp.ClientSession] = None
+        # 所有文件、區塊的 prompt 以 asyncio.gather 一起送出，由 semaphore 限制同時進行的數量；
+        # 只建立一次，session 重建時進行中的請求仍受同一個上限限制（Python 3.10 起不綁定 event loop）
+        self._ollama_slots = asyncio.Semaphore(self.num_parallel)
+        
+        # 請求之間讓模型常駐 GPU，不因閒置被卸載後重新載入
+        self.keep_alive = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+        # 區塊 prompt 較長時可加大 context；需與同一模型的其他使用者一致，否則 Ollama 會重新載入模型（預設不指定）
+        self.num_ctx = int(os.getenv("OLLAMA_NUM_CTX", "0"))
+        
+        # Ollama 回應的精確比對快取（模型 + 參數 + prompt 雜湊），重試或重複萃取同一頁面時不再重新生成
+        self._response_cache = TTLCache(
+            maxsize=int(os.getenv("OLLAMA_CACHE_SIZE", "2048")),
+            ttl=int(os.getenv("OLLAMA_CACHE_TTL", "1800"))
+        )
+        self._response_cache_lock = threading.Lock()
+        
+        # Neo4j 寫入共用的執行緒池（與摘要生成並行），不必每次請求建立新執行緒
+        self._store_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("NEO4J_WRITE_WORKERS", "4")),
+            thread_name_prefix="neo4j"
+        )
         
         # 多輪提取配置
         self.enable_multi_pass = True  # 啟用多輪提取
@@ -61,7 +209,48 @@ class DataExtractionAgent:
             "衍生自", "基於", "優於", "劣於", "相似於"
         ]
 
-    def extract_and_analyze(self, scraped_data: Dict[str, Any], query: str) -> Dict[str, Any]:
+    def _get_session(self) -> aiohttp.ClientSession:
+        """取得共用的 aiohttp session（第一次呼叫時建立）"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.num_parallel),
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self._session
+
+    async def warm_up(self):
+        """啟動時讓 Ollama 先載入萃取用的模型（空白 prompt 只載入、不生成），避免第一個請求承擔載入時間"""
+        try:
+            session = self._get_session()
+            for model in dict.fromkeys([self.model_name, self.aux_model]):
+                await self._post_generate(session, {
+                    "model": model,
+                    "prompt": "",
+                    "stream": False,
+                    "keep_alive": self.keep_alive,
+                    **({"options": {"num_ctx": self.num_ctx}} if self.num_ctx else {})
+                })
+            logger.info(f"✅ Ollama 模型已預熱: {self.model_name}, {self.aux_model}")
+        except Exception as e:
+            logger.warning(f"⚠️ Ollama 預熱失敗: {e}")
+
+    async def close(self):
+        """關閉共用的 HTTP session 與執行緒池"""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        # 等待進行中的 Neo4j 寫入完成，但不阻塞 event loop
+        await asyncio.to_thread(self._store_executor.shutdown, True)
+
+    async def extract_and_analyze(
+        self,
+        scraped_data: Dict[str, Any],
+        query: str,
+        store: Optional[Callable[[List[Dict], List[Dict]], Dict[str, Any]]] = None
+    ) -> Dict[str, Any]:
+        """
+        提取並分析文件；提供 store 時，實體與關係確定後即在背景儲存，與摘要生成並行
+        """
         results = scraped_data.get("results", [])
         if not results:
             return {"query": query, "status": "no_data", "entities": [], "summary": "無可分析資料"}
@@ -73,23 +262,24 @@ class DataExtractionAgent:
         all_relationships = []
         document_summaries = []
         
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            # 提交所有文檔處理任務
-            futures = [
-                executor.submit(self._deep_process_document, doc, query, idx)
+        # 所有文檔同時處理，實際送往 Ollama 的並行數由 _ollama_slots 控制
+        doc_results = await asyncio.gather(
+            *[
+                self._deep_process_document(doc, query, idx)
                 for idx, doc in enumerate(results[:self.max_docs], start=1)
-            ]
-            
-            for future in as_completed(futures):
-                try:
-                    result = future.result(timeout=180)  # 每個文檔最多 3 分鐘
-                    if result:
-                        all_entities.extend(result["entities"])
-                        all_relationships.extend(result["relationships"])
-                        document_summaries.append(result["summary_info"])
-                        logger.info(f"✅ 文檔處理完成: {len(result['entities'])} 實體, {len(result['relationships'])} 關係")
-                except Exception as e:
-                    logger.warning(f"⚠️ 文檔處理失敗: {e}")
+            ],
+            return_exceptions=True
+        )
+        
+        for result in doc_results:
+            if isinstance(result, Exception):
+                logger.warning(f"⚠️ 文檔處理失敗: {result}")
+                continue
+            if result:
+                all_entities.extend(result["entities"])
+                all_relationships.extend(result["relationships"])
+                document_summaries.append(result["summary_info"])
+                logger.info(f"✅ 文檔處理完成: {len(result['entities'])} 實體, {len(result['relationships'])} 關係")
 
         if not all_entities:
             return {
@@ -108,35 +298,47 @@ class DataExtractionAgent:
 
         # ========== 階段 3：實體擴展（基於已有實體挖掘更多關聯）==========
         if self.enable_entity_expansion and len(unique_entities) > 5:
-            expanded_entities = self._expand_entities(unique_entities, all_entities, query)
+            expanded_entities = await self._expand_entities(unique_entities, all_entities, query)
             unique_entities.extend(expanded_entities)
             unique_entities = self._advanced_deduplicate_entities(unique_entities, query)
             logger.info(f"📊 擴展後: {len(unique_entities)} 個實體")
 
         # ========== 階段 4：關係去重與推斷 ==========
-        unique_relationships = self._advanced_deduplicate_relationships(all_relationships)
+        # 實體去重時已算好的標準化名稱，關係去重直接查表
+        norm = {
+            e["name"]: e.get("normalized_name") or self._normalize_entity_name(e["name"])
+            for e in unique_entities
+        }
+        unique_relationships = self._advanced_deduplicate_relationships(all_relationships, norm)
         
         # 推斷隱含關係（基於已有實體和關係）
-        inferred_relationships = self._infer_relationships(unique_entities, unique_relationships)
+        inferred_relationships = await self._infer_relationships(unique_entities, unique_relationships)
         unique_relationships.extend(inferred_relationships)
-        unique_relationships = self._advanced_deduplicate_relationships(unique_relationships)
+        unique_relationships = self._advanced_deduplicate_relationships(unique_relationships, norm)
         
         logger.info(f"📊 關係處理完成: {len(unique_relationships)} 個獨特關係")
 
-        # ========== 階段 5：生成整體摘要 ==========
-        overall_summary = self._generate_comprehensive_summary(
-            unique_entities, 
+        # ========== 階段 5：實體排序與評分 ==========
+        scored_entities = self._score_and_rank_entities(unique_entities, unique_relationships, query)
+
+        # ========== 階段 6：生成整體摘要（與 Neo4j 儲存並行）==========
+        store_future = (
+            asyncio.get_running_loop().run_in_executor(
+                self._store_executor, store, scored_entities, unique_relationships
+            )
+            if store else None
+        )
+        overall_summary = await self._generate_comprehensive_summary(
+            scored_entities, 
             unique_relationships, 
             document_summaries, 
             query
         )
-
-        # ========== 階段 6：實體排序與評分 ==========
-        scored_entities = self._score_and_rank_entities(unique_entities, unique_relationships, query)
+        storage_result = await store_future if store_future else None
 
         logger.info(f"🎉 最終結果：{len(scored_entities)} 個實體，{len(unique_relationships)} 個關係")
 
-        return {
+        result = {
             "query": query,
             "entities": scored_entities,
             "relationships": unique_relationships,
@@ -151,12 +353,15 @@ class DataExtractionAgent:
                 "relationship_types": self._count_relationship_types(unique_relationships)
             }
         }
+        if storage_result is not None:
+            result["neo4j_storage"] = storage_result
+        return result
 
     # =========================
     # 深度文檔處理
     # =========================
 
-    def _deep_process_document(self, doc: Dict[str, Any], query: str, idx: int) -> Dict[str, Any]:
+    async def _deep_process_document(self, doc: Dict[str, Any], query: str, idx: int) -> Dict[str, Any]:
         """深度處理單個文檔（多輪、多塊）"""
         text = doc.get("full_text") or doc.get("content", "")
         title = doc.get("title", "")
@@ -179,34 +384,39 @@ class DataExtractionAgent:
         all_entities = []
         all_relationships = []
         
-        # ===== 第 1 輪：基礎實體提取 =====
-        for chunk_idx, chunk in enumerate(chunks, start=1):
-            extraction = self._extract_entities_basic(chunk, title, url, query, chunk_idx)
+        # ===== 第 1 輪：基礎實體提取（所有區塊一次送出）=====
+        responses = await self._call_ollama_batch([
+            (self._basic_extraction_prompt(chunk, title, query, chunk_idx), 0.1)
+            for chunk_idx, chunk in enumerate(chunks, start=1)
+        ])
+        for response in responses:
+            extraction = self._parse_json_response(response, title, url)
             if extraction:
                 all_entities.extend(extraction.get("entities", []))
                 all_relationships.extend(extraction.get("relationships", []))
         
         logger.info(f"   第 1 輪完成: {len(all_entities)} 實體")
         
-        # ===== 第 2 輪：深度關係挖掘 =====
+        # ===== 第 2 輪：深度關係挖掘 + 第 3 輪：上下文增強 =====
+        # 兩輪都只依賴第 1 輪的實體，所有 prompt 一起送出，上下文增強不必等關係挖掘完成
+        rounds = []
         if self.enable_relationship_mining and len(all_entities) > 3:
-            for chunk_idx, chunk in enumerate(chunks[:3], start=1):  # 只對前 3 個塊做深度挖掘
-                deep_relationships = self._extract_relationships_deep(
-                    chunk, title, url, query, all_entities
-                )
-                if deep_relationships:
-                    all_relationships.extend(deep_relationships)
-        
-        logger.info(f"   第 2 輪完成: {len(all_relationships)} 關係")
+            rounds.extend(
+                self._extract_relationships_deep(chunk, title, url, query, all_entities)
+                for chunk in chunks[:3]  # 只對前 3 個塊做深度挖掘
+            )
+        if len(all_entities) > 0:
+            rounds.append(self._enhance_entity_context(all_entities, cleaned_text, title, url))
         
-        # ===== 第 3 輪：上下文增強 =====
+        outcomes = await asyncio.gather(*rounds)
         if len(all_entities) > 0:
-            enhanced_entities = self._enhance_entity_context(
-                all_entities, cleaned_text, title, url
-            )
-            all_entities = enhanced_entities
+            all_entities = outcomes.pop()
+        
+        for deep_relationships in outcomes:
+            if deep_relationships:
+                all_relationships.extend(deep_relationships)
         
-        logger.info(f"   第 3 輪完成: 實體上下文已增強")
+        logger.info(f"   第 2、3 輪完成: {len(all_relationships)} 關係，實體上下文已增強")
         
         # 生成文檔摘要
         summary = self._generate_document_summary(all_entities, all_relationships, title, query)
@@ -232,17 +442,8 @@ class DataExtractionAgent:
         if not text:
             return ""
         
-        # 移除常見的網頁噪音
-        noise_patterns = [
-            r'cookie\s+policy.*?(?:\n|$)',
-            r'privacy\s+policy.*?(?:\n|$)',
-            r'terms\s+of\s+service.*?(?:\n|$)',
-            r'subscribe.*?newsletter.*?(?:\n|$)',
-            r'related\s+articles.*?(?:\n|$)',
-        ]
-        
-        for pattern in noise_patterns:
-            text = re.sub(pattern, '', text, flags=re.IGNORECASE)
+        # 移除常見的網頁噪音（單次掃描）
+        text = _NOISE_RE.sub('', text)
         
         # 保留有意義的段落（至少 50 字符）
         paragraphs = [p.strip() for p in text.split('\n') if len(p.strip()) > 50]
@@ -280,32 +481,12 @@ class DataExtractionAgent:
     # LLM 提取（多種策略）
     # =========================
 
-    def _extract_entities_basic(self, text: str, title: str, url: str, query: str, chunk_idx: int) -> Dict[str, Any]:
-        """基礎實體提取（廣泛且全面）"""
+    def _basic_extraction_prompt(self, text: str, title: str, query: str, chunk_idx: int) -> str:
+        """基礎實體提取的 prompt（廣泛且全面）"""
         
-        prompt = f"""你是知識圖譜構建專家。請從文本中提取與「{query}」相關的**所有**實體和關係。
+        return f"""你是知識圖譜構建專家。請從文本中提取與「{query}」相關的**所有**實體和關係。
 
-【核心任務】
-1. 提取盡可能多的實體（目標：15-30 個）
-2. 為每個實體提供詳細描述
-3. 識別實體間的各種關係
-4. 不要遺漏任何重要資訊
-
-【實體類型】（請盡量涵蓋）
-- 公司/組織：相關公司、子公司、部門、機構
-- 人物：創始人、高管、董事、重要員工
-- 產品/服務：主要產品、服務、平台
-- 技術：使用的技術、技術棧、算法、工具
-- 競爭對手：直接競爭者、間接競爭者、潛在威脅
-- 合作夥伴：戰略合作、供應商、客戶
-- 投資者：投資機構、創投、天使投資人
-- 事件：融資、收購、發布、里程碑
-- 指標：營收、用戶數、市值、增長數據
-- 地點：總部、辦公室、市場區域
-- 概念：策略、願景、商業模式
-
-【關係類型】（請盡量識別）
-創立、領導、投資、收購、合作、競爭、使用、開發、發布、位於、服務於等
+{_BASIC_EXTRACTION_GUIDE}
 
 【文檔資訊】
 標題：{title}
@@ -314,51 +495,9 @@ class DataExtractionAgent:
 【文本內容】
 {text[:3500]}
 
-【輸出格式】
-必須返回有效的 JSON：
-{{
-  "entities": [
-    {{
-      "name": "實體名稱",
-      "type": "實體類型（從上述類型中選擇）",
-      "description": "詳細描述（50-100字），說明該實體的背景、作用、與主題的關聯",
-      "importance": "high/medium/low（重要性評估）"
-    }}
-  ],
-  "relationships": [
-    {{
-      "source": "源實體名稱",
-      "target": "目標實體名稱",
-      "relation": "關係類型",
-      "description": "關係的詳細描述",
-      "strength": "strong/medium/weak（關係強度）"
-    }}
-  ]
-}}
-
-【範例】
-如果主題是 "Tesla"：
-{{
-  "entities": [
-    {{"name": "Tesla", "type": "公司/組織", "description": "美國電動車製造商，由 Elon Musk 領導，專注於電動車和清潔能源", "importance": "high"}},
-    {{"name": "Elon Musk", "type": "人物", "description": "Tesla CEO，企業家，同時領導 SpaceX 和 X（前 Twitter）", "importance": "high"}},
-    {{"name": "Model 3", "type": "產品/服務", "description": "Tesla 暢銷電動車型，面向大眾市場", "importance": "medium"}},
-    {{"name": "BYD", "type": "競爭對手", "description": "中國電動車製造商，全球銷量領先", "importance": "medium"}},
-    {{"name": "Gigafactory", "type": "地點", "description": "Tesla 在全球的超級工廠，用於大規模生產", "importance": "medium"}}
-  ],
-  "relationships": [
-    {{"source": "Elon Musk", "target": "Tesla", "relation": "領導", "description": "擔任 CEO 並推動公司戰略", "strength": "strong"}},
-    {{"source": "Tesla", "target": "BYD", "relation": "競爭", "description": "在電動車市場直接競爭", "strength": "strong"}},
-    {{"source": "Tesla", "target": "Model 3", "relation": "開發", "description": "Tesla 開發並生產 Model 3", "strength": "strong"}}
-  ]
-}}
-
-現在請開始提取，記住要**全面且詳細**，不要遺漏任何相關實體："""
-
-        response = self._call_ollama(prompt, temperature=0.1)
-        return self._parse_json_response(response, title, url)
+{_BASIC_EXTRACTION_FORMAT}"""
 
-    def _extract_relationships_deep(self, text: str, title: str, url: str, query: str, existing_entities: List[Dict]) -> List[Dict]:
+    async def _extract_relationships_deep(self, text: str, title: str, url: str, query: str, existing_entities: List[Dict]) -> List[Dict]:
         """深度關係挖掘（專注於關係）"""
         
         # 提取已有實體名稱
@@ -372,36 +511,13 @@ class DataExtractionAgent:
 【文本內容】
 {text[:3000]}
 
-【任務】
-1. 找出已知實體之間的關係
-2. 找出已知實體與文本中其他實體的關係
-3. 識別隱含的、間接的關係
-4. 每個關係都要有詳細描述
-
-【關係類型】
-創立、領導、投資、收購、合作、競爭、使用、開發、發布、支持、影響、基於、優於、服務於等
-
-【輸出格式】
-{{
-  "relationships": [
-    {{
-      "source": "實體A",
-      "target": "實體B",
-      "relation": "關係類型",
-      "description": "詳細描述這個關係，包括時間、方式、影響等",
-      "strength": "strong/medium/weak",
-      "evidence": "文本中支持這個關係的具體證據"
-    }}
-  ]
-}}
-
-請盡可能多地提取關係（目標：10-20 個關係）："""
+{_RELATIONSHIP_MINING_GUIDE}"""
 
-        response = self._call_ollama(prompt, temperature=0.1)
+        response = await self._call_ollama(prompt, temperature=0.1)
         parsed = self._parse_json_response(response, title, url)
         return parsed.get("relationships", []) if parsed else []
 
-    def _enhance_entity_context(self, entities: List[Dict], full_text: str, title: str, url: str) -> List[Dict]:
+    async def _enhance_entity_context(self, entities: List[Dict], full_text: str, title: str, url: str) -> List[Dict]:
         """增強實體上下文（為重要實體添加更多資訊）"""
         
         # 挑選最重要的實體進行增強
@@ -442,7 +558,7 @@ class DataExtractionAgent:
 
 請提供詳細資訊："""
 
-        response = self._call_ollama(prompt, temperature=0.2)
+        response = await self._call_ollama(prompt, temperature=0.2)
         parsed = self._parse_json_response(response, title, url)
         
         if parsed and "enhanced_entities" in parsed:
@@ -462,7 +578,7 @@ class DataExtractionAgent:
     # 實體擴展與推斷
     # =========================
 
-    def _expand_entities(self, unique_entities: List[Dict], all_entities: List[Dict], query: str) -> List[Dict]:
+    async def _expand_entities(self, unique_entities: List[Dict], all_entities: List[Dict], query: str) -> List[Dict]:
         """基於已有實體，挖掘更多關聯實體"""
         
         # 選擇最重要的實體作為種子
@@ -504,7 +620,7 @@ class DataExtractionAgent:
 
 請列出 5-10 個可能相關的實體："""
 
-        response = self._call_ollama(prompt, temperature=0.3)
+        response = await self._call_ollama(prompt, temperature=0.3, model=self.aux_model)
         parsed = self._parse_json_response(response, "", "")
         
         if parsed and "inferred_entities" in parsed:
@@ -514,7 +630,7 @@ class DataExtractionAgent:
         
         return []
 
-    def _infer_relationships(self, entities: List[Dict], relationships: List[Dict]) -> List[Dict]:
+    async def _infer_relationships(self, entities: List[Dict], relationships: List[Dict]) -> List[Dict]:
         """基於已有實體和關係，推斷隱含關係"""
         
         if len(entities) < 5 or len(relationships) < 3:
@@ -529,7 +645,7 @@ class DataExtractionAgent:
 {', '.join(entity_names)}
 
 【已知關係】
-{json.dumps(existing_rels[:10], ensure_ascii=False)}
+{orjson.dumps(existing_rels[:10]).decode("utf-8")}
 
 【任務】
 推斷邏輯上合理但未明確提及的關係，例如：
@@ -553,7 +669,7 @@ class DataExtractionAgent:
 
 請列出 3-8 個合理的推斷關係："""
 
-        response = self._call_ollama(prompt, temperature=0.3)
+        response = await self._call_ollama(prompt, temperature=0.3, model=self.aux_model)
         parsed = self._parse_json_response(response, "", "")
         
         if parsed and "inferred_relationships" in parsed:
@@ -567,48 +683,102 @@ class DataExtractionAgent:
     # LLM 調用
     # =========================
 
-    def _call_ollama(self, prompt: str, temperature: float = 0.1) -> str:
-        """調用 Ollama（針對 GPU 優化）"""
+    async def _call_ollama(
+        self,
+        prompt: str,
+        temperature: float = 0.1,
+        format: Optional[str] = "json",
+        model: Optional[str] = None
+    ) -> str:
+        """調用 Ollama（針對 GPU 優化）；format="json" 時由 Ollama 保證輸出合法 JSON，未指定 model 時使用 MODEL_NAME"""
+        model = model or self.model_name
+        cache_key = hashlib.blake2b(
+            f"{model}|{temperature}|{format}|{prompt}".encode("utf-8"), digest_size=16
+        ).hexdigest()
+        with self._response_cache_lock:
+            cached = self._response_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
         payload = {
-            "model": self.model_name,
+            "model": model,
             "prompt": prompt,
             "stream": False,
-            "format": "json",
+            "keep_alive": self.keep_alive,
+            **({"format": format} if format else {}),
             "options": {
                 "temperature": temperature,
                 "num_predict": 3000,  # GPU 支持更長輸出
                 "top_p": 0.9,
                 "top_k": 40,
-                "repeat_penalty": 1.1
+                "repeat_penalty": 1.1,
+                **({"num_ctx": self.num_ctx} if self.num_ctx else {})
             }
         }
 
+        session = self._get_session()
         try:
-            response = requests.post(
-                f"{self.ollama_endpoint}/api/generate",
-                json=payload,
-                timeout=self.timeout
-            )
-            response.raise_for_status()
-            return response.json().get("response", "")
+            # 等到輪到這個請求才開始計算逾時，排隊時間不算在 OLLAMA_TIMEOUT 內
+            async with self._ollama_slots:
+                text = await self._post_generate(session, payload)
+            if text:
+                with self._response_cache_lock:
+                    self._response_cache[cache_key] = text
+            return text
         except Exception as e:
             logger.error(f"❌ Ollama 調用失敗: {e}")
             return None
 
+    async def _call_ollama_batch(
+        self,
+        prompts: List[Tuple[str, float]],
+        format: Optional[str] = "json",
+        model: Optional[str] = None
+    ) -> List[Optional[str]]:
+        """一次送出多個 (prompt, temperature)，依 OLLAMA_NUM_PARALLEL 在 Ollama 上並行解碼；回應順序與輸入相同"""
+        return await asyncio.gather(*[
+            self._call_ollama(prompt, temperature=temperature, format=format, model=model)
+            for prompt, temperature in prompts
+        ])
+
+    async def _post_generate(self, session: aiohttp.ClientSession, payload: Dict[str, Any], attempts: int = 3) -> str:
+        """送出 /api/generate 請求；連線錯誤時以退避重試"""
+        for attempt in range(attempts):
+            try:
+                async with session.post(
+                    f"{self.ollama_endpoint}/api/generate",
+                    data=orjson.dumps(payload),
+                    headers={"Content-Type": "application/json"}
+                ) as response:
+                    response.raise_for_status()
+                    return orjson.loads(await response.read()).get("response", "")
+            except aiohttp.ClientConnectionError:
+                if attempt == attempts - 1:
+                    raise
+                await asyncio.sleep(0.3 * 2 ** attempt)
+
     def _parse_json_response(self, text: str, source_title: str, source_url: str) -> Dict[str, Any]:
         """解析 JSON 回應"""
         if not text:
             return None
         
         try:
-            # 清理 Markdown 標記
-            text = re.sub(r'```(json)?\s*', '', text)
-            
-            # 提取 JSON
-            match = re.search(r'\{.*\}', text, re.DOTALL)
-            json_str = match.group(0) if match else text
+            try:
+                # JSON 模式下回應本身就是合法 JSON
+                parsed = orjson.loads(text)
+            except orjson.JSONDecodeError:
+                # 清理 Markdown 標記
+                text = _JSON_FENCE_RE.sub('', text)
+                
+                # 提取 JSON
+                match = _JSON_OBJ_RE.search(text)
+                json_str = match.group(0) if match else text
+                
+                parsed = orjson.loads(json_str)
             
-            parsed = json.loads(json_str)
+            if not isinstance(parsed, dict):
+                logger.warning(f"⚠️ JSON 回應不是物件: {type(parsed).__name__}")
+                return None
             
             # 補充來源資訊
             for entity in parsed.get("entities", []):
@@ -681,52 +851,56 @@ class DataExtractionAgent:
         
         return list(entity_map.values())
 
-    def _normalize_entity_name(self, name: str) -> str:
-        """標準化實體名稱"""
+    @staticmethod
+    @lru_cache(maxsize=8192)
+    def _normalize_entity_name(name: str) -> str:
+        """標準化實體名稱（同一名稱會在許多關係中重複出現，結果快取）"""
         # 移除標點、空格，轉小寫
-        normalized = re.sub(r'[^\w\s]', '', name.lower())
-        normalized = re.sub(r'\s+', '', normalized)
+        normalized = _PUNCT_RE.sub('', name.lower())
+        normalized = _WS_RE.sub('', normalized)
         
         # 移除常見後綴
-        suffixes = ['inc', 'ltd', 'llc', 'corp', 'corporation', 'company', 'co']
-        for suffix in suffixes:
+        for suffix in _NAME_SUFFIXES:
             if normalized.endswith(suffix):
                 normalized = normalized[:-len(suffix)]
         
         return normalized.strip()
 
-    def _advanced_deduplicate_relationships(self, relationships: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """高級去重關係"""
-        seen = set()
+    def _advanced_deduplicate_relationships(
+        self,
+        relationships: List[Dict[str, Any]],
+        norm: Optional[Dict[str, str]] = None
+    ) -> List[Dict[str, Any]]:
+        """高級去重關係（norm：實體名稱 -> 標準化名稱，查不到時才現算）"""
+        norm = norm or {}
+        normalize = self._normalize_entity_name
+        seen: Set[tuple] = set()
         unique = []
         
         for r in relationships:
-            source = self._normalize_entity_name(r.get("source", ""))
-            target = self._normalize_entity_name(r.get("target", ""))
-            relation = r.get("relation", "").strip().lower()
+            source = r.get("source", "")
+            target = r.get("target", "")
+            ns = norm.get(source) or normalize(source)
+            nt = norm.get(target) or normalize(target)
+            if not ns or not nt:
+                continue
             
-            # 創建唯一鍵（考慮雙向關係）
-            key1 = (source, relation, target)
-            key2 = (target, self._reverse_relation(relation), source)
+            # 被動關係換成主動形式並對調方向；只有對稱關係不分方向
+            relation = r.get("relation", "").strip().lower()
+            if relation in _REL_CANON:
+                relation = _REL_CANON[relation]
+                ns, nt = nt, ns
+            if relation in _SYMMETRIC_RELATIONS:
+                key = (frozenset((ns, nt)), relation)
+            else:
+                key = (ns, nt, relation)
             
-            if key1 not in seen and key2 not in seen and source and target:
-                seen.add(key1)
+            if key not in seen:
+                seen.add(key)
                 unique.append(r)
         
         return unique
 
-    def _reverse_relation(self, relation: str) -> str:
-        """獲取反向關係"""
-        reverse_map = {
-            "領導": "被領導",
-            "投資": "被投資",
-            "收購": "被收購",
-            "創立": "由創立",
-            "使用": "被使用",
-            "開發": "被開發"
-        }
-        return reverse_map.get(relation, relation)
-
     def _score_and_rank_entities(self, entities: List[Dict], relationships: List[Dict], query: str) -> List[Dict]:
         """為實體評分並排序"""
         
@@ -806,8 +980,8 @@ class DataExtractionAgent:
         
         return f"{title} - 提取了 {len(entities)} 個實體和 {len(relationships)} 個關係，主要包括：{type_summary}"
 
-    def _generate_comprehensive_summary(self, entities: List[Dict], relationships: List[Dict], 
-                                       doc_summaries: List[Dict], query: str) -> str:
+    async def _generate_comprehensive_summary(self, entities: List[Dict], relationships: List[Dict], 
+                                             doc_summaries: List[Dict], query: str) -> str:
         """生成全面的整體摘要"""
         
         prompt = f"""請基於以下資訊，生成一份關於「{query}」的全面分析摘要（200-300字）。
@@ -837,12 +1011,13 @@ class DataExtractionAgent:
 
 請用流暢的中文撰寫："""
 
-        response = self._call_ollama(prompt, temperature=0.2)
+        # 摘要是自由文字，不使用 JSON 模式
+        response = await self._call_ollama(prompt, temperature=0.2, format=None, model=self.aux_model)
         
         if response:
             # 嘗試提取文本（可能是 JSON 或純文本）
             try:
-                parsed = json.loads(response)
+                parsed = orjson.loads(response)
                 return parsed.get("summary", response)
             except:
                 # 直接返回文本
@@ -1,9 +1,13 @@
 # agents/data_extraction_agent/app.py
 
+import asyncio
 import logging
-from typing import Dict, Any
+from functools import partial
+from typing import Dict, Any, Iterator, List
 
+import orjson
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
 from agent import DataExtractionAgent
@@ -29,6 +33,7 @@ storage = Neo4jStorage()
 class ExtractionRequest(BaseModel):
     query: str
     data: Dict[str, Any]
+    stream: bool = False  # 以 NDJSON 逐筆回傳實體與關係
 
 # -------------------------------------------------------------------
 # Health Check
@@ -47,58 +52,107 @@ def health():
 # Main API
 # -------------------------------------------------------------------
 @app.post("/extract")
-def extract(req: ExtractionRequest):
+async def extract(req: ExtractionRequest):
     """
     Execute data extraction and store results in Neo4j
     """
     logger.info(f"📥 Extract request received: {req.query}")
 
     try:
-        # Step 1: Entity & relationship extraction
-        extraction_result = agent.extract_and_analyze(
-            req.data,
-            req.query,
+        extraction_result = await run_extraction(req)
+    except Exception as e:
+        logger.exception("❌ Extraction pipeline failed")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if req.stream:
+        return StreamingResponse(
+            iter_ndjson(extraction_result),
+            media_type="application/x-ndjson",
         )
+    return extraction_result
 
-        # Step 2: Neo4j storage (best-effort)
-        if extraction_result.get("status") == "success":
-            entities = extraction_result.get("entities", [])
-            relationships = extraction_result.get("relationships", [])
 
-            logger.info(
-                f"💾 Preparing Neo4j storage: "
-                f"{len(entities)} entities, {len(relationships)} relationships"
-            )
+async def run_extraction(req: ExtractionRequest) -> Dict[str, Any]:
+    """
+    Extract entities/relationships and store them in Neo4j (best-effort)
 
-            try:
-                storage_result = storage.store_extraction_results(
-                    query=req.query,
-                    entities=entities,
-                    relationships=relationships,
-                )
+    Storage runs as soon as entities are final, overlapping the summary LLM call
+    """
+    return await agent.extract_and_analyze(
+        req.data,
+        req.query,
+        store=partial(store_results, req.query),
+    )
 
-                extraction_result["neo4j_storage"] = storage_result
-                logger.info(f"✅ Neo4j storage completed: {storage_result}")
 
-            except Exception as e:
-                logger.error("❌ Neo4j storage failed", exc_info=True)
-                extraction_result["neo4j_storage"] = {
-                    "status": "error",
-                    "error": str(e),
-                }
+def store_results(query: str, entities: List[Dict], relationships: List[Dict]) -> Dict[str, Any]:
+    """
+    Store extraction results in Neo4j; failures are reported, not raised
+    """
+    logger.info(
+        f"💾 Preparing Neo4j storage: "
+        f"{len(entities)} entities, {len(relationships)} relationships"
+    )
 
-        return extraction_result
+    try:
+        storage_result = storage.store_extraction_results(
+            query=query,
+            entities=entities,
+            relationships=relationships,
+        )
+        logger.info(f"✅ Neo4j storage completed: {storage_result}")
+        return storage_result
 
     except Exception as e:
-        logger.exception("❌ Extraction pipeline failed")
-        raise HTTPException(status_code=500, detail=str(e))
+        logger.error("❌ Neo4j storage failed", exc_info=True)
+        return {
+            "status": "error",
+            "error": str(e),
+        }
+
+
+def _ndjson_line(kind: str, item: Any) -> bytes:
+    return orjson.dumps({"kind": kind, "item": item}) + b"\n"
+
+
+def iter_ndjson(extraction_result: Dict[str, Any]) -> Iterator[bytes]:
+    """
+    One JSON object per line: each entity, each relationship, then the summary
+    (everything else in the result)
+    """
+    for entity in extraction_result.get("entities", []):
+        yield _ndjson_line("entity", entity)
+
+    for relationship in extraction_result.get("relationships", []):
+        yield _ndjson_line("relationship", relationship)
+
+    summary = {
+        key: value
+        for key, value in extraction_result.items()
+        if key not in ("entities", "relationships")
+    }
+    yield _ndjson_line("summary", summary)
 
 # -------------------------------------------------------------------
-# Shutdown
+# Startup / Shutdown
 # -------------------------------------------------------------------
+@app.on_event("startup")
+async def startup_event():
+    """
+    Load the extraction models into Ollama in the background without blocking startup
+    """
+    app.state.warm_task = asyncio.create_task(agent.warm_up())
+
+
 @app.on_event("shutdown")
-def shutdown_event():
+async def shutdown_event():
     """
-    Gracefully close Neo4j connection
+    Gracefully close the Ollama HTTP session and Neo4j connection
+
+    The agent goes first so pending Neo4j writes finish before the driver closes
     """
+    warm_task = getattr(app.state, "warm_task", None)
+    if warm_task is not None and not warm_task.done():
+        warm_task.cancel()
+    await agent.close()
     storage.close()
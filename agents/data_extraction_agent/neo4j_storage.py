@@ -2,8 +2,9 @@
 
 import os
 import logging
+import threading
 import time
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Optional
 
 from neo4j import GraphDatabase
 from neo4j.exceptions import ServiceUnavailable, AuthError
@@ -22,11 +23,68 @@ class Neo4jStorage:
     存入 Neo4j 知識圖譜。
     """
 
+    # 寫入用的 Cypher 固定為類別常數，讓 Neo4j 的查詢計畫快取以相同字串命中
+    MERGE_QUERY_CYPHER = """
+        MERGE (q:Query {text: $query_text})
+        ON CREATE SET
+            q.created_at = timestamp(),
+            q.query_count = 1
+        ON MATCH SET
+            q.query_count = q.query_count + 1,
+            q.last_queried = timestamp()
+    """
+
+    MERGE_ENTITIES_CYPHER = """
+        MATCH (q:Query {text: $query_text})
+        UNWIND $rows AS row
+        MERGE (e:Entity {name: row.name})
+        ON CREATE SET
+            e.type = row.type,
+            e.description = row.description,
+            e.source_url = row.source_url,
+            e.source_title = row.source_title,
+            e.importance = row.importance,
+            e.created_at = timestamp()
+        ON MATCH SET
+            e.description = CASE
+                WHEN size(row.description) > size(e.description)
+                THEN row.description
+                ELSE e.description
+            END,
+            e.last_updated = timestamp()
+        MERGE (q)-[:FOUND]->(e)
+        RETURN count(e) AS stored
+    """
+
+    MERGE_RELATIONSHIPS_CYPHER = """
+        UNWIND $rows AS row
+        MATCH (source:Entity {name: row.source})
+        MATCH (target:Entity {name: row.target})
+        MERGE (source)-[r:RELATES_TO {type: row.relation}]->(target)
+        ON CREATE SET
+            r.description = row.description,
+            r.strength = row.strength,
+            r.created_at = timestamp()
+        ON MATCH SET
+            r.last_seen = timestamp()
+        RETURN count(r) AS stored
+    """
+
+    # MERGE 以唯一性約束背後的索引查找，而不是掃描整個標籤
+    SCHEMA_CYPHER = (
+        "CREATE CONSTRAINT entity_name IF NOT EXISTS FOR (e:Entity) REQUIRE e.name IS UNIQUE",
+        "CREATE CONSTRAINT query_text IF NOT EXISTS FOR (q:Query) REQUIRE q.text IS UNIQUE",
+    )
+
     def __init__(self):
         self.uri = os.getenv("NEO4J_URL", "bolt://neo4j:7687")
         self.user = os.getenv("NEO4J_USER", "neo4j")
         self.password = os.getenv("NEO4J_PASSWORD", "password123")
+        self.batch_size = int(os.getenv("NEO4J_BATCH_SIZE", "500"))  # 每次 UNWIND 寫入的筆數
+        self.pool_size = int(os.getenv("NEO4J_POOL_SIZE", "50"))  # driver 連線池大小
+        self.acquisition_timeout = float(os.getenv("NEO4J_ACQUISITION_TIMEOUT", "30"))
         self.driver = None
+        self._driver_lock = threading.Lock()
 
         self._connect_with_retry()
 
@@ -47,7 +105,8 @@ class Neo4jStorage:
                     self.uri,
                     auth=(self.user, self.password),
                     max_connection_lifetime=3600,
-                    max_connection_pool_size=50,
+                    max_connection_pool_size=self.pool_size,
+                    connection_acquisition_timeout=self.acquisition_timeout,
                     connection_timeout=10,
                     encrypted=False,
                 )
@@ -58,6 +117,7 @@ class Neo4jStorage:
                     assert result.single()["test"] == 1
 
                 logger.info("✅ Neo4j 連接成功")
+                self._prepare_schema()
                 return
 
             except ServiceUnavailable as e:
@@ -84,6 +144,42 @@ class Neo4jStorage:
                 else:
                     self.driver = None
 
+    def _prepare_schema(self):
+        """
+        建立唯一性約束並預先 EXPLAIN 寫入查詢，讓第一次寫入不必等待規劃（失敗不影響連線）
+        """
+        try:
+            with self.driver.session() as session:
+                for statement in self.SCHEMA_CYPHER:
+                    try:
+                        session.run(statement).consume()
+                    except Exception as e:
+                        # 既有資料若有重複值，約束會建立失敗，MERGE 仍可運作
+                        logger.warning(f"⚠️ 無法建立約束: {e}")
+
+                session.run(
+                    "EXPLAIN " + self.MERGE_QUERY_CYPHER, query_text=""
+                ).consume()
+                session.run(
+                    "EXPLAIN " + self.MERGE_ENTITIES_CYPHER, rows=[], query_text=""
+                ).consume()
+                session.run(
+                    "EXPLAIN " + self.MERGE_RELATIONSHIPS_CYPHER, rows=[]
+                ).consume()
+            logger.info("🔥 Neo4j 查詢計畫已預熱")
+        except Exception as e:
+            logger.warning(f"⚠️ 查詢計畫預熱失敗: {e}")
+
+    def _get_driver(self):
+        """
+        取得共用的 driver；啟動時連線失敗則在需要時重新連線一次
+        """
+        if self.driver is None:
+            with self._driver_lock:
+                if self.driver is None:
+                    self._connect_with_retry(max_retries=1)
+        return self.driver
+
     # -------------------------------------------------------------------
     # Storage
     # -------------------------------------------------------------------
@@ -104,100 +200,36 @@ class Neo4jStorage:
         Returns:
             存儲結果統計資訊
         """
-        if not self.driver:
+        driver = self._get_driver()
+        if not driver:
             logger.warning("⚠️ Neo4j 未連接，跳過存儲")
             return {"status": "skipped", "reason": "Neo4j not connected"}
 
+        entity_rows = [row for row in map(self._entity_row, entities) if row]
+        relationship_rows = [row for row in map(self._relationship_row, relationships) if row]
+
         try:
-            with self.driver.session() as session:
-                # Step 1: Query Node
-                session.run(
-                    """
-                    MERGE (q:Query {text: $query_text})
-                    ON CREATE SET
-                        q.created_at = timestamp(),
-                        q.query_count = 1
-                    ON MATCH SET
-                        q.query_count = q.query_count + 1,
-                        q.last_queried = timestamp()
-                    """,
-                    query_text=query,
+            with driver.session() as session:
+                # 實體與關係分開交易：關係寫入失敗時不會連帶回滾查詢節點與實體
+                entities_created = session.execute_write(
+                    self._write_entities, query, entity_rows
                 )
-
-                # Step 2: Entity Nodes
-                entities_created = 0
-                for entity in entities:
-                    try:
-                        session.run(
-                            """
-                            MERGE (e:Entity {name: $name})
-                            ON CREATE SET
-                                e.type = $type,
-                                e.description = $description,
-                                e.source_url = $source_url,
-                                e.source_title = $source_title,
-                                e.importance = $importance,
-                                e.created_at = timestamp()
-                            ON MATCH SET
-                                e.description = CASE
-                                    WHEN size($description) > size(e.description)
-                                    THEN $description
-                                    ELSE e.description
-                                END,
-                                e.last_updated = timestamp()
-                            WITH e
-                            MATCH (q:Query {text: $query_text})
-                            MERGE (q)-[:FOUND]->(e)
-                            """,
-                            name=entity.get("name", ""),
-                            type=entity.get("type", "未分類"),
-                            description=entity.get("description", ""),
-                            source_url=entity.get("source_url", ""),
-                            source_title=entity.get("source_title", ""),
-                            importance=entity.get("importance", "medium"),
-                            query_text=query,
-                        )
-                        entities_created += 1
-                    except Exception as e:
-                        logger.warning(
-                            f"⚠️ 實體存儲失敗 {entity.get('name')}: {e}"
-                        )
-
                 logger.info(f"✅ 存儲了 {entities_created} 個實體")
 
-                # Step 3: Relationship Edges
-                relationships_created = 0
-                for rel in relationships:
-                    try:
-                        session.run(
-                            """
-                            MATCH (source:Entity {name: $source_name})
-                            MATCH (target:Entity {name: $target_name})
-                            MERGE (source)-[r:RELATES_TO {type: $relation_type}]->(target)
-                            ON CREATE SET
-                                r.description = $description,
-                                r.strength = $strength,
-                                r.created_at = timestamp()
-                            ON MATCH SET
-                                r.last_seen = timestamp()
-                            """,
-                            source_name=rel.get("source", ""),
-                            target_name=rel.get("target", ""),
-                            relation_type=rel.get("relation", "相關"),
-                            description=rel.get("description", ""),
-                            strength=rel.get("strength", "medium"),
-                        )
-                        relationships_created += 1
-                    except Exception as e:
-                        logger.warning(f"⚠️ 關係存儲失敗: {e}")
-
+                try:
+                    relationships_created = session.execute_write(
+                        self._write_relationships, relationship_rows
+                    )
+                except Exception as e:
+                    logger.warning(f"⚠️ 關係存儲失敗: {e}")
+                    relationships_created = 0
                 logger.info(f"✅ 存儲了 {relationships_created} 個關係")
 
-                return {
-                    "status": "success",
-                    "entities_stored": entities_created,
-                    "relationships_stored": relationships_created,
-                }
+            return {
+                "status": "success",
+                "entities_stored": entities_created,
+                "relationships_stored": relationships_created,
+            }
 
         except Exception as e:
             logger.error(f"❌ Neo4j 存儲失敗: {e}")
@@ -206,6 +238,89 @@ class Neo4jStorage:
             logger.error(traceback.format_exc())
             return {"status": "error", "error": str(e)}
 
+    @staticmethod
+    def _text(value: Any, default: str = "") -> str:
+        """
+        LLM 輸出的欄位可能是 null 或非字串，寫入前轉成字串
+        """
+        if value is None or value == "":
+            return default
+        return value if isinstance(value, str) else str(value)
+
+    @classmethod
+    def _entity_row(cls, entity: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        轉成 UNWIND 的一列；MERGE 不接受 null，沒有名稱的實體無法存儲，返回 None
+        """
+        name = entity.get("name")
+        if not isinstance(name, str) or not name.strip():
+            return None
+        return {
+            "name": name,
+            "type": cls._text(entity.get("type"), "未分類"),
+            "description": cls._text(entity.get("description")),
+            "source_url": cls._text(entity.get("source_url")),
+            "source_title": cls._text(entity.get("source_title")),
+            "importance": cls._text(entity.get("importance"), "medium"),
+        }
+
+    @classmethod
+    def _relationship_row(cls, rel: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        轉成 UNWIND 的一列；兩端不是非空字串的關係無法比對實體，返回 None
+        """
+        source, target = rel.get("source"), rel.get("target")
+        if not all(isinstance(name, str) and name.strip() for name in (source, target)):
+            return None
+        return {
+            "source": source,
+            "target": target,
+            "relation": cls._text(rel.get("relation"), "相關"),
+            "description": cls._text(rel.get("description")),
+            "strength": cls._text(rel.get("strength"), "medium"),
+        }
+
+    def _write_entities(self, tx, query: str, entity_rows: List[Dict[str, Any]]) -> int:
+        """
+        以 UNWIND 批次寫入查詢節點與實體（每批一次 round trip）
+        """
+        # Step 1: Query Node
+        tx.run(self.MERGE_QUERY_CYPHER, query_text=query)
+
+        # Step 2: Entity Nodes
+        entities_created = 0
+        for batch in self._batches(entity_rows):
+            record = tx.run(
+                self.MERGE_ENTITIES_CYPHER,
+                rows=batch,
+                query_text=query,
+            ).single()
+            entities_created += record["stored"] if record else 0
+
+        return entities_created
+
+    def _write_relationships(self, tx, relationship_rows: List[Dict[str, Any]]) -> int:
+        """
+        以 UNWIND 批次寫入關係（兩端實體不存在的關係會被略過）
+        """
+        # Step 3: Relationship Edges
+        relationships_created = 0
+        for batch in self._batches(relationship_rows):
+            record = tx.run(
+                self.MERGE_RELATIONSHIPS_CYPHER,
+                rows=batch,
+            ).single()
+            relationships_created += record["stored"] if record else 0
+
+        return relationships_created
+
+    def _batches(self, rows: List[Dict[str, Any]]) -> Iterator[List[Dict[str, Any]]]:
+        """
+        依 batch_size 切分寫入資料，避免單一交易參數過大
+        """
+        for start in range(0, len(rows), self.batch_size):
+            yield rows[start:start + self.batch_size]
+
     # -------------------------------------------------------------------
     # Cleanup
     # -------------------------------------------------------------------
@@ -213,6 +328,8 @@ class Neo4jStorage:
         """
         關閉 Neo4j 連線
         """
-        if self.driver:
-            self.driver.close()
-            logger.info("Neo4j 連接已關閉")
+        with self._driver_lock:
+            if self.driver:
+                self.driver.close()
+                self.driver = None
+                logger.info("Neo4j 連接已關閉")
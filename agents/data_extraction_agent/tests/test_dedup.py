@@ -0,0 +1,40 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent import DataExtractionAgent
+
+# 去重只用到名稱標準化，不需要連線 Neo4j / Ollama
+agent = DataExtractionAgent.__new__(DataExtractionAgent)
+
+
+def rel(source, relation, target):
+    return {"source": source, "relation": relation, "target": target}
+
+
+def test_inverse_relation_is_merged():
+    relationships = [rel("OpenAI", "收購", "Rockset"), rel("Rockset Inc.", "被收購", "openai")]
+    assert agent._advanced_deduplicate_relationships(relationships) == relationships[:1]
+
+
+def test_reversed_direction_is_kept():
+    relationships = [rel("OpenAI", "收購", "Rockset"), rel("Rockset", "收購", "OpenAI")]
+    assert agent._advanced_deduplicate_relationships(relationships) == relationships
+
+
+def test_opposite_passive_relation_is_kept():
+    # A 被收購 B 等同 B 收購 A，與 A 收購 B 是相反的事實
+    relationships = [rel("OpenAI", "收購", "Rockset"), rel("OpenAI", "被收購", "Rockset")]
+    assert agent._advanced_deduplicate_relationships(relationships) == relationships
+
+
+def test_symmetric_relation_ignores_direction():
+    relationships = [rel("OpenAI", "競爭", "Anthropic"), rel("Anthropic", "競爭", "OpenAI")]
+    assert agent._advanced_deduplicate_relationships(relationships) == relationships[:1]
+
+
+def test_normalized_name_map_is_used():
+    relationships = [rel("OpenAI", "投資", "Figure"), rel("Figure AI", "被投資", "OpenAI")]
+    norm = {"OpenAI": "openai", "Figure": "figure", "Figure AI": "figure"}
+    assert agent._advanced_deduplicate_relationships(relationships, norm) == relationships[:1]
@@ -0,0 +1,107 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from neo4j_storage import Neo4jStorage
+
+
+class FakeTx:
+    def __init__(self, runs):
+        self.runs = runs
+
+    def run(self, cypher, **params):
+        self.runs.append((cypher, params))
+        return self
+
+    def single(self):
+        rows = self.runs[-1][1].get("rows")
+        return {"stored": len(rows)} if rows is not None else None
+
+
+class FakeSession:
+    def __init__(self, runs):
+        self.runs = runs
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute_write(self, work, *args):
+        return work(FakeTx(self.runs), *args)
+
+
+class FakeDriver:
+    def __init__(self):
+        self.runs = []
+
+    def session(self, **kwargs):
+        return FakeSession(self.runs)
+
+
+def make_storage():
+    # 不連線 Neo4j，只檢查送出的資料列
+    storage = Neo4jStorage.__new__(Neo4jStorage)
+    storage.driver = FakeDriver()
+    storage.batch_size = 500
+    return storage
+
+
+def rows_for(storage, cypher):
+    return [row for text, params in storage.driver.runs if text == cypher for row in params["rows"]]
+
+
+def test_null_relation_is_stored_with_default():
+    storage = make_storage()
+    result = storage.store_extraction_results(
+        query="OpenAI",
+        entities=[
+            {"name": "OpenAI", "type": None, "description": None},
+            {"name": "Microsoft", "description": 42},
+            {"name": None},
+        ],
+        relationships=[
+            {"source": "Microsoft", "target": "OpenAI", "relation": None, "description": None},
+            {"source": None, "target": "OpenAI", "relation": "投資"},
+            {"source": "Microsoft", "target": ["OpenAI"], "relation": "投資"},
+        ],
+    )
+
+    assert result == {"status": "success", "entities_stored": 2, "relationships_stored": 1}
+
+    entities = rows_for(storage, Neo4jStorage.MERGE_ENTITIES_CYPHER)
+    assert [e["name"] for e in entities] == ["OpenAI", "Microsoft"]
+    assert entities[0]["type"] == "未分類"
+    assert entities[0]["description"] == ""
+    assert entities[1]["description"] == "42"
+
+    relationships = rows_for(storage, Neo4jStorage.MERGE_RELATIONSHIPS_CYPHER)
+    assert relationships == [{
+        "source": "Microsoft",
+        "target": "OpenAI",
+        "relation": "相關",
+        "description": "",
+        "strength": "medium",
+    }]
+
+
+def test_relationship_failure_keeps_entities():
+    storage = make_storage()
+    runs = storage.driver.runs
+
+    class FailingSession(FakeSession):
+        def execute_write(self, work, *args):
+            if work == storage._write_relationships:
+                raise RuntimeError("write failed")
+            return super().execute_write(work, *args)
+
+    storage.driver.session = lambda **kwargs: FailingSession(runs)
+    result = storage.store_extraction_results(
+        query="OpenAI",
+        entities=[{"name": "OpenAI"}],
+        relationships=[{"source": "OpenAI", "target": "OpenAI", "relation": "相關"}],
+    )
+
+    assert result == {"status": "success", "entities_stored": 1, "relationships_stored": 0}
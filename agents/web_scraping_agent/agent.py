@@ -2,12 +2,11 @@
 import os
 import logging
 import asyncio
-from typing import List, Dict, Any
-from datetime import datetime
+from typing import List, Dict, Any, Optional
+from datetime import datetime, timezone
 import httpx
 from bs4 import BeautifulSoup
 import json
-import requests
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -25,7 +24,44 @@ class WebScrapingAgent:
         self.user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
         self.tavily_api_key = os.getenv("TAVILY_API_KEY", "")
         
-    async def scrape_urls(self, urls: List[str], query: str = "", dynamic_search: bool = False) -> Dict[str, Any]:
+        # 長期共用的 HTTP client（連線池 + keep-alive，HTTPS 網站可用 HTTP/2 多工），延遲建立
+        self.http2 = os.getenv("SCRAPING_HTTP2", "true").lower() in ["true", "1", "yes"]
+        self.max_connections = int(os.getenv("SCRAPING_MAX_CONNECTIONS", "100"))
+        self.max_keepalive = int(os.getenv("SCRAPING_MAX_KEEPALIVE", "40"))
+        self._client: Optional[httpx.AsyncClient] = None
+    
+    def _get_client(self) -> httpx.AsyncClient:
+        """
+        取得共用的 httpx client（第一次呼叫時建立）
+        """
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                http2=self.http2,
+                timeout=httpx.Timeout(self.timeout, connect=10),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive,
+                    keepalive_expiry=30
+                ),
+                follow_redirects=True
+            )
+        return self._client
+    
+    async def close(self):
+        """
+        關閉共用的 HTTP client
+        """
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        
+    async def scrape_urls(
+        self,
+        urls: List[str],
+        query: str = "",
+        dynamic_search: bool = False,
+        max_results: Optional[int] = None
+    ) -> Dict[str, Any]:
         """
         爬取多個 URL 的內容
         
@@ -33,6 +69,7 @@ class WebScrapingAgent:
             urls: 要爬取的 URL 列表
             query: 相關的查詢（用於上下文）
             dynamic_search: 是否使用 Tavily 動態搜尋更多 URL
+            max_results: 成功數量達到此值即停止，取消其餘爬取（None 表示全部爬取）
             
         Returns:
             爬取結果的字典
@@ -42,30 +79,52 @@ class WebScrapingAgent:
         # 如果啟用動態搜尋且有 query，使用 Tavily 獲取更多 URL
         if dynamic_search and query and self.tavily_api_key:
             logger.info(f"🔍 使用 Tavily 動態搜尋: {query}")
-            additional_urls = self._search_with_tavily(query, max_results=5)
+            additional_urls = await self._search_with_tavily(query, max_results=5)
             if additional_urls:
                 logger.info(f"✅ Tavily 找到 {len(additional_urls)} 個額外 URL")
-                urls = list(set(urls + additional_urls))  # 合併並去重
+                urls = urls + additional_urls
             else:
                 logger.warning("⚠️ Tavily 搜尋未返回結果")
         
+        # 合併並去重（保留順序）
+        urls = list(dict.fromkeys(url for url in urls if url))
+        
         results = []
         successful = 0
         failed = 0
         
-        async with httpx.AsyncClient(timeout=self.timeout, follow_redirects=True) as client:
-            tasks = [self._scrape_single_url(client, url, idx) for idx, url in enumerate(urls)]
-            scrape_results = await asyncio.gather(*tasks, return_exceptions=True)
+        client = self._get_client()
+        tasks = [
+            asyncio.create_task(self._scrape_single_url(client, url, idx))
+            for idx, url in enumerate(urls)
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                try:
+                    result = await next_done
+                except Exception as e:
+                    logger.error(f"❌ 爬取失敗: {e}")
+                    failed += 1
+                    continue
+                
+                if result and result.get("success"):
+                    results.append(result)
+                    successful += 1
+                    if max_results and successful >= max_results:
+                        logger.info(f"⏹️ 已取得 {successful} 個成功結果，停止其餘爬取")
+                        break
+                else:
+                    failed += 1
+        finally:
+            pending = [task for task in tasks if not task.done()]
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
         
-        for result in scrape_results:
-            if isinstance(result, Exception):
-                logger.error(f"❌ 爬取失敗: {result}")
-                failed += 1
-            elif result and result.get("success"):
-                results.append(result)
-                successful += 1
-            else:
-                failed += 1
+        # 依原始 URL 順序排列
+        order = {url: idx for idx, url in enumerate(urls)}
+        results.sort(key=lambda r: order.get(r.get("url"), len(order)))
         
         logger.info(f"✅ 爬取完成: 成功 {successful}, 失敗 {failed}")
         
@@ -75,15 +134,24 @@ class WebScrapingAgent:
             "successful": successful,
             "failed": failed,
             "results": results,
-            "timestamp": datetime.utcnow().isoformat() + "Z"
+            "timestamp": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
         }
     
-    def _search_with_tavily(self, query: str, max_results: int = 5) -> List[str]:
+    async def search_urls(self, query: str, max_results: int = 5) -> List[str]:
+        """
+        只搜尋相關 URL，不進行爬取（供呼叫端分批爬取）
+        """
+        if not self.tavily_api_key:
+            logger.warning("⚠️ 未設定 TAVILY_API_KEY，無法搜尋")
+            return []
+        return await self._search_with_tavily(query, max_results=max_results)
+    
+    async def _search_with_tavily(self, query: str, max_results: int = 5) -> List[str]:
         """
-        使用 Tavily API 搜尋相關 URL
+        使用 Tavily API 搜尋相關 URL（走共用的 async client，不阻塞事件迴圈）
         """
         try:
-            response = requests.post(
+            response = await self._get_client().post(
                 "https://api.tavily.com/search",
                 json={
                     "api_key": self.tavily_api_key,
@@ -99,7 +167,8 @@ class WebScrapingAgent:
             data = response.json()
             results = data.get("results", [])
             
-            urls = [result.get("url") for result in results if result.get("url")]
+            # 不同結果可能指向同一網址，去重並保留排名順序
+            urls = list(dict.fromkeys(result["url"] for result in results if result.get("url")))
             logger.info(f"📋 Tavily 返回 {len(urls)} 個 URL")
             
             return urls
@@ -157,7 +226,7 @@ class WebScrapingAgent:
                     "content": content,
                     "full_text": text_content,
                     "content_length": len(text_content),
-                    "scraped_at": datetime.utcnow().isoformat() + "Z"
+                    "scraped_at": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
                 }
                 
             except httpx.HTTPStatusError as e:
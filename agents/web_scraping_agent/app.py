@@ -1,7 +1,8 @@
 #agents/web_scraping_agent/app.py
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import logging
 from agent import WebScrapingAgent
 
@@ -17,6 +18,12 @@ class ScrapeRequest(BaseModel):
     urls: List[str]
     query: str = ""
     dynamic_search: bool = True  # 預設啟用動態搜尋
+    max_results: Optional[int] = None  # 成功數量達到此值即停止爬取
+
+
+class SearchRequest(BaseModel):
+    query: str
+    max_results: int = 5
 
 
 class ScrapeResponse(BaseModel):
@@ -37,7 +44,8 @@ async def root():
         "status": "running",
         "endpoints": {
             "health": "/health",
-            "scrape": "/scrape (POST)"
+            "scrape": "/scrape (POST)",
+            "search": "/search (POST)"
         }
     }
 
@@ -83,10 +91,12 @@ async def scrape_urls(request: ScrapeRequest):
         results = await agent.scrape_urls(
             urls, 
             request.query, 
-            dynamic_search=request.dynamic_search
+            dynamic_search=request.dynamic_search,
+            max_results=request.max_results
         )
         
-        return results
+        # 結果含各頁面全文，直接以 orjson 序列化（略過 response_model 的逐欄位轉換）
+        return ORJSONResponse(results)
         
     except HTTPException:
         raise
@@ -95,6 +105,23 @@ async def scrape_urls(request: ScrapeRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/search")
+async def search_urls(request: SearchRequest):
+    """
+    只搜尋相關 URL（不爬取），讓呼叫端可以分批爬取並提早開始萃取
+    """
+    try:
+        logger.info(f"📥 收到搜尋請求: query='{request.query}', max_results={request.max_results}")
+        
+        urls = await agent.search_urls(request.query, max_results=request.max_results)
+        
+        return {"query": request.query, "urls": urls}
+        
+    except Exception as e:
+        logger.error(f"❌ 搜尋錯誤: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.post("/scrape/single")
 async def scrape_single_url(url: str, query: str = ""):
     """
@@ -115,6 +142,14 @@ async def scrape_single_url(url: str, query: str = ""):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """
+    關閉共用的 HTTP client
+    """
+    await agent.close()
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8003)
\ No newline at end of file
@@ -1,7 +1,9 @@
 #!/bin/bash
 set -e
 
-MODEL="llama3.2:3b"
+MODEL="${MODEL:-llama3.2:3b}"
+JUDGE_MODEL="${JUDGE_MODEL:-llama3.2:1b}"
+EMBED_MODEL="${EMBED_MODEL:-}"  # 啟用語意快取時才需要
 
 echo "Starting Ollama server..."
 ollama serve &
@@ -12,11 +14,13 @@ until ollama list >/dev/null 2>&1; do
     sleep 2
 done
 
-# 拉模型（如果尚未拉過）
-if ! ollama list | grep -q "$MODEL"; then
-    echo "Pulling model $MODEL..."
-    ollama pull $MODEL
-fi
+# 拉模型（如果尚未拉過）：報告用模型 + 充足度判斷用的小模型（+ embedding 模型）
+for M in $MODEL $JUDGE_MODEL $EMBED_MODEL; do
+    if ! ollama list | grep -q "$M"; then
+        echo "Pulling model $M..."
+        ollama pull $M
+    fi
+done
 
 # 保持前景運行
 wait